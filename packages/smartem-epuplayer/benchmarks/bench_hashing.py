@@ -0,0 +1,65 @@
+"""Compare the digest algorithms supported by epuplayer on EPU-sized files.
+
+Run from the package directory:
+
+    python benchmarks/bench_hashing.py
+    python benchmarks/bench_hashing.py --repeat 5 --movie-mb 1024
+
+Files are read through the same code path the recorder and replayer use, with a warm page cache, so
+the numbers show CPU cost per algorithm rather than disk throughput.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from smartem_epuplayer.hashing import available_hash_algorithms, hash_file
+
+# Typical sizes of files written by EPU during a session
+EPU_FILES = {
+    "FoilHole .xml": (8 * 1024, 200),
+    "FoilHole .jpg": (512 * 1024, 50),
+    "GridSquare .dm": (4 * 1024 * 1024, 10),
+}
+
+
+def bench(paths: list[Path], algorithm: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for path in paths:
+            hash_file(path, algorithm)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement; the best is reported")
+    parser.add_argument("--movie-mb", type=int, default=256, help="Size of the movie file in MB (default: 256)")
+    args = parser.parse_args()
+
+    files = {**EPU_FILES, "Movie .tiff": (args.movie_mb * 1024 * 1024, 1)}
+    algorithms = available_hash_algorithms()
+    print(f"Algorithms: {', '.join(algorithms)}\n")
+    print(f"{'file':<16}" + "".join(f"{name:>14}" for name in algorithms))
+
+    with tempfile.TemporaryDirectory(prefix="epuplayer_bench_") as tmp:
+        for label, (size, count) in files.items():
+            paths = []
+            for i in range(count):
+                path = Path(tmp) / f"{label.split()[0]}_{i}"
+                path.write_bytes(os.urandom(size))
+                paths.append(path)
+
+            total_mb = size * count / 1e6
+            rates = [total_mb / bench(paths, name, args.repeat) for name in algorithms]
+            print(f"{label:<16}" + "".join(f"{rate:>9.0f} MB/s" for rate in rates))
+            for path in paths:
+                path.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 __version__ = "1.1.0"
 
-from .models import EPUEvent
+from .models import EPUEvent, EventTable
 from .recorder import EPURecorder
-from .replayer import EPUReplayer
+from .replayer import EPUReplayer, ReplayTarget
 
-__all__ = ["EPUEvent", "EPURecorder", "EPUReplayer", "__version__"]
+__all__ = ["EPUEvent", "EPURecorder", "EPUReplayer", "EventTable", "ReplayTarget", "__version__"]
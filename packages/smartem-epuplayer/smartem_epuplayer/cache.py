@@ -0,0 +1,277 @@
+"""On-disk cache of unpacked recording archives, shared by every replay on the machine.
+
+Unpacking a multi-gigabyte tar.gz dominates the start of a replay, and test runs replay the same
+recording over and over, often several copies at once. Each archive is unpacked once into a
+directory named after its content hash, so later replays of the same content, under any file
+name, read it in place. The least recently used entries are removed once the cache grows past
+its size limit, except those a running replay still reads from: each replay holds a lease file
+on its entry until it finishes.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+from collections.abc import Collection
+from dataclasses import dataclass
+from pathlib import Path
+
+from .container import is_container
+from .hashing import hash_file
+
+DEFAULT_MAX_SIZE = 20 * 1024**3
+ENTRY_FILE = "entry.json"
+# Unpacking directories left behind by an interrupted replay are removed after this many seconds
+STALE_STAGING_AGE = 24 * 3600
+# Windows process query constants, from winnt.h and winerror.h
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+STILL_ACTIVE = 259
+ERROR_ACCESS_DENIED = 5
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    path: Path
+    source: str
+    size: int
+    last_used: float
+
+
+def default_cache_dir() -> Path:
+    """``$EPUPLAYER_CACHE_DIR``, else the platform's per-user cache directory."""
+    if configured := os.environ.get("EPUPLAYER_CACHE_DIR"):
+        return Path(configured)
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local"
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "smartem-epuplayer"
+
+
+def is_archive(path: str | Path) -> bool:
+    """Whether ``path`` is a tar.gz recording, which is unpacked before replay."""
+    path = Path(path)
+    return not is_container(path) and (path.suffix.lower() == ".gz" or tarfile.is_tarfile(path))
+
+
+def _process_is_running(pid: int) -> bool:
+    if sys.platform == "win32":
+        # os.kill would terminate the process here, so ask for its exit code instead
+        import ctypes
+        from ctypes import wintypes
+
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        kernel32.OpenProcess.restype = wintypes.HANDLE
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return ctypes.get_last_error() == ERROR_ACCESS_DENIED  # Alive, owned by another user
+        try:
+            code = wintypes.DWORD()
+            # A process that has exited keeps its handle while others still hold one
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(code))) and code.value == STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Alive, owned by another user
+    return True
+
+
+def _lease_is_live(lease: Path) -> bool:
+    # Leases are named "<pid>-<random>"; one left behind by a process that has exited is stale
+    try:
+        pid = int(lease.name.split("-", 1)[0])
+    except ValueError:
+        return False
+    return _process_is_running(pid)
+
+
+def _directory_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+class RecordingCache:
+    """Unpacked recordings under ``root``, keyed by the SHA-256 of the archive.
+
+    Entries are unpacked into a staging directory and renamed into place, so concurrent replays
+    of the same archive never see a partial entry; if two unpack it at once, one copy is kept.
+    :meth:`prepare` leases the entry it returns, and :meth:`prune` leaves leased entries alone
+    until the lease is given back with :meth:`release` or its process exits.
+    """
+
+    def __init__(self, root: str | Path | None = None, max_size: int = DEFAULT_MAX_SIZE):
+        self.root = Path(root) if root else default_cache_dir()
+        self.max_size = max_size
+        self._recordings = self.root / "recordings"
+        self._keys = self.root / "keys"
+        self._staging = self.root / "staging"
+        self._leases = self.root / "leases"
+        # Lease files taken by this instance, per entry key
+        self._held: dict[str, list[Path]] = {}
+
+    def key(self, archive: str | Path) -> str:
+        """Content hash of ``archive``, remembered per path, size and mtime so it is computed once."""
+        archive = Path(archive).resolve()
+        stat = archive.stat()
+        signature = f"{archive}\0{stat.st_size}\0{stat.st_mtime_ns}"
+        memo = self._keys / hashlib.sha256(signature.encode()).hexdigest()
+        try:
+            return memo.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            pass
+
+        key = hash_file(archive)
+        self._keys.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=self._keys, delete=False, encoding="utf-8") as f:
+            f.write(key)
+        os.replace(f.name, memo)
+        return key
+
+    def prepare(self, archive: str | Path, keep: Collection[str] = ()) -> Path:
+        """Return a directory holding the unpacked ``archive``, unpacking it on first use.
+
+        The entry is leased until :meth:`release`. Unpacking prunes the cache back to its size
+        limit, sparing the entries keyed in ``keep`` that are about to be prepared as well.
+        """
+        key = self.key(archive)
+        entry = self._recordings / key
+        # Lease before looking, so a concurrent prune either sees the lease or removes the entry first
+        self._lease(key)
+        try:
+            unpacked = self._unpack(archive, key, entry)
+        except BaseException:
+            self.release(entry)
+            raise
+        if unpacked:
+            self.prune(keep={key, *keep})
+        return entry
+
+    def release(self, entry: str | Path):
+        """Give back a lease taken by :meth:`prepare` on ``entry``, letting it be pruned again."""
+        held = self._held.get(Path(entry).name)
+        if held:
+            with contextlib.suppress(FileNotFoundError):
+                held.pop().unlink()
+
+    def _lease(self, key: str):
+        leases = self._leases / key
+        leases.mkdir(parents=True, exist_ok=True)
+        fd, lease = tempfile.mkstemp(prefix=f"{os.getpid()}-", dir=leases)
+        os.close(fd)
+        self._held.setdefault(key, []).append(Path(lease))
+
+    def _in_use(self, key: str) -> bool:
+        leases = self._leases / key
+        if not leases.exists():
+            return False
+        live = False
+        for lease in leases.iterdir():
+            if _lease_is_live(lease):
+                live = True
+            else:
+                with contextlib.suppress(OSError):
+                    lease.unlink()
+        return live
+
+    def _unpack(self, archive: str | Path, key: str, entry: Path) -> bool:
+        if (entry / ENTRY_FILE).exists():
+            print(f"Using cached recording {key[:12]} from {self.root}")
+            os.utime(entry / ENTRY_FILE)
+            return False
+
+        print(f"\nUnpacking recording archive into cache {self.root}...")
+        self._staging.mkdir(parents=True, exist_ok=True)
+        self._recordings.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=f"{key[:12]}_", dir=self._staging))
+        try:
+            with tarfile.open(archive, "r:gz") as tar:
+                tar.extractall(staging)
+            info = {"source": str(Path(archive).resolve()), "size": _directory_size(staging), "created": time.time()}
+            (staging / ENTRY_FILE).write_text(json.dumps(info), encoding="utf-8")
+            try:
+                staging.rename(entry)
+            except OSError:
+                # Another replay unpacked the same archive first
+                if not (entry / ENTRY_FILE).exists():
+                    raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return True
+
+    def entries(self) -> list[CacheEntry]:
+        """Cached recordings, most recently used first."""
+        entries = []
+        for info_file in self._recordings.glob(f"*/{ENTRY_FILE}"):
+            try:
+                info = json.loads(info_file.read_text(encoding="utf-8"))
+                last_used = info_file.stat().st_mtime
+            except (OSError, ValueError):
+                continue  # Being removed
+            entry = info_file.parent
+            entries.append(CacheEntry(entry.name, entry, info["source"], info["size"], last_used))
+        return sorted(entries, key=lambda e: e.last_used, reverse=True)
+
+    def size(self) -> int:
+        return sum(entry.size for entry in self.entries())
+
+    def prune(self, max_size: int | None = None, keep: Collection[str] = ()) -> list[CacheEntry]:
+        """Remove least recently used entries until the cache fits ``max_size``; return what was removed.
+
+        Entries keyed in ``keep`` and entries leased by a running replay are never removed.
+        """
+        max_size = self.max_size if max_size is None else max_size
+        if self._staging.exists():
+            for staging in self._staging.iterdir():
+                try:
+                    stale = time.time() - staging.stat().st_mtime > STALE_STAGING_AGE
+                except FileNotFoundError:
+                    continue
+                if stale:
+                    shutil.rmtree(staging, ignore_errors=True)
+
+        entries = self.entries()
+        total = sum(entry.size for entry in entries)
+        removed = []
+        for entry in reversed(entries):
+            if total <= max_size:
+                break
+            if entry.key in keep or not self._remove(entry):
+                continue
+            total -= entry.size
+            removed.append(entry)
+        return removed
+
+    def clear(self) -> list[CacheEntry]:
+        removed = self.prune(max_size=0)
+        shutil.rmtree(self._keys, ignore_errors=True)
+        return removed
+
+    def _remove(self, entry: CacheEntry) -> bool:
+        if self._in_use(entry.key):
+            return False
+        # Move it out of the way first so no replay picks up a half-deleted entry
+        self._staging.mkdir(parents=True, exist_ok=True)
+        doomed = Path(tempfile.mkdtemp(prefix="removed_", dir=self._staging))
+        try:
+            entry.path.rename(doomed / entry.key)
+        except OSError:
+            pass  # Already removed by another process
+        else:
+            if self._in_use(entry.key):
+                # Leased while being moved; a replay may be about to read it
+                (doomed / entry.key).rename(entry.path)
+                doomed.rmdir()
+                return False
+        shutil.rmtree(doomed, ignore_errors=True)
+        with contextlib.suppress(OSError):
+            (self._leases / entry.key).rmdir()
+        return True
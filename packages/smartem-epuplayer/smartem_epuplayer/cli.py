@@ -1,15 +1,21 @@
 import argparse
-import json
+import io
 import signal
 import sys
 import tarfile
-import tempfile
 from dataclasses import dataclass
+from datetime import datetime
 from pathlib import Path
 
 from smartem_epuplayer import __version__
+from smartem_epuplayer.cache import DEFAULT_MAX_SIZE, RecordingCache
+from smartem_epuplayer.container import RecordingContainer, is_container
+from smartem_epuplayer.hashing import DEFAULT_HASH_ALGORITHM, HASH_ALGORITHMS, available_hash_algorithms
+from smartem_epuplayer.jsonstream import iter_recording_events, read_recording_metadata
+from smartem_epuplayer.models import EventTable
 from smartem_epuplayer.recorder import EPURecorder
-from smartem_epuplayer.replayer import EPUReplayer
+from smartem_epuplayer.replayer import EPUReplayer, ReplayTarget
+from smartem_epuplayer.scenario import load_scenario, replay_scenario
 
 
 @dataclass
@@ -52,8 +58,13 @@ def main():
 
     # Record command
     record_parser = subparsers.add_parser("record", help="Record filesystem changes")
-    record_parser.add_argument("directory", help="Directory to monitor")
-    record_parser.add_argument("-o", "--output", required=True, help="Output recording file (.tar.gz)")
+    record_parser.add_argument("directory", nargs="?", help="Directory to monitor")
+    record_parser.add_argument("-o", "--output", help="Output recording file (.tar.gz)")
+    record_parser.add_argument(
+        "--resume",
+        metavar="TEMPDIR|JOURNAL",
+        help="Resume an interrupted recording from its epurecorder_* temp directory or events journal",
+    )
     record_parser.add_argument(
         "--skip-binary-content",
         action="store_true",
@@ -79,10 +90,97 @@ def main():
         help="File extensions to always treat as binary (e.g., --force-binary-extensions log txt)",
     )
 
+    record_parser.add_argument(
+        "--scan-workers",
+        type=int,
+        help="Worker threads for hashing and reading during the initial scan (default: CPU count + 4, max 32)",
+    )
+
+    record_parser.add_argument(
+        "--quiet-window",
+        type=float,
+        default=0.5,
+        help=(
+            "Seconds a file must be quiet before its burst of create/modify notifications is recorded "
+            "as one event (default: 0.5, 0 records every notification)"
+        ),
+    )
+
+    record_parser.add_argument(
+        "--delta-cache-mb",
+        type=float,
+        default=256,
+        help="Memory budget for per-file hash state used to record appends and patches cheaply (default: 256)",
+    )
+    record_parser.add_argument(
+        "--record-workers",
+        type=int,
+        default=4,
+        help="Worker threads recording changes; each directory is handled in order by one worker (default: 4)",
+    )
+    record_parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=10000,
+        help="Maximum queued file notifications before the watcher waits for workers to catch up (default: 10000)",
+    )
+    record_parser.add_argument(
+        "--reconcile-interval",
+        type=float,
+        default=0,
+        help=(
+            "Rescan the tree every N seconds and record changes the watcher missed, e.g. after an event queue "
+            "overflow (default: 0, only rescan when the event queue saturates)"
+        ),
+    )
+    record_parser.add_argument(
+        "--placeholder-fingerprint",
+        choices=["stat", "sampled", "hash"],
+        default="stat",
+        help=(
+            "How binary placeholder files are tracked: size/mtime/inode only, plus a hash of their first and "
+            "last 64 KiB, or a full SHA-256 (default: stat)"
+        ),
+    )
+    record_parser.add_argument(
+        "--hash-algorithm",
+        choices=HASH_ALGORITHMS,
+        default=DEFAULT_HASH_ALGORITHM,
+        help=(
+            "Digest used for change detection and replay verification; xxh3 needs the xxhash package "
+            f"(default: {DEFAULT_HASH_ALGORITHM})"
+        ),
+    )
+    record_parser.add_argument(
+        "--format",
+        choices=["v2", "v3"],
+        default="v2",
+        help=(
+            "Archive format: v2 is a tar.gz that earlier epuplayer versions can replay, so rewrites are stored in "
+            "full; v3 an indexed container that replays without unpacking and stores small rewrites as block "
+            "patches (default: v2)"
+        ),
+    )
+    record_parser.add_argument(
+        "--poll-interval",
+        type=float,
+        metavar="SECONDS",
+        help="Poll the directory instead of using native notifications, e.g. on SMB/NFS mounts",
+    )
+    record_parser.add_argument(
+        "--poll-cold-interval",
+        type=float,
+        default=30.0,
+        metavar="SECONDS",
+        help="When polling, how often files in directories without recent changes are checked (default: 30)",
+    )
+
     # Replay command
     replay_parser = subparsers.add_parser("replay", help="Replay filesystem changes")
-    replay_parser.add_argument("recording", help="Recording file to replay (.tar.gz or legacy .json)")
-    replay_parser.add_argument("target", help="Target directory for replay")
+    replay_parser.add_argument("recording", help="Recording file to replay (.tar.gz, v3 container or legacy .json)")
+    replay_parser.add_argument(
+        "target", nargs="?", help="Target directory for replay, or a template containing {n} with --fanout"
+    )
     replay_parser.add_argument(
         "-s",
         "--speed",
@@ -118,13 +216,132 @@ def main():
         ),
     )
     replay_parser.add_argument("--no-verify", action="store_true", help="Skip integrity verification")
+    replay_parser.add_argument(
+        "--allocate-placeholders",
+        action="store_true",
+        help="Reserve disk space for binary placeholder files instead of creating them as sparse files",
+    )
+    replay_parser.add_argument(
+        "--verify-mode",
+        choices=["each", "final", "streaming"],
+        help=(
+            "When to verify file hashes: after each event, once per file when replay ends, or after each event "
+            "hashing only appended bytes (default: final with --dev-mode, otherwise each)"
+        ),
+    )
+    replay_parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help=(
+            "Apply independent events in parallel with N threads; events on the same path, parent directories "
+            "and moves/deletes keep their recorded order (default: 1)"
+        ),
+    )
     replay_parser.add_argument(
         "--skip-unreadable", action="store_true", help="Skip creating files that were unreadable during recording"
     )
+    replay_parser.add_argument(
+        "--targets",
+        nargs="+",
+        metavar="DIR",
+        help="Replay into several directories at once, decoding the recording a single time",
+    )
+    replay_parser.add_argument(
+        "--fanout",
+        type=int,
+        metavar="N",
+        help="Replay into N directories named by the target template, with {n} replaced by 1..N",
+    )
+    replay_parser.add_argument(
+        "--stagger",
+        type=float,
+        default=0.0,
+        metavar="SECONDS",
+        help="Start each fan-out target this many seconds after the previous one",
+    )
+    replay_parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.0,
+        metavar="SECONDS",
+        help="Delay each event of each fan-out target by up to this many extra seconds, at random",
+    )
+    replay_parser.add_argument("--seed", type=int, help="Random seed for --jitter, for reproducible runs")
+    replay_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Unpack a .tar.gz recording into a temporary directory instead of the shared recording cache",
+    )
+    replay_parser.add_argument(
+        "--cache-dir", help="Recording cache directory (default: $EPUPLAYER_CACHE_DIR or the user cache directory)"
+    )
+    replay_parser.add_argument(
+        "--cache-max-gb",
+        type=float,
+        default=DEFAULT_MAX_SIZE / 1024**3,
+        help="Remove least recently used cached recordings beyond this size (default: %(default)s)",
+    )
 
     # Info command
     info_parser = subparsers.add_parser("info", help="Show recording information")
-    info_parser.add_argument("recording", help="Recording file to analyze (.tar.gz or legacy .json)")
+    info_parser.add_argument("recording", help="Recording file to analyze (.tar.gz, v3 container or legacy .json)")
+
+    # Scenario command
+    scenario_parser = subparsers.add_parser(
+        "scenario", help="Replay several recordings at once on one timeline, as listed in a scenario file"
+    )
+    scenario_parser.add_argument("scenario", help="Scenario file (.json, or .yaml/.yml with PyYAML installed)")
+    scenario_parser.add_argument(
+        "--burst", action="store_true", help="Apply every session's events as fast as possible, ignoring timing"
+    )
+    scenario_parser.add_argument("--no-verify", action="store_true", help="Skip integrity verification")
+    scenario_parser.add_argument(
+        "--verify-mode",
+        choices=["each", "final", "streaming"],
+        default="each",
+        help="When to verify file hashes, as for replay (default: each)",
+    )
+    scenario_parser.add_argument(
+        "--workers", type=int, default=1, help="Apply independent events in parallel with N threads (default: 1)"
+    )
+    scenario_parser.add_argument(
+        "--skip-unreadable", action="store_true", help="Skip creating files that were unreadable during recording"
+    )
+    scenario_parser.add_argument(
+        "--allocate-placeholders",
+        action="store_true",
+        help="Reserve disk space for binary placeholder files instead of creating them as sparse files",
+    )
+    scenario_parser.add_argument("--seed", type=int, help="Random seed for session jitter, for reproducible runs")
+    scenario_parser.add_argument(
+        "--no-cache", action="store_true", help="Unpack .tar.gz recordings into temporary directories"
+    )
+    scenario_parser.add_argument(
+        "--cache-dir", help="Recording cache directory (default: $EPUPLAYER_CACHE_DIR or the user cache directory)"
+    )
+    scenario_parser.add_argument(
+        "--cache-max-gb",
+        type=float,
+        default=DEFAULT_MAX_SIZE / 1024**3,
+        help="Remove least recently used cached recordings beyond this size (default: %(default)s)",
+    )
+
+    # Cache command
+    cache_parser = subparsers.add_parser("cache", help="Inspect and prune the cache of unpacked recordings")
+    cache_parser.add_argument(
+        "--cache-dir", help="Recording cache directory (default: $EPUPLAYER_CACHE_DIR or the user cache directory)"
+    )
+    cache_subparsers = cache_parser.add_subparsers(dest="cache_command", help="Cache actions (default: list)")
+    cache_subparsers.add_parser("list", help="List cached recordings, most recently used first")
+    prune_parser = cache_subparsers.add_parser("prune", help="Remove least recently used recordings")
+    prune_parser.add_argument(
+        "--max-gb",
+        type=float,
+        default=DEFAULT_MAX_SIZE / 1024**3,
+        help="Size to shrink the cache to (default: %(default)s)",
+    )
+    cache_subparsers.add_parser("clear", help="Remove every cached recording")
 
     args = parser.parse_args()
 
@@ -134,20 +351,55 @@ def main():
     output_config.quiet = getattr(args, "quiet", False)
 
     if args.command == "record":
-        recorder = EPURecorder(
-            args.directory,
-            args.output,
-            args.skip_binary_content,
-            args.force_text_extensions,
-            args.force_binary_extensions,
-        )
+        if args.resume:
+            try:
+                recorder = EPURecorder.resume(
+                    args.resume,
+                    output_file=args.output,
+                    quiet_window=args.quiet_window,
+                    delta_cache_mb=args.delta_cache_mb,
+                    record_workers=args.record_workers,
+                    queue_size=args.queue_size,
+                    reconcile_interval=args.reconcile_interval,
+                    poll_interval=args.poll_interval,
+                    poll_cold_interval=args.poll_cold_interval,
+                    archive_format=args.format,
+                )
+            except FileNotFoundError as e:
+                print(str(e), file=sys.stderr)
+                sys.exit(1)
+        else:
+            if not args.directory or not args.output:
+                record_parser.error("directory and --output are required unless --resume is given")
+            if args.hash_algorithm not in available_hash_algorithms():
+                record_parser.error(
+                    f"--hash-algorithm {args.hash_algorithm} needs the xxhash package: pip install xxhash"
+                )
+            recorder = EPURecorder(
+                args.directory,
+                args.output,
+                args.skip_binary_content,
+                args.force_text_extensions,
+                args.force_binary_extensions,
+                scan_workers=args.scan_workers,
+                quiet_window=args.quiet_window,
+                delta_cache_mb=args.delta_cache_mb,
+                record_workers=args.record_workers,
+                queue_size=args.queue_size,
+                reconcile_interval=args.reconcile_interval,
+                poll_interval=args.poll_interval,
+                poll_cold_interval=args.poll_cold_interval,
+                placeholder_fingerprint=args.placeholder_fingerprint,
+                hash_algorithm=args.hash_algorithm,
+                archive_format=args.format,
+            )
 
-        if args.skip_binary_content:
+        if recorder.skip_binary_content:
             print_msg("Binary content handling: Skip binary files (replace with placeholders)")
-            if args.force_text_extensions:
-                print_msg(f"Force text extensions: {', '.join(args.force_text_extensions)}")
-            if args.force_binary_extensions:
-                print_msg(f"Force binary extensions: {', '.join(args.force_binary_extensions)}")
+            if recorder.force_text_extensions:
+                print_msg(f"Force text extensions: {', '.join(sorted(recorder.force_text_extensions))}")
+            if recorder.force_binary_extensions:
+                print_msg(f"Force binary extensions: {', '.join(sorted(recorder.force_binary_extensions))}")
         else:
             print_msg("Binary content handling: Store full content of all files")
 
@@ -160,7 +412,25 @@ def main():
         recorder.start_recording()
 
     elif args.command == "replay":
-        replayer = EPUReplayer(args.recording, args.target)
+        cache = None if args.no_cache else RecordingCache(args.cache_dir, int(args.cache_max_gb * 1024**3))
+        if args.fanout:
+            if args.targets or not args.target or "{n}" not in args.target:
+                replay_parser.error("--fanout needs a target template containing {n}, and no --targets")
+            target_dirs = [args.target.replace("{n}", str(n)) for n in range(1, args.fanout + 1)]
+        else:
+            target_dirs = ([args.target] if args.target else []) + (args.targets or [])
+        if not target_dirs:
+            replay_parser.error("a target directory is required")
+        if len(target_dirs) < 2 and (args.stagger or args.jitter):
+            replay_parser.error("--stagger and --jitter need more than one target (--targets or --fanout)")
+        targets = None
+        if len(target_dirs) > 1:
+            targets = [
+                ReplayTarget(target_dir, start_offset=i * args.stagger, jitter=args.jitter)
+                for i, target_dir in enumerate(target_dirs)
+            ]
+        replayer = EPUReplayer(args.recording, target_dirs[0], cache=cache)
+        verify_mode = args.verify_mode or ("final" if args.dev_mode else "each")
 
         if args.dev_mode:
             print_msg("Development mode: maximum acceleration for fast testing")
@@ -170,6 +440,11 @@ def main():
                 max_delay=0.1,
                 burst_mode=True,
                 skip_unreadable=args.skip_unreadable,
+                workers=args.workers,
+                verify_mode=verify_mode,
+                allocate_placeholders=args.allocate_placeholders,
+                targets=targets,
+                seed=args.seed,
             )
         elif args.fast:
             print_msg("Fast mode: 100x speed with reasonable delays")
@@ -179,6 +454,11 @@ def main():
                 max_delay=1.0,
                 burst_mode=False,
                 skip_unreadable=args.skip_unreadable,
+                workers=args.workers,
+                verify_mode=verify_mode,
+                allocate_placeholders=args.allocate_placeholders,
+                targets=targets,
+                seed=args.seed,
             )
         elif args.exact:
             print_msg("Exact mode: preserving original timing")
@@ -188,6 +468,11 @@ def main():
                 max_delay=None,
                 burst_mode=False,
                 skip_unreadable=args.skip_unreadable,
+                workers=args.workers,
+                verify_mode=verify_mode,
+                allocate_placeholders=args.allocate_placeholders,
+                targets=targets,
+                seed=args.seed,
             )
         else:
             # Check if user specified custom settings
@@ -201,6 +486,11 @@ def main():
                     max_delay=args.max_delay,
                     burst_mode=args.burst,
                     skip_unreadable=args.skip_unreadable,
+                    workers=args.workers,
+                    verify_mode=verify_mode,
+                    allocate_placeholders=args.allocate_placeholders,
+                    targets=targets,
+                    seed=args.seed,
                 )
             else:
                 print_msg("Fast mode (default): 100x speed with reasonable delays")
@@ -210,6 +500,11 @@ def main():
                     max_delay=1.0,
                     burst_mode=False,
                     skip_unreadable=args.skip_unreadable,
+                    workers=args.workers,
+                    verify_mode=verify_mode,
+                    allocate_placeholders=args.allocate_placeholders,
+                    targets=targets,
+                    seed=args.seed,
                 )
 
     elif args.command == "info":
@@ -217,34 +512,35 @@ def main():
             print(f"Recording file not found: {args.recording}", file=sys.stderr)
             sys.exit(1)
 
-        # Load recording data
+        # Load recording data; only event summaries are needed, so payloads are not kept
         recording_path = Path(args.recording)
 
-        if recording_path.suffix.lower() == ".gz" or tarfile.is_tarfile(recording_path):
-            # Load from tar.gz archive
-            with tempfile.TemporaryDirectory(prefix="fsinfo_") as temp_dir:
-                temp_path = Path(temp_dir)
-                with tarfile.open(recording_path, "r:gz") as tar:
-                    tar.extractall(temp_path)
-
-                recording_file = temp_path / "recording.json"
-                if not recording_file.exists():
+        if is_container(recording_path):
+            with RecordingContainer(recording_path) as container:
+                metadata = container.metadata
+                events = EventTable(container.iter_events(), payload=False)
+                chunk_count = len(container.chunks)
+        elif recording_path.suffix.lower() == ".gz" or tarfile.is_tarfile(recording_path):
+            # Read recording.json straight out of the tar.gz archive; binary chunks are only counted
+            with tarfile.open(recording_path, "r:gz") as tar:
+                names = tar.getnames()
+                if "recording.json" not in names:
                     print("Invalid archive: missing recording.json", file=sys.stderr)
                     sys.exit(1)
 
-                data = json.loads(recording_file.read_text())
-
-                # Count binary chunks
-                chunks_dir = temp_path / "chunks"
-                chunk_count = len(list(chunks_dir.glob("*.bin"))) if chunks_dir.exists() else 0
+                with io.TextIOWrapper(tar.extractfile("recording.json"), encoding="utf-8") as f:
+                    metadata = read_recording_metadata(f)
+                with io.TextIOWrapper(tar.extractfile("recording.json"), encoding="utf-8") as f:
+                    events = EventTable(iter_recording_events(f), payload=False)
+                chunk_count = sum(1 for name in names if name.startswith("chunks/") and name.endswith(".bin"))
         else:
             # Legacy JSON format
-            data = json.loads(recording_path.read_text())
+            with open(recording_path, encoding="utf-8") as f:
+                metadata = read_recording_metadata(f)
+            with open(recording_path, encoding="utf-8") as f:
+                events = EventTable(iter_recording_events(f), payload=False)
             chunk_count = 0
 
-        metadata = data["metadata"]
-        events = data["events"]
-
         print("Recording Information:")
         print(f"  File: {args.recording}")
         print(f"  Recorded from: {metadata['watch_dir']}")
@@ -255,16 +551,47 @@ def main():
         if chunk_count > 0:
             print(f"  Binary chunks: {chunk_count}")
 
-        # Event type breakdown
-        event_types = {}
-        for event in events:
-            event_type = event["event_type"]
-            event_types[event_type] = event_types.get(event_type, 0) + 1
-
         print("  Event breakdown:")
-        for event_type, count in sorted(event_types.items()):
+        for event_type, count in sorted(events.type_counts().items()):
             print(f"    {event_type}: {count}")
 
+    elif args.command == "scenario":
+        try:
+            scenario = load_scenario(args.scenario)
+        except (OSError, ValueError) as e:
+            print(f"Invalid scenario {args.scenario}: {e}", file=sys.stderr)
+            sys.exit(1)
+        replay_scenario(
+            scenario,
+            verify_integrity=not args.no_verify,
+            burst_mode=args.burst,
+            skip_unreadable=args.skip_unreadable,
+            workers=args.workers,
+            verify_mode=args.verify_mode,
+            allocate_placeholders=args.allocate_placeholders,
+            cache=None if args.no_cache else RecordingCache(args.cache_dir, int(args.cache_max_gb * 1024**3)),
+            seed=args.seed,
+        )
+
+    elif args.command == "cache":
+        cache = RecordingCache(args.cache_dir)
+        if args.cache_command == "prune":
+            removed = cache.prune(max_size=int(args.max_gb * 1024**3))
+        elif args.cache_command == "clear":
+            removed = cache.clear()
+        else:
+            entries = cache.entries()
+            print(f"Recording cache: {cache.root}")
+            for entry in entries:
+                last_used = datetime.fromtimestamp(entry.last_used).isoformat(sep=" ", timespec="seconds")
+                print(f"  {entry.key[:12]}  {entry.size / 1024**2:10.1f} MB  {last_used}  {entry.source}")
+            print(f"  {len(entries)} recordings, {sum(e.size for e in entries) / 1024**2:.1f} MB")
+            return
+
+        for entry in removed:
+            print_msg(f"Removed {entry.key[:12]} ({entry.size / 1024**2:.1f} MB): {entry.source}")
+        print_msg(f"Removed {len(removed)} recordings, {cache.size() / 1024**2:.1f} MB left in {cache.root}")
+
     else:
         parser.print_help()
 
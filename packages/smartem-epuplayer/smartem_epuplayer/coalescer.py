@@ -0,0 +1,109 @@
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+
+
+@dataclass
+class PendingChange:
+    event_type: str  # created or modified
+    src_path: str
+    first_timestamp: float
+    last_timestamp: float
+
+
+class EventCoalescer:
+    """Debounce bursts of file notifications per path.
+
+    ``created``/``modified`` notifications for a path are held until the path has been quiet for
+    ``quiet_window`` seconds and then handed to ``flush_callback`` once, as a single change that
+    keeps the first and last notification times. A ``created`` followed by ``modified`` stays a
+    ``created``. Pending changes are flushed from a background thread started with :meth:`start`;
+    :meth:`stop` flushes whatever is left.
+    """
+
+    def __init__(self, flush_callback: Callable[[PendingChange], None], quiet_window: float = 0.5):
+        self.flush_callback = flush_callback
+        self.quiet_window = quiet_window
+        self._pending: dict[str, PendingChange] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def add(self, event_type: str, src_path: str, timestamp: float | None = None):
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            change = self._pending.get(src_path)
+            if change is None:
+                self._pending[src_path] = PendingChange(event_type, src_path, timestamp, timestamp)
+            else:
+                change.last_timestamp = timestamp
+                if event_type == "created" and change.event_type != "created":
+                    change.event_type = "created"
+
+    def discard(self, src_path: str, is_directory: bool = False) -> list[PendingChange]:
+        """Drop pending changes for a path (and everything below it for a directory)."""
+        with self._lock:
+            return [self._pending.pop(path) for path in self._matching(src_path, is_directory)]
+
+    def rekey(self, src_path: str, dest_path: str, is_directory: bool = False) -> list[PendingChange]:
+        """Follow a move: pending changes under ``src_path`` now apply to ``dest_path``."""
+        with self._lock:
+            moved = []
+            for path in self._matching(src_path, is_directory):
+                change = self._pending.pop(path)
+                change.src_path = dest_path + path[len(src_path) :]
+                existing = self._pending.get(change.src_path)
+                if existing is not None:
+                    change.first_timestamp = min(change.first_timestamp, existing.first_timestamp)
+                    change.last_timestamp = max(change.last_timestamp, existing.last_timestamp)
+                    if existing.event_type == "created":
+                        change.event_type = "created"
+                self._pending[change.src_path] = change
+                moved.append(change)
+            return moved
+
+    def _matching(self, src_path: str, is_directory: bool) -> list[str]:
+        if not is_directory:
+            return [src_path] if src_path in self._pending else []
+        prefix = src_path.rstrip("/\\")
+        return [
+            path
+            for path in self._pending
+            if path == prefix or path.startswith(prefix + "/") or path.startswith(prefix + "\\")
+        ]
+
+    def flush_due(self, now: float | None = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            due = [c for c in self._pending.values() if now - c.last_timestamp >= self.quiet_window]
+            for change in due:
+                del self._pending[change.src_path]
+        self._dispatch(due)
+
+    def flush_all(self):
+        with self._lock:
+            due = list(self._pending.values())
+            self._pending.clear()
+        self._dispatch(due)
+
+    def _dispatch(self, changes: list[PendingChange]):
+        for change in sorted(changes, key=lambda c: c.first_timestamp):
+            self.flush_callback(change)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="epurecorder-coalescer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush_all()
+
+    def _run(self):
+        interval = max(self.quiet_window / 4, 0.01)
+        while not self._stop.wait(interval):
+            self.flush_due()
@@ -0,0 +1,211 @@
+"""Random-access recording container (format v3).
+
+Layout::
+
+    MAGIC
+    event block | chunk | event block | chunk ...    in any order
+    footer: zlib-compressed JSON index
+    trailer: footer offset, footer length, MAGIC
+
+Each event block is up to ``EVENTS_PER_BLOCK`` events as zlib-compressed JSON lines. Chunks are
+stored raw, or zlib-compressed when that saves at least ``MIN_COMPRESSION_GAIN``. The footer holds
+the recording metadata, the offset of every event block and a ``chunk id -> extent`` table, so a
+reader seeks straight to what it needs instead of unpacking the archive.
+"""
+
+import io
+import json
+import shutil
+import struct
+import threading
+import zlib
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, BinaryIO
+
+MAGIC = b"EPUREC03"
+TRAILER = struct.Struct("<QQ8s")
+EVENTS_PER_BLOCK = 1024
+COPY_BUFFER_SIZE = 1024 * 1024
+MIN_COMPRESSION_GAIN = 0.1
+
+
+def is_container(path: Path) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+@dataclass(frozen=True)
+class ChunkExtent:
+    offset: int
+    length: int  # Bytes stored in the container
+    size: int  # Bytes of chunk data
+    compressed: bool
+
+
+class _ChunkStream(io.RawIOBase):
+    """Read one chunk through its own file handle, decompressing as it goes."""
+
+    def __init__(self, path: Path, extent: ChunkExtent):
+        self._file = open(path, "rb")  # noqa: SIM115
+        self._file.seek(extent.offset)
+        self._remaining = extent.length
+        self._decompressor = zlib.decompressobj() if extent.compressed else None
+        self._pending = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            if self._decompressor and self._decompressor.unconsumed_tail:
+                data = self._decompressor.unconsumed_tail
+            elif self._remaining:
+                data = self._file.read(min(COPY_BUFFER_SIZE, self._remaining))
+                if not data:
+                    raise EOFError(f"Truncated chunk in {self._file.name}")
+                self._remaining -= len(data)
+            else:
+                return 0
+            self._pending = self._decompressor.decompress(data, COPY_BUFFER_SIZE) if self._decompressor else data
+
+        count = min(len(buffer), len(self._pending))
+        buffer[:count] = self._pending[:count]
+        self._pending = self._pending[count:]
+        return count
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+class ContainerWriter:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = open(self.path, "wb")  # noqa: SIM115
+        self._file.write(MAGIC)
+        self._pending: list[str] = []
+        self._pending_timestamps: list[float] = []
+        self._blocks: list[list] = []
+        self._chunks: dict[str, list] = {}
+        self.event_count = 0
+
+    def add_event(self, event_data: dict[str, Any]):
+        self._pending.append(json.dumps(event_data))
+        self._pending_timestamps.append(event_data.get("timestamp", 0.0))
+        self.event_count += 1
+        if len(self._pending) >= EVENTS_PER_BLOCK:
+            self._flush_events()
+
+    def _flush_events(self):
+        if not self._pending:
+            return
+        data = zlib.compress("\n".join(self._pending).encode("utf-8"))
+        offset = self._file.tell()
+        self._file.write(data)
+        # [offset, length, event count, first timestamp, last timestamp]
+        self._blocks.append(
+            [offset, len(data), len(self._pending), self._pending_timestamps[0], self._pending_timestamps[-1]]
+        )
+        self._pending.clear()
+        self._pending_timestamps.clear()
+
+    def add_chunk(self, chunk_id: str, source: Path):
+        """Copy a chunk file into the container, compressed if that pays off."""
+        if chunk_id in self._chunks:
+            return
+        offset = self._file.tell()
+        size = 0
+        compressor = zlib.compressobj()
+        with open(source, "rb") as f:
+            while block := f.read(COPY_BUFFER_SIZE):
+                size += len(block)
+                self._file.write(compressor.compress(block))
+        self._file.write(compressor.flush())
+        length = self._file.tell() - offset
+
+        compressed = length <= size * (1 - MIN_COMPRESSION_GAIN)
+        if not compressed:
+            # Incompressible (movies, images): store as is, which also keeps it directly copyable
+            self._file.seek(offset)
+            self._file.truncate()
+            with open(source, "rb") as f:
+                shutil.copyfileobj(f, self._file, COPY_BUFFER_SIZE)
+            length = size
+        self._chunks[chunk_id] = [offset, length, size, compressed]
+
+    def close(self, metadata: dict[str, Any]):
+        self._flush_events()
+        footer = zlib.compress(
+            json.dumps({"metadata": metadata, "event_blocks": self._blocks, "chunks": self._chunks}).encode("utf-8")
+        )
+        footer_offset = self._file.tell()
+        self._file.write(footer)
+        self._file.write(TRAILER.pack(footer_offset, len(footer), MAGIC))
+        self._file.close()
+
+
+class RecordingContainer:
+    """Read a v3 recording lazily; safe to share between threads."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file: BinaryIO = open(self.path, "rb")  # noqa: SIM115
+        self._lock = threading.Lock()
+        try:
+            self._file.seek(-TRAILER.size, io.SEEK_END)
+            footer_offset, footer_length, magic = TRAILER.unpack(self._file.read(TRAILER.size))
+            if magic != MAGIC:
+                raise ValueError(f"Invalid recording container (truncated or not v3): {self.path}")
+            index = json.loads(zlib.decompress(self._read(footer_offset, footer_length)))
+        except (OSError, struct.error, zlib.error) as e:
+            self._file.close()
+            raise ValueError(f"Invalid recording container: {self.path}: {e}") from e
+
+        self.metadata: dict[str, Any] = index["metadata"]
+        self.event_blocks: list[list] = index["event_blocks"]
+        self.chunks: dict[str, ChunkExtent] = {
+            chunk_id: ChunkExtent(*extent) for chunk_id, extent in index["chunks"].items()
+        }
+
+    def __len__(self) -> int:
+        return sum(block[2] for block in self.event_blocks)
+
+    def _read(self, offset: int, length: int) -> bytes:
+        with self._lock:
+            self._file.seek(offset)
+            return self._file.read(length)
+
+    def iter_events(self) -> Iterator[dict[str, Any]]:
+        """Yield event dicts in recorded order, decoding one block at a time."""
+        for offset, length, *_rest in self.event_blocks:
+            for line in zlib.decompress(self._read(offset, length)).splitlines():
+                yield json.loads(line)
+
+    def extent(self, chunk_id: str) -> ChunkExtent:
+        extent = self.chunks.get(chunk_id)
+        if extent is None:
+            raise FileNotFoundError(f"Binary chunk not found: {chunk_id}")
+        return extent
+
+    def read_chunk(self, chunk_id: str) -> bytes:
+        extent = self.extent(chunk_id)
+        data = self._read(extent.offset, extent.length)
+        return zlib.decompress(data) if extent.compressed else data
+
+    def open_chunk(self, chunk_id: str) -> BinaryIO:
+        """Stream a chunk without reading it into memory; each stream has its own file handle."""
+        return io.BufferedReader(_ChunkStream(self.path, self.extent(chunk_id)), COPY_BUFFER_SIZE)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self) -> "RecordingContainer":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
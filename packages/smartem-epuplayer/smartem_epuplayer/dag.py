@@ -0,0 +1,109 @@
+import threading
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import Any
+
+
+class _Node:
+    __slots__ = ("fn", "args", "keys", "waiting", "dependents")
+
+    def __init__(self, fn: Callable[..., Any], args: tuple, keys: tuple[str, ...]):
+        self.fn = fn
+        self.args = args
+        self.keys = keys
+        self.waiting = 0
+        self.dependents: list[_Node] = []
+
+
+class DependencyExecutor:
+    """Run tasks on a thread pool in dependency order rather than strictly one after another.
+
+    Tasks are submitted in their original order. Each waits for the latest earlier task on every
+    one of its ``keys`` (what it changes) and ``after`` keys (what it relies on, but leaves alone).
+    A barrier waits for everything submitted before it, and everything submitted after waits for
+    the barrier. Dependencies only ever point backwards, so the result is the same as running the
+    tasks in order. :meth:`submit` blocks while ``max_pending`` tasks are outstanding, so the
+    producer never runs far ahead of the workers.
+    """
+
+    def __init__(self, workers: int = 4, max_pending: int | None = None, name: str = "dag"):
+        self.workers = max(1, workers)
+        self.errors = 0
+        self.processed = 0
+        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix=name)
+        self._slots = threading.Semaphore(max_pending or self.workers * 64)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending: set[_Node] = set()
+        self._last: dict[str, _Node] = {}
+        self._barrier: _Node | None = None
+
+    def submit(
+        self,
+        fn: Callable[..., Any],
+        *args,
+        keys: Iterable[str] = (),
+        after: Iterable[str] = (),
+        barrier: bool = False,
+    ):
+        self._slots.acquire()
+        node = _Node(fn, args, tuple(keys))
+        with self._lock:
+            if barrier:
+                dependencies = set(self._pending)
+                self._barrier = node
+            else:
+                dependencies = {self._last[key] for key in chain(node.keys, after) if key in self._last}
+                if self._barrier is not None:
+                    dependencies.add(self._barrier)
+            for dependency in dependencies:
+                dependency.dependents.append(node)
+            node.waiting = len(dependencies)
+            for key in node.keys:
+                self._last[key] = node
+            self._pending.add(node)
+
+        if not node.waiting:
+            self._pool.submit(self._run, node)
+
+    def _run(self, node: _Node):
+        try:
+            node.fn(*node.args)
+        except Exception as e:
+            print(f"Error processing {getattr(node.fn, '__name__', node.fn)}: {e}")
+            with self._lock:
+                self.errors += 1
+        finally:
+            self._complete(node)
+
+    def _complete(self, node: _Node):
+        ready = []
+        with self._lock:
+            self._pending.discard(node)
+            for key in node.keys:
+                if self._last.get(key) is node:
+                    del self._last[key]
+            if self._barrier is node:
+                self._barrier = None
+            for dependent in node.dependents:
+                dependent.waiting -= 1
+                if not dependent.waiting:
+                    ready.append(dependent)
+            self.processed += 1
+            if not self._pending:
+                self._idle.notify_all()
+
+        for dependent in ready:
+            self._pool.submit(self._run, dependent)
+        self._slots.release()
+
+    def join(self):
+        """Block until everything submitted so far has run."""
+        with self._idle:
+            while self._pending:
+                self._idle.wait()
+
+    def shutdown(self):
+        self.join()
+        self._pool.shutdown()
@@ -0,0 +1,72 @@
+import hashlib
+
+BLOCK_SIZE = 4096
+DIGEST_SIZE = 8
+
+
+class BlockSigner:
+    """Build a compact block signature: one short digest per ``BLOCK_SIZE`` block of a file.
+
+    Data may be fed in arbitrarily sized pieces; the final block may be partial.
+    """
+
+    def __init__(self):
+        self._digests = bytearray()
+        self._partial = b""
+
+    def update(self, data: bytes):
+        if self._partial:
+            fill = BLOCK_SIZE - len(self._partial)
+            self._partial += data[:fill]
+            data = data[fill:]
+            if len(self._partial) < BLOCK_SIZE:
+                return
+            self._digests += _block_digest(self._partial)
+            self._partial = b""
+
+        view = memoryview(data)
+        full = len(data) - len(data) % BLOCK_SIZE
+        for start in range(0, full, BLOCK_SIZE):
+            self._digests += _block_digest(view[start : start + BLOCK_SIZE])
+        self._partial = bytes(view[full:])
+
+    def signature(self) -> bytes:
+        if self._partial:
+            return bytes(self._digests) + _block_digest(self._partial)
+        return bytes(self._digests)
+
+
+def sign(data: bytes) -> bytes:
+    signer = BlockSigner()
+    signer.update(data)
+    return signer.signature()
+
+
+def _block_digest(block) -> bytes:
+    return hashlib.blake2b(block, digest_size=DIGEST_SIZE).digest()
+
+
+def changed_ranges(old_signature: bytes, new_signature: bytes, new_size: int) -> list[tuple[int, int]]:
+    """Return merged ``(offset, length)`` byte ranges of the new file whose blocks differ from the old one.
+
+    Blocks are compared at the same offset only, with no rolling checksum, so bytes inserted or removed
+    in the middle of a file shift and mismatch every block after them.
+    """
+    old_blocks = len(old_signature) // DIGEST_SIZE
+    new_blocks = len(new_signature) // DIGEST_SIZE
+
+    ranges: list[tuple[int, int]] = []
+    for index in range(new_blocks):
+        start = index * DIGEST_SIZE
+        if (
+            index < old_blocks
+            and old_signature[start : start + DIGEST_SIZE] == new_signature[start : start + DIGEST_SIZE]
+        ):
+            continue
+        offset = index * BLOCK_SIZE
+        length = min(BLOCK_SIZE, new_size - offset)
+        if ranges and ranges[-1][0] + ranges[-1][1] == offset:
+            ranges[-1] = (ranges[-1][0], ranges[-1][1] + length)
+        else:
+            ranges.append((offset, length))
+    return ranges
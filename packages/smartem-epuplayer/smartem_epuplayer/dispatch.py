@@ -0,0 +1,147 @@
+import queue
+import threading
+import time
+import zlib
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from typing import Any
+
+
+@dataclass
+class _Task:
+    enqueued_at: float
+    fn: Callable[..., Any]
+    args: tuple
+    # Set for tasks spanning several workers: all of them meet at the barrier, the leader runs fn
+    barrier: threading.Barrier | None = None
+    done: threading.Event | None = None
+    leader: bool = True
+
+
+@dataclass
+class DispatchStats:
+    depth: int = 0
+    max_depth: int = 0
+    processed: int = 0
+    last_lag: float = 0.0
+    max_lag: float = 0.0
+    errors: int = 0
+    saturations: int = 0  # Submissions that had to wait for room in a full queue
+    per_worker_depth: list[int] = field(default_factory=list)
+
+
+class OrderedDispatcher:
+    """Run work on a pool of threads while preserving submission order per key.
+
+    Each key is pinned to one worker with its own bounded FIFO queue, so work for a key runs in
+    order while unrelated keys proceed in parallel. :meth:`submit` blocks when the target queue is
+    full, applying back-pressure to the producer. Work spanning several keys is submitted with
+    :meth:`submit_multi` and runs once every involved worker has reached it, keeping it ordered
+    against the work queued before and after it on each of them.
+    """
+
+    def __init__(self, workers: int = 4, max_queue: int = 10000, name: str = "dispatch"):
+        self.workers = max(1, workers)
+        per_worker = max(1, max_queue // self.workers)
+        self._queues: list[queue.Queue[_Task | None]] = [queue.Queue(maxsize=per_worker) for _ in range(self.workers)]
+        self._stats = DispatchStats()
+        self._stats_lock = threading.Lock()
+        # Multi-worker tasks must reach every worker queue in the same relative order, or two of
+        # them can each hold a worker at its barrier while the other worker waits at the other's
+        self._multi_lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._run, args=(q,), name=f"{name}-{i}", daemon=True)
+            for i, q in enumerate(self._queues)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _worker_for(self, key: str) -> int:
+        return zlib.crc32(key.encode("utf-8", "surrogateescape")) % self.workers
+
+    def submit(self, key: str, fn: Callable[..., Any], *args):
+        self._put(self._worker_for(key), _Task(time.monotonic(), fn, args))
+
+    def submit_multi(self, keys: Iterable[str] | None, fn: Callable[..., Any], *args):
+        """Submit work ordered against several keys; ``None`` orders it against every key."""
+        indices = list(range(self.workers)) if keys is None else sorted({self._worker_for(k) for k in keys})
+        if len(indices) == 1:
+            self._put(indices[0], _Task(time.monotonic(), fn, args))
+            return
+
+        barrier = threading.Barrier(len(indices))
+        done = threading.Event()
+        enqueued_at = time.monotonic()
+        with self._multi_lock:
+            for n, index in enumerate(indices):
+                self._put(index, _Task(enqueued_at, fn, args, barrier, done, leader=n == 0))
+
+    def _put(self, index: int, task: _Task):
+        if self._queues[index].full():
+            with self._stats_lock:
+                self._stats.saturations += 1
+        self._queues[index].put(task)
+        depth = self.depth()
+        with self._stats_lock:
+            self._stats.max_depth = max(self._stats.max_depth, depth)
+
+    def _run(self, work_queue: "queue.Queue[_Task | None]"):
+        while True:
+            task = work_queue.get()
+            try:
+                if task is None:
+                    return
+                self._execute(task)
+            finally:
+                work_queue.task_done()
+
+    def _execute(self, task: _Task):
+        if task.barrier is not None:
+            task.barrier.wait()
+            if not task.leader:
+                task.done.wait()
+                return
+
+        lag = time.monotonic() - task.enqueued_at
+        try:
+            task.fn(*task.args)
+        except Exception as e:
+            print(f"Error processing {getattr(task.fn, '__name__', task.fn)}: {e}")
+            with self._stats_lock:
+                self._stats.errors += 1
+        finally:
+            if task.done is not None:
+                task.done.set()
+
+        with self._stats_lock:
+            self._stats.processed += 1
+            self._stats.last_lag = lag
+            self._stats.max_lag = max(self._stats.max_lag, lag)
+
+    def depth(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    def stats(self) -> DispatchStats:
+        with self._stats_lock:
+            return DispatchStats(
+                depth=self.depth(),
+                max_depth=self._stats.max_depth,
+                processed=self._stats.processed,
+                last_lag=self._stats.last_lag,
+                max_lag=self._stats.max_lag,
+                errors=self._stats.errors,
+                saturations=self._stats.saturations,
+                per_worker_depth=[q.qsize() for q in self._queues],
+            )
+
+    def join(self):
+        """Block until everything submitted so far has been processed."""
+        for work_queue in self._queues:
+            work_queue.join()
+
+    def stop(self):
+        """Process everything already queued, then stop the workers."""
+        for work_queue in self._queues:
+            work_queue.put(None)
+        for thread in self._threads:
+            thread.join()
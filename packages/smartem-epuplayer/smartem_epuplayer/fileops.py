@@ -0,0 +1,109 @@
+import os
+import sys
+from pathlib import Path
+from typing import BinaryIO
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+ZERO_BLOCK_SIZE = 1024 * 1024
+COPY_BUFFER_SIZE = 1024 * 1024
+FICLONE = 0x40049409  # _IOW(0x94, 9, int) in linux/fs.h
+
+
+def _write_zeros(f, size: int):
+    zeros = bytes(ZERO_BLOCK_SIZE)
+    remaining = size
+    while remaining > 0:
+        remaining -= f.write(zeros[: min(remaining, ZERO_BLOCK_SIZE)])
+
+
+def create_placeholder(path: Path, size: int | None, allocate: bool = False):
+    """Make ``path`` a zero-filled file of ``size`` bytes, replacing any previous content.
+
+    By default the file is only extended, which leaves it sparse on filesystems that support holes
+    (ext4, XFS, tmpfs, APFS) so nothing is written. With ``allocate`` the blocks are reserved with
+    ``posix_fallocate`` where available, or written as zeros a block at a time elsewhere.
+    """
+    size = size or 0
+    with open(path, "wb") as f:
+        if not allocate:
+            f.truncate(size)
+            return
+        if size and hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(f.fileno(), 0, size)
+                return
+            except OSError:
+                pass  # Not supported by this filesystem
+        _write_zeros(f, size)
+
+
+def _clone(src_fd: int, dst_fd: int) -> bool:
+    """Share the source's blocks with the (empty) destination, on btrfs, XFS and other reflink filesystems."""
+    if fcntl is None or sys.platform != "linux":
+        return False
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+    except OSError:
+        return False
+    return True
+
+
+def _kernel_copy(src_fd: int, dst_fd: int, offset: int, position: int, length: int) -> int:
+    """Copy without passing data through Python; return how many bytes were copied (possibly none)."""
+    copied = 0
+    if hasattr(os, "copy_file_range"):
+        try:
+            while copied < length:
+                count = os.copy_file_range(src_fd, dst_fd, length - copied, offset + copied, position + copied)
+                if not count:
+                    break
+                copied += count
+        except OSError:
+            pass  # Cross-filesystem on older kernels, or not supported by the filesystem
+    if copied < length and sys.platform == "linux" and hasattr(os, "sendfile"):
+        try:
+            os.lseek(dst_fd, position + copied, os.SEEK_SET)
+            while copied < length:
+                count = os.sendfile(dst_fd, src_fd, offset + copied, length - copied)
+                if not count:
+                    break
+                copied += count
+        except OSError:
+            pass
+    return copied
+
+
+def copy_from_file(dst: BinaryIO, src_path: Path, offset: int = 0, length: int | None = None):
+    """Write ``length`` bytes of ``src_path``, starting at ``offset``, at the current position of ``dst``.
+
+    The data never sits in memory as a whole: it is reflinked when it is a whole file going into
+    an empty one, copied in the kernel with ``copy_file_range`` or ``sendfile`` where available,
+    and streamed through a small buffer otherwise. ``dst`` must not be opened in append mode.
+    """
+    with open(src_path, "rb") as src:
+        src_size = os.fstat(src.fileno()).st_size
+        if length is None:
+            length = src_size - offset
+        dst.flush()
+        position = dst.tell()
+        dst_fd = dst.fileno()
+
+        whole_file = offset == 0 and position == 0 and length == src_size and os.fstat(dst_fd).st_size == 0
+        if whole_file and _clone(src.fileno(), dst_fd):
+            dst.seek(length)
+            return
+
+        copied = _kernel_copy(src.fileno(), dst_fd, offset, position, length)
+        src.seek(offset + copied)
+        dst.seek(position + copied)
+        remaining = length - copied
+        while remaining > 0:
+            block = src.read(min(COPY_BUFFER_SIZE, remaining))
+            if not block:
+                raise EOFError(f"{src_path} is shorter than expected")
+            dst.write(block)
+            remaining -= len(block)
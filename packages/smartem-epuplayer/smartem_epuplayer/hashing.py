@@ -0,0 +1,42 @@
+import hashlib
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+try:
+    import xxhash
+except ImportError:  # Optional: pip install "smartem-epuplayer[xxhash]"
+    xxhash = None
+
+DEFAULT_HASH_ALGORITHM = "sha256"
+HASH_ALGORITHMS = ("sha256", "blake2b", "xxh3")
+HASH_BUFFER_SIZE = 1024 * 1024
+
+_FACTORIES: dict[str, Callable[[], Any]] = {
+    "sha256": hashlib.sha256,
+    "blake2b": lambda: hashlib.blake2b(digest_size=32),
+}
+if xxhash is not None:
+    _FACTORIES["xxh3"] = xxhash.xxh3_128
+
+
+def available_hash_algorithms() -> list[str]:
+    return list(_FACTORIES)
+
+
+def new_hasher(algorithm: str = DEFAULT_HASH_ALGORITHM):
+    """Return a hash object with ``update``, ``copy`` and ``hexdigest`` for a supported algorithm."""
+    factory = _FACTORIES.get(algorithm)
+    if factory is None:
+        if algorithm in HASH_ALGORITHMS:
+            raise ValueError(f"Hash algorithm {algorithm!r} needs the xxhash package: pip install xxhash")
+        raise ValueError(f"Unknown hash algorithm {algorithm!r}, expected one of {', '.join(HASH_ALGORITHMS)}")
+    return factory()
+
+
+def hash_file(file_path: Path, algorithm: str = DEFAULT_HASH_ALGORITHM, buffer_size: int = HASH_BUFFER_SIZE) -> str:
+    hasher = new_hasher(algorithm)
+    with open(file_path, "rb", buffering=0) as f:
+        while block := f.read(buffer_size):
+            hasher.update(block)
+    return hasher.hexdigest()
@@ -0,0 +1,91 @@
+import json
+import os
+import threading
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+from .models import EPUEvent
+
+
+class EventJournal:
+    """Append-only JSON-lines journal of recorded events.
+
+    Every event is written (and flushed to the OS) as soon as it is recorded, so a
+    crashed or killed recorder loses at most the line being written. ``fsync`` is
+    issued in batches to bound the cost on slow network filesystems.
+    """
+
+    def __init__(self, path: Path, fsync_batch: int = 256, fsync_interval: float = 1.0):
+        self.path = Path(path)
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.count = self._repair() if self.path.exists() else 0
+
+        self._lock = threading.Lock()
+        self._file = open(self.path, "a", encoding="utf-8")  # noqa: SIM115
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _repair(self) -> int:
+        """Count intact records and cut off a torn final line so appends start on a clean boundary."""
+        count = 0
+        valid_end = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                count += 1
+                valid_end += len(line)
+        if valid_end != self.path.stat().st_size:
+            os.truncate(self.path, valid_end)
+        return count
+
+    def append(self, event: EPUEvent):
+        line = json.dumps(event.to_dict(), separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self.count += 1
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_batch or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.flush()
+            self._sync()
+            self._file.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[EPUEvent]:
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+        for event_data in iter_journal(self.path):
+            yield EPUEvent(**event_data)
+
+
+def iter_journal(path: Path) -> Iterator[dict]:
+    """Yield raw event dicts from a journal, ignoring a torn final line left by a crash."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                break
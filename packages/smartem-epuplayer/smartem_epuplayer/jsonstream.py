@@ -0,0 +1,120 @@
+"""Incremental decoding of ``{"metadata": {...}, "events": [...]}`` recording documents.
+
+Legacy JSON recordings and the ``recording.json`` inside v2 archives hold every event in one
+document. Decoding them element by element keeps memory flat and lets replay start on the
+first event instead of waiting for the whole file to be parsed.
+"""
+
+import json
+import re
+from collections.abc import Iterator
+from typing import Any, TextIO
+
+READ_SIZE = 256 * 1024
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class _Stream:
+    def __init__(self, f: TextIO):
+        self._f = f
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        self._buf = self._buf[self._pos :]
+        self._pos = 0
+        # Grow reads with the pending value so a huge element is not re-parsed once per READ_SIZE
+        data = self._f.read(max(READ_SIZE, len(self._buf)))
+        if not data:
+            self._eof = True
+            return False
+        self._buf += data
+        return True
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it, or '' at end of input."""
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Invalid recording: expected {char!r}, found {found or 'end of file'!r}")
+        self._pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number or literal running into the end of the buffer may continue in the next read
+            if end == len(self._buf) and not isinstance(value, dict | list | str) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+
+def _iter_members(stream: _Stream) -> Iterator[str]:
+    """Yield the keys of the top-level object; the caller consumes each value."""
+    stream.expect("{")
+    if stream.peek() == "}":
+        return
+    while True:
+        key = stream.value()
+        stream.expect(":")
+        yield key
+        if stream.peek() != ",":
+            stream.expect("}")
+            return
+        stream.expect(",")
+
+
+def _iter_array(stream: _Stream) -> Iterator[Any]:
+    stream.expect("[")
+    if stream.peek() == "]":
+        stream.expect("]")
+        return
+    while True:
+        yield stream.value()
+        if stream.peek() != ",":
+            stream.expect("]")
+            return
+        stream.expect(",")
+
+
+def read_recording_metadata(f: TextIO) -> dict[str, Any]:
+    stream = _Stream(f)
+    for key in _iter_members(stream):
+        if key == "metadata":
+            return stream.value()
+        if key == "events":
+            # Metadata written after the events: step over them without holding on to any
+            for _event in _iter_array(stream):
+                pass
+        else:
+            stream.value()
+    raise ValueError("Invalid recording: missing metadata")
+
+
+def iter_recording_events(f: TextIO) -> Iterator[dict[str, Any]]:
+    """Yield event dicts one at a time, in recorded order."""
+    stream = _Stream(f)
+    for key in _iter_members(stream):
+        if key == "events":
+            yield from _iter_array(stream)
+            return
+        stream.value()
+    raise ValueError("Invalid recording: missing events")
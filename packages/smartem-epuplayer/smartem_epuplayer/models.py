@@ -1,8 +1,11 @@
-from dataclasses import dataclass
+from array import array
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, fields
 from typing import Any
 
 
-@dataclass
+@dataclass(slots=True)
 class EPUEvent:
     timestamp: float
     event_type: str  # created, modified, deleted, moved, appended, truncated, patched
@@ -12,8 +15,131 @@ class EPUEvent:
     content: str | None = None  # For small text files
     size: int | None = None
     # New fields for diff-based recording
-    content_hash: str | None = None  # SHA256 hash for integrity
+    content_hash: str | None = None  # Integrity digest by metadata["hash_algorithm"] (sha256, blake2b or xxh3)
     binary_chunk_id: str | None = None  # Reference to binary chunk in tar
     operation_data: dict[str, Any] | None = None  # append_data, patch_info, etc.
     file_position: int | None = None  # For append/patch operations
     is_placeholder: bool = False  # True if this is a placeholder file
+
+    def to_dict(self) -> dict[str, Any]:
+        """Field values as a dict; unlike ``asdict()``, operation_data is not deep-copied."""
+        return {name: getattr(self, name) for name in _EVENT_FIELDS}
+
+
+_EVENT_FIELDS = tuple(field.name for field in fields(EPUEvent))
+
+EVENT_TYPES = (
+    "initial_dir",
+    "initial_file",
+    "created",
+    "modified",
+    "deleted",
+    "moved",
+    "appended",
+    "truncated",
+    "patched",
+)
+
+_IS_DIRECTORY = 1
+_IS_PLACEHOLDER = 2
+
+
+class EventTable:
+    """Columnar store for many events.
+
+    Timestamps, sizes and offsets live in typed arrays, paths are interned once per table and
+    event types are stored as one-byte codes, so a row costs a few dozen bytes instead of a full
+    EPUEvent. Rows are materialized as EPUEvent on access. With ``payload=False`` content,
+    hashes, chunk references and operation data are dropped, for summaries of huge recordings.
+    """
+
+    def __init__(self, events: Iterable[EPUEvent | dict[str, Any]] = (), payload: bool = True):
+        self.payload = payload
+        self.timestamps = array("d")
+        self._types = array("B")
+        self._src_paths = array("I")
+        self._dest_paths = array("i")  # -1: no destination
+        self._flags = array("B")
+        self._sizes = array("q")  # -1: unknown
+        self._positions = array("q")  # -1: none
+        self._hashes: list[str | None] = []
+        # Rarely set fields, by row: (content, binary_chunk_id, operation_data)
+        self._extras: dict[int, tuple[str | None, str | None, dict[str, Any] | None]] = {}
+        self._paths: list[str] = []
+        self._path_ids: dict[str, int] = {}
+        self._type_names = list(EVENT_TYPES)
+        self._type_codes = {name: code for code, name in enumerate(EVENT_TYPES)}
+        self.extend(events)
+
+    def _path_id(self, path: str) -> int:
+        path_id = self._path_ids.get(path)
+        if path_id is None:
+            path_id = self._path_ids[path] = len(self._paths)
+            self._paths.append(path)
+        return path_id
+
+    def _type_code(self, event_type: str) -> int:
+        code = self._type_codes.get(event_type)
+        if code is None:
+            code = self._type_codes[event_type] = len(self._type_names)
+            self._type_names.append(event_type)
+        return code
+
+    def append(self, event: EPUEvent | dict[str, Any]):
+        if isinstance(event, dict):
+            event = EPUEvent(**event)
+        row = len(self.timestamps)
+        self.timestamps.append(event.timestamp)
+        self._types.append(self._type_code(event.event_type))
+        self._src_paths.append(self._path_id(event.src_path))
+        self._dest_paths.append(-1 if event.dest_path is None else self._path_id(event.dest_path))
+        self._flags.append(
+            (_IS_DIRECTORY if event.is_directory else 0) | (_IS_PLACEHOLDER if event.is_placeholder else 0)
+        )
+        self._sizes.append(-1 if event.size is None else event.size)
+        self._positions.append(-1 if event.file_position is None else event.file_position)
+        if self.payload:
+            self._hashes.append(event.content_hash)
+            if event.content is not None or event.binary_chunk_id is not None or event.operation_data is not None:
+                self._extras[row] = (event.content, event.binary_chunk_id, event.operation_data)
+
+    def extend(self, events: Iterable[EPUEvent | dict[str, Any]]):
+        for event in events:
+            self.append(event)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def _row(self, row: int) -> EPUEvent:
+        content, binary_chunk_id, operation_data = self._extras.get(row, (None, None, None))
+        dest_path = self._dest_paths[row]
+        size = self._sizes[row]
+        position = self._positions[row]
+        flags = self._flags[row]
+        return EPUEvent(
+            timestamp=self.timestamps[row],
+            event_type=self._type_names[self._types[row]],
+            src_path=self._paths[self._src_paths[row]],
+            dest_path=None if dest_path < 0 else self._paths[dest_path],
+            is_directory=bool(flags & _IS_DIRECTORY),
+            content=content,
+            size=None if size < 0 else size,
+            content_hash=self._hashes[row] if self.payload else None,
+            binary_chunk_id=binary_chunk_id,
+            operation_data=operation_data,
+            file_position=None if position < 0 else position,
+            is_placeholder=bool(flags & _IS_PLACEHOLDER),
+        )
+
+    def __getitem__(self, index: int | slice) -> EPUEvent | list[EPUEvent]:
+        rows = range(len(self))
+        if isinstance(index, slice):
+            return [self._row(row) for row in rows[index]]
+        return self._row(rows[index])
+
+    def __iter__(self) -> Iterator[EPUEvent]:
+        for row in range(len(self)):
+            yield self._row(row)
+
+    def type_counts(self) -> dict[str, int]:
+        return {self._type_names[code]: count for code, count in Counter(self._types).items()}
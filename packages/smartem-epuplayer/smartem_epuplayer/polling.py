@@ -0,0 +1,217 @@
+import os
+import time
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+
+from watchdog.events import (
+    DirCreatedEvent,
+    DirDeletedEvent,
+    FileCreatedEvent,
+    FileDeletedEvent,
+    FileModifiedEvent,
+)
+from watchdog.observers.api import DEFAULT_EMITTER_TIMEOUT, BaseObserver, EventEmitter
+
+from .scanner import scan_tree
+
+# Directory listings are trusted only once the clock has moved this far past the directory's mtime,
+# since SMB/FAT timestamps are this coarse and an entry added within the same tick leaves mtime unchanged
+MTIME_GRANULARITY_NS = 2_000_000_000
+
+
+@dataclass(slots=True)
+class DirectoryIndexEntry:
+    mtime_ns: int
+    listed_at_ns: int  # Wall-clock time the listing below was taken
+    files: dict[str, tuple[int, int]] = field(default_factory=dict)  # name -> (size, mtime_ns)
+    subdirs: set[str] = field(default_factory=set)
+    last_change: float = 0.0  # Monotonic time a change was last seen in this directory
+    last_full_check: float = 0.0  # Monotonic time the listing and file stats were last refreshed
+
+    def is_hot(self, now: float, hot_window: float) -> bool:
+        return self.last_change > 0 and now - self.last_change < hot_window
+
+
+class IndexedPollingEmitter(EventEmitter):
+    """Poll a tree through a directory-level index rather than re-stating every file each pass.
+
+    Each pass stats every indexed directory and lists a directory again only when its mtime moved,
+    which is how entries being created, deleted or renamed show up. Files are stat'ed for content
+    changes on every pass in "hot" directories, those with a change in the last ``hot_window``
+    seconds, and every ``cold_interval`` seconds elsewhere. Renames are reported as a deletion plus a
+    creation, and symlinked directories are not followed, as with :func:`scan_tree`.
+    """
+
+    def __init__(
+        self,
+        event_queue,
+        watch,
+        *,
+        timeout: float = DEFAULT_EMITTER_TIMEOUT,
+        event_filter=None,
+        cold_interval: float = 30.0,
+        hot_window: float = 60.0,
+    ):
+        super().__init__(event_queue, watch, timeout=timeout, event_filter=event_filter)
+        self.cold_interval = cold_interval
+        self.hot_window = hot_window
+        self.root = str(Path(os.fsdecode(watch.path)))
+        self.index: dict[str, DirectoryIndexEntry] = {}
+
+    def on_thread_start(self):
+        self.index = {}
+        self._index_tree(self.root, emit=False)
+
+    def queue_events(self, timeout: float):
+        # As with watchdog's polling emitter, the timeout doubles as the polling interval
+        if self.stopped_event.wait(timeout):
+            return
+        self.poll()
+
+    def poll(self):
+        """Run one polling pass, queueing events for every change found."""
+        now = time.monotonic()
+        stack = [self.root]
+        while stack:
+            dir_path = stack.pop()
+            entry = self.index.get(dir_path)
+            if entry is None:
+                continue
+            try:
+                stat = os.stat(dir_path)
+            except OSError:
+                if dir_path == self.root:
+                    self.queue_event(DirDeletedEvent(self.root))
+                    self.stop()
+                    return
+                # Its parent's listing changed too, which reports the deletion
+                continue
+
+            full_check = now - entry.last_full_check >= self.cold_interval
+            if (
+                full_check
+                or stat.st_mtime_ns != entry.mtime_ns
+                or entry.listed_at_ns - entry.mtime_ns < MTIME_GRANULARITY_NS
+            ):
+                self._relist(dir_path, entry, stat, now)
+            if full_check or entry.is_hot(now, self.hot_window):
+                self._check_files(dir_path, entry, now)
+            if full_check:
+                entry.last_full_check = now
+
+            stack.extend(os.path.join(dir_path, name) for name in sorted(entry.subdirs, reverse=True))
+
+    def _relist(self, dir_path: str, entry: DirectoryIndexEntry, stat: os.stat_result, now: float):
+        listed_at_ns = time.time_ns()
+        files: set[str] = set()
+        subdirs: set[str] = set()
+        try:
+            with os.scandir(dir_path) as it:
+                for item in it:
+                    try:
+                        if item.is_dir():
+                            if not item.is_symlink():
+                                subdirs.add(item.name)
+                        else:
+                            files.add(item.name)
+                    except OSError:
+                        continue
+        except OSError:
+            return
+
+        changed = False
+        for name in sorted(entry.files.keys() - files):
+            del entry.files[name]
+            self.queue_event(FileDeletedEvent(os.path.join(dir_path, name)))
+            changed = True
+        for name in sorted(entry.subdirs - subdirs):
+            entry.subdirs.discard(name)
+            self._forget_tree(os.path.join(dir_path, name))
+            changed = True
+        for name in sorted(files - entry.files.keys()):
+            path = os.path.join(dir_path, name)
+            try:
+                file_stat = os.stat(path)
+            except OSError:
+                continue
+            entry.files[name] = (file_stat.st_size, file_stat.st_mtime_ns)
+            self.queue_event(FileCreatedEvent(path))
+            changed = True
+        for name in sorted(subdirs - entry.subdirs):
+            entry.subdirs.add(name)
+            self._index_tree(os.path.join(dir_path, name), emit=True)
+            changed = True
+
+        entry.mtime_ns = stat.st_mtime_ns
+        entry.listed_at_ns = listed_at_ns
+        if changed:
+            entry.last_change = now
+
+    def _check_files(self, dir_path: str, entry: DirectoryIndexEntry, now: float):
+        for name, previous in list(entry.files.items()):
+            path = os.path.join(dir_path, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Gone: the directory's next listing reports the deletion
+                continue
+            current = (stat.st_size, stat.st_mtime_ns)
+            if current != previous:
+                entry.files[name] = current
+                entry.last_change = now
+                self.queue_event(FileModifiedEvent(path))
+
+    def _index_tree(self, root: str, emit: bool):
+        """Add ``root`` and everything below it to the index, optionally reporting them as created."""
+        root_entry = self._new_entry(root)
+        if root_entry is None:
+            return
+        self.index[root] = root_entry
+        if emit:
+            root_entry.last_change = time.monotonic()
+            self.queue_event(DirCreatedEvent(root))
+
+        for item in scan_tree(Path(root)):
+            path = str(item.path)
+            parent = self.index.get(os.path.dirname(path))
+            if parent is None:
+                continue
+            if item.is_directory:
+                entry = self._new_entry(path)
+                if entry is None:
+                    continue
+                parent.subdirs.add(item.path.name)
+                self.index[path] = entry
+                if emit:
+                    entry.last_change = root_entry.last_change
+                    self.queue_event(DirCreatedEvent(path))
+            else:
+                parent.files[item.path.name] = (item.stat.st_size, item.stat.st_mtime_ns)
+                if emit:
+                    self.queue_event(FileCreatedEvent(path))
+
+    def _new_entry(self, dir_path: str) -> DirectoryIndexEntry | None:
+        # Stat before listing, so a change made during the listing still moves mtime on the next pass
+        try:
+            stat = os.stat(dir_path)
+        except OSError:
+            return None
+        return DirectoryIndexEntry(stat.st_mtime_ns, time.time_ns(), last_full_check=time.monotonic())
+
+    def _forget_tree(self, root: str):
+        """Drop ``root`` and everything below it from the index, reporting them deleted bottom-up."""
+        prefix = root + os.sep
+        for dir_path in sorted((p for p in self.index if p == root or p.startswith(prefix)), reverse=True):
+            entry = self.index.pop(dir_path)
+            for name in sorted(entry.files):
+                self.queue_event(FileDeletedEvent(os.path.join(dir_path, name)))
+            self.queue_event(DirDeletedEvent(dir_path))
+
+
+class IndexedPollingObserver(BaseObserver):
+    """Observer for network shares where inotify does not fire; see :class:`IndexedPollingEmitter`."""
+
+    def __init__(self, interval: float = 0.5, cold_interval: float = 30.0, hot_window: float = 60.0):
+        emitter_cls = partial(IndexedPollingEmitter, cold_interval=cold_interval, hot_window=hot_window)
+        super().__init__(emitter_cls, timeout=interval)
@@ -1,20 +1,86 @@
 import hashlib
+import io
 import json
 import os
 import shutil
 import sys
 import tarfile
 import tempfile
+import threading
 import time
-from dataclasses import asdict
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path, PurePosixPath
-from typing import Any
-
-from watchdog.events import FileSystemEvent, FileSystemEventHandler
+from typing import Any, BinaryIO
+
+from watchdog.events import (
+    DirCreatedEvent,
+    DirDeletedEvent,
+    FileCreatedEvent,
+    FileDeletedEvent,
+    FileModifiedEvent,
+    FileSystemEvent,
+    FileSystemEventHandler,
+)
 from watchdog.observers import Observer
 
-from .models import EPUEvent
+from .coalescer import EventCoalescer, PendingChange
+from .container import ContainerWriter, RecordingContainer, is_container
+from .delta import BLOCK_SIZE, DIGEST_SIZE, BlockSigner, changed_ranges, sign
+from .dispatch import OrderedDispatcher
+from .hashing import DEFAULT_HASH_ALGORITHM, new_hasher
+from .journal import EventJournal, iter_journal
+from .jsonstream import iter_recording_events
+from .models import EPUEvent, EventTable
+from .polling import IndexedPollingObserver
+from .scanner import ScanEntry, ScanProgress, scan_tree
+from .state import DeltaCache, DeltaState, FileState, FileStateTable
+
+JOURNAL_FILENAME = "events.jsonl"
+SESSION_FILENAME = "session.json"
+
+# Files below this size are stored inline (text) or as a single chunk; larger files are streamed
+INLINE_CONTENT_LIMIT = 1024 * 1024
+READ_BUFFER_SIZE = 1024 * 1024
+
+# Bytes kept from the start and end of each tracked file to check that an append left the prefix intact
+EDGE_SAMPLE_SIZE = 64
+# Blocks spread over each tracked file and re-read to check that an append left its middle intact too
+SAMPLED_BLOCKS = 8
+SAMPLE_BLOCK_SIZE = 4096
+
+# A rewrite is recorded as a "patched" event when at most this fraction of the file changed. Replayers that
+# read only v2 skip patched events, so v2 recordings keep every rewrite as a full "modified" event instead.
+PATCH_MAX_CHANGED_RATIO = 0.5
+
+# "v2" is a tar.gz of recording.json and chunks/; "v3" the random-access container in container.py
+ARCHIVE_FORMATS = ("v2", "v3")
+
+# How placeholder files are fingerprinted: "stat" uses (size, mtime_ns, inode) without reading the file,
+# "sampled" adds a hash of its first and last FINGERPRINT_SAMPLE_SIZE bytes, "hash" hashes all of it
+PLACEHOLDER_FINGERPRINTS = ("stat", "sampled", "hash")
+FINGERPRINT_SAMPLE_SIZE = 64 * 1024
+
+
+@dataclass
+class IngestResult:
+    content_hash: str
+    is_placeholder: bool = False
+    data: bytes | None = None  # Full content of small files
+    binary_chunk_id: str | None = None  # Large files streamed straight into the chunk store
+    unreadable: bool = False
+    hasher: Any = None  # Hash state after the last byte read, resumable for appends
+    head: bytes = b""
+    tail: bytes = b""
+    samples: tuple[tuple[int, bytes], ...] = ()  # (offset, digest) of sampled blocks
+    blocks: bytes | None = None  # Block signature for delta detection, None for placeholders
+
+    def delta_state(self) -> DeltaState | None:
+        if self.hasher is None:
+            return None
+        return DeltaState(self.hasher, self.head, self.tail, self.samples, self.blocks)
 
 
 class EPURecorder(FileSystemEventHandler):
@@ -25,39 +91,292 @@ class EPURecorder(FileSystemEventHandler):
         skip_binary_content: bool = True,
         force_text_extensions: list[str] | None = None,
         force_binary_extensions: list[str] | None = None,
+        resume_dir: str | None = None,
+        scan_workers: int | None = None,
+        quiet_window: float = 0.5,
+        delta_cache_mb: float = 256,
+        record_workers: int = 4,
+        queue_size: int = 10000,
+        reconcile_interval: float = 0,
+        poll_interval: float | None = None,
+        poll_cold_interval: float = 30.0,
+        placeholder_fingerprint: str = "stat",
+        hash_algorithm: str = DEFAULT_HASH_ALGORITHM,
+        archive_format: str = "v2",
     ):
         self.watch_dir = Path(watch_dir).resolve()
         self.output_file = Path(output_file)
-        self.events: list[EPUEvent] = []
-        self.observer = Observer()
+        if archive_format not in ARCHIVE_FORMATS:
+            raise ValueError(f"Unknown archive format {archive_format!r}")
+        self.archive_format = archive_format
+        self.record_patches = archive_format != "v2"
+        # Network shares do not deliver inotify events, so they are polled through a directory index instead
+        if poll_interval:
+            self.observer = IndexedPollingObserver(poll_interval, cold_interval=poll_cold_interval)
+        else:
+            self.observer = Observer()
         self.running = False
 
         # Binary content handling settings
         self.skip_binary_content = skip_binary_content
         self.force_text_extensions = {ext.lower().lstrip(".") for ext in (force_text_extensions or [])}
         self.force_binary_extensions = {ext.lower().lstrip(".") for ext in (force_binary_extensions or [])}
+        if placeholder_fingerprint not in PLACEHOLDER_FINGERPRINTS:
+            raise ValueError(f"Unknown placeholder fingerprint {placeholder_fingerprint!r}")
+        self.placeholder_fingerprint = placeholder_fingerprint
+        new_hasher(hash_algorithm)  # Fail early if the algorithm is unknown or not installed
+        self.hash_algorithm = hash_algorithm
 
         # Track file states for diff calculation
-        self.file_states: dict[str, dict[str, Any]] = {}
+        self.file_states = FileStateTable()
+        # Hash state, edge samples and block signatures live in a bounded LRU; evictions only cost a rehash
+        self.delta_cache = DeltaCache(int(delta_cache_mb * 1024 * 1024))
         self.binary_chunks: dict[str, bytes] = {}
-        self.chunk_counter = 0
+
+        # Chunks are content-addressed, so identical payloads are only stored once
+        self.chunk_stats = {"stored": 0, "deduplicated": 0, "bytes_saved": 0}
+        self._chunk_lock = threading.Lock()
+
+        # Observer callbacks only enqueue notifications; workers record them, in order per directory
+        self.dispatcher = OrderedDispatcher(record_workers, queue_size, name="epurecorder-worker")
+        self._notification = threading.local()
+
+        # Directories known to exist, so a rescan can tell which ones the watcher missed
+        self.known_dirs: set[str] = set()
+
+        # Rescan the tree every reconcile_interval seconds (0 disables) and whenever events may have been dropped
+        self.reconcile_interval = reconcile_interval
+        self.reconcile_stats = {"runs": 0, "missed": 0}
+        self._reconciled_at = time.time()
+        self._saturations_seen = 0
+
+        # Debounce bursts of created/modified notifications per path; 0 records every notification
+        self.coalescer = EventCoalescer(self._flush_pending_change, quiet_window) if quiet_window > 0 else None
+
+        # Worker threads used for hashing and reading during tree scans
+        self.scan_workers = scan_workers or min(32, (os.cpu_count() or 1) + 4)
 
         # Track unreadable files for reporting
-        self.unreadable_files: list[str] = []
+        self.unreadable_files: set[str] = set()
 
         # Track placeholder files for reporting
-        self.placeholder_files: list[str] = []
-
-        # Create temp directory for binary chunks
-        self.temp_dir = Path(tempfile.mkdtemp(prefix="epurecorder_"))
+        self.placeholder_files: set[str] = set()
+
+        if resume_dir:
+            # Continue an interrupted session from its temp directory and journal
+            self.temp_dir = Path(resume_dir)
+            self.journal = EventJournal(self.temp_dir / JOURNAL_FILENAME)
+            self.session = json.loads((self.temp_dir / SESSION_FILENAME).read_text())
+            self.session.setdefault("resumed_at", []).append(datetime.now().isoformat())
+            self._write_session()
+
+            last_timestamp = self._restore_state()
+            self._catch_up(last_timestamp)
+        else:
+            # Create temp directory for binary chunks and the event journal
+            self.temp_dir = Path(tempfile.mkdtemp(prefix="epurecorder_"))
+            self.journal = EventJournal(self.temp_dir / JOURNAL_FILENAME)
+            self.session = {
+                "watch_dir": str(self.watch_dir),
+                "output_file": str(self.output_file.resolve()),
+                "skip_binary_content": self.skip_binary_content,
+                "force_text_extensions": sorted(self.force_text_extensions),
+                "force_binary_extensions": sorted(self.force_binary_extensions),
+                "placeholder_fingerprint": self.placeholder_fingerprint,
+                "hash_algorithm": self.hash_algorithm,
+                "started_at": datetime.now().isoformat(),
+            }
+            self._write_session()
+
+            # Capture initial state
+            self._capture_initial_state()
+
+    @classmethod
+    def resume(cls, path: str, output_file: str | None = None, **kwargs) -> "EPURecorder":
+        """Resume an interrupted recording from its ``epurecorder_*`` temp directory or journal file."""
+        resume_dir = Path(path)
+        if resume_dir.is_file():
+            resume_dir = resume_dir.parent
+        session_file = resume_dir / SESSION_FILENAME
+        if not session_file.exists() or not (resume_dir / JOURNAL_FILENAME).exists():
+            raise FileNotFoundError(f"No resumable recording found in {resume_dir}")
+
+        session = json.loads(session_file.read_text())
+        # Fingerprints must stay comparable with the ones already journalled
+        kwargs["placeholder_fingerprint"] = session.get("placeholder_fingerprint", "hash")
+        kwargs["hash_algorithm"] = session.get("hash_algorithm", "sha256")
+        return cls(
+            session["watch_dir"],
+            output_file or session["output_file"],
+            session["skip_binary_content"],
+            session["force_text_extensions"],
+            session["force_binary_extensions"],
+            resume_dir=str(resume_dir),
+            **kwargs,
+        )
 
-        # Capture initial state
-        self._capture_initial_state()
+    @property
+    def events(self) -> EventTable:
+        """Events recorded so far, read back from the journal or, once stopped, from the archive."""
+        if self.journal.path.exists():
+            return EventTable(self.journal)
+        if is_container(self.output_file):
+            with RecordingContainer(self.output_file) as container:
+                return EventTable(container.iter_events())
+        with (
+            tarfile.open(self.output_file, "r:gz") as tar,
+            io.TextIOWrapper(tar.extractfile("recording.json"), encoding="utf-8") as f,
+        ):
+            return EventTable(iter_recording_events(f))
+
+    def _write_session(self):
+        (self.temp_dir / SESSION_FILENAME).write_text(json.dumps(self.session, indent=2))
+
+    def _restore_state(self) -> float:
+        """Rebuild file_states, known_dirs and reports by folding the persisted journal."""
+        print(f"Resuming recording of {self.watch_dir} from {self.temp_dir} ({len(self.journal)} events)")
+        last_timestamp = 0.0
+
+        for event_data in iter_journal(self.journal.path):
+            event = EPUEvent(**event_data)
+            last_timestamp = max(last_timestamp, event.timestamp)
+
+            if event.event_type == "moved":
+                self._move_state(event.src_path, event.dest_path, event.is_directory)
+            elif event.event_type == "deleted":
+                self._forget_state(event.src_path, event.is_directory)
+            elif event.is_directory:
+                self.known_dirs.add(event.src_path)
+            elif event.event_type in ("initial_file", "created") or event.src_path in self.file_states:
+                self.file_states[event.src_path] = FileState(event.size, event.content_hash)
+
+            if event.is_placeholder:
+                self.placeholder_files.add(str(self.watch_dir / event.src_path))
+            if event.content_hash and event.content_hash.startswith("unreadable_"):
+                self.unreadable_files.add(str(self.watch_dir / event.src_path))
+
+        return last_timestamp
+
+    def _catch_up(self, since: float):
+        """Record changes made to the tree while the recorder was not running."""
+        print("Checking for changes made while the recorder was stopped...")
+        for kind, norm_path in self._find_missed_changes(since):
+            self._apply_missed_change(kind, norm_path)
+
+    def reconcile(self) -> int:
+        """Rescan the tree and record any change the watcher missed, e.g. after an event queue overflow.
+
+        Fixes are queued behind the pending notifications for their directory and re-checked when
+        they run, so changes the watcher did report are not recorded twice. Returns the number of
+        discrepancies found.
+        """
+        started_at = time.time()
+        missed = self._find_missed_changes(self._reconciled_at)
+        for kind, norm_path in missed:
+            if kind == "deleted_dir":
+                self.dispatcher.submit_multi(None, self._apply_missed_change, kind, norm_path)
+            else:
+                key = os.path.dirname(str(self.watch_dir / norm_path))
+                self.dispatcher.submit(key, self._apply_missed_change, kind, norm_path)
+
+        self._reconciled_at = started_at
+        self.reconcile_stats["runs"] += 1
+        self.reconcile_stats["missed"] += len(missed)
+        if missed:
+            print(f"Reconciliation: {len(missed)} possibly missed changes queued for recording")
+        return len(missed)
+
+    def _find_missed_changes(self, since: float) -> list[tuple[str, str]]:
+        """Diff a scan of the tree against file_states and known_dirs.
+
+        Files are only flagged when they are untracked, their size differs from the recorded state
+        or they were modified after ``since``, so a rescan hashes just the files that may have
+        changed rather than the contents of the whole tree.
+        """
+        # Snapshots: live workers may update the originals while the tree is scanned
+        file_states = dict(self.file_states)
+        known_dirs = set(self.known_dirs)
+        seen_dirs: set[str] = set()
+        seen_files: set[str] = set()
+        missed: list[tuple[str, str]] = []
+
+        for entry in scan_tree(self.watch_dir):
+            if entry.is_directory:
+                seen_dirs.add(entry.rel_path)
+                if entry.rel_path not in known_dirs:
+                    missed.append(("created_dir", entry.rel_path))
+                continue
+
+            seen_files.add(entry.rel_path)
+            state = file_states.get(entry.rel_path)
+            if state is None or entry.stat.st_size != state.size or entry.stat.st_mtime >= since:
+                missed.append(("changed", entry.rel_path))
+
+        missed += [("deleted_file", p) for p in sorted(set(file_states) - seen_files)]
+        missed += [("deleted_dir", p) for p in sorted(known_dirs - seen_dirs, reverse=True)]
+        return missed
+
+    def _apply_missed_change(self, kind: str, norm_path: str):
+        """Record a change found by a rescan, if it still holds and has not been recorded meanwhile."""
+        path = self.watch_dir / norm_path
+        self._notification.reconciled = True
+        try:
+            if kind == "created_dir":
+                if norm_path not in self.known_dirs and path.is_dir():
+                    self._record_event(DirCreatedEvent(str(path)), "created")
+            elif kind == "changed":
+                # Untracked files are recorded as created; unchanged content records nothing
+                self._record_event(FileModifiedEvent(str(path)), "modified")
+            elif kind == "deleted_file":
+                if norm_path in self.file_states and not path.exists():
+                    self._record_event(FileDeletedEvent(str(path)), "deleted")
+            elif kind == "deleted_dir" and norm_path in self.known_dirs and not path.exists():
+                self._record_event(DirDeletedEvent(str(path)), "deleted")
+        finally:
+            self._notification.reconciled = False
+
+    def _maybe_reconcile(self):
+        """Rescan when due, or as soon as the queues drain after they overflowed their bound."""
+        stats = self.dispatcher.stats()
+        if stats.saturations > self._saturations_seen and not stats.depth:
+            self._saturations_seen = stats.saturations
+            print("Event queue was saturated; rescanning for changes that may have been dropped")
+            self.reconcile()
+        elif self.reconcile_interval and time.time() - self._reconciled_at >= self.reconcile_interval:
+            self.reconcile()
+
+    def _set_state(self, norm_path: str, size: int, content_hash: str, ingest: IngestResult | None = None):
+        self.file_states[norm_path] = FileState(size, content_hash)
+        self.delta_cache.put(norm_path, ingest.delta_state() if ingest else None)
+
+    def _move_state(self, src_norm: str, dest_norm: str, is_directory: bool = False):
+        if not is_directory:
+            paths = [src_norm] if src_norm in self.file_states else []
+        else:
+            # Directory move: carry the state of every tracked file and directory underneath it
+            paths = [p for p in self.file_states if _has_prefix(p, src_norm)]
+            moved_dirs = {d for d in self.known_dirs if d == src_norm or _has_prefix(d, src_norm)}
+            self.known_dirs -= moved_dirs
+            self.known_dirs |= {_replace_prefix(d, src_norm, dest_norm) for d in moved_dirs}
+        for path in paths:
+            new_path = _replace_prefix(path, src_norm, dest_norm)
+            self.file_states[new_path] = self.file_states.pop(path)
+            self.delta_cache.put(new_path, self.delta_cache.pop(path))
+
+    def _forget_state(self, norm_path: str, is_directory: bool):
+        paths = [norm_path] if norm_path in self.file_states else []
+        if is_directory:
+            paths += [p for p in self.file_states if _has_prefix(p, norm_path)]
+            self.known_dirs -= {d for d in self.known_dirs if d == norm_path or _has_prefix(d, norm_path)}
+        for path in paths:
+            del self.file_states[path]
+            self.delta_cache.pop(path)
 
     def _normalize_path(self, path: Path) -> str:
         return str(PurePosixPath(path))
 
-    def _is_binary_file(self, file_path: Path) -> bool:
+    def _binary_by_extension(self, file_path: Path) -> bool | None:
+        """Whether the extension marks the file as binary or text; None when only its content can tell."""
         file_extension = file_path.suffix.lower().lstrip(".")
 
         # Check extension overrides first
@@ -165,151 +484,299 @@ class EPURecorder(FileSystemEventHandler):
             return False
         if file_extension in binary_extensions:
             return True
+        return None
+
+    def _is_binary_file(self, file_path: Path, head: bytes | None = None) -> bool:
+        by_extension = self._binary_by_extension(file_path)
+        if by_extension is not None:
+            return by_extension
 
         # For unknown extensions, try to detect by content
-        try:
-            with open(file_path, "rb") as f:
-                chunk = f.read(1024)  # Read first 1KB
-                if not chunk:
-                    return False  # Empty file, treat as text
+        if head is None:
+            try:
+                with open(file_path, "rb") as f:
+                    head = f.read(1024)  # Read first 1KB
+            except (PermissionError, OSError):
+                # If we can't read the file, default to text
+                return False
 
-                # Check for null bytes (common in binary files)
-                if b"\x00" in chunk:
-                    return True
+        chunk = head[:1024]
+        if not chunk:
+            return False  # Empty file, treat as text
 
-                # Check if content is mostly printable ASCII
-                try:
-                    chunk.decode("utf-8")
-                    return False  # Successfully decoded as UTF-8, likely text
-                except UnicodeDecodeError:
-                    return True  # Cannot decode as UTF-8, likely binary
-        except (PermissionError, OSError):
-            # If we can't read the file, default to text
-            return False
+        # Check for null bytes (common in binary files)
+        if b"\x00" in chunk:
+            return True
+
+        # Check if content is mostly printable ASCII
+        try:
+            chunk.decode("utf-8")
+            return False  # Successfully decoded as UTF-8, likely text
+        except UnicodeDecodeError:
+            return True  # Cannot decode as UTF-8, likely binary
 
-    def _should_use_placeholder(self, file_path: Path) -> bool:
+    def _should_use_placeholder(self, file_path: Path, head: bytes | None = None) -> bool:
         if not self.skip_binary_content:
             return False
-        return self._is_binary_file(file_path)
+        return self._is_binary_file(file_path, head)
+
+    def _ingest_file(self, file_path: Path, stat: os.stat_result, store_large: bool = True) -> IngestResult:
+        """Read a file once, feeding the hash, the binary sniff and the content store together.
+
+        Small files are kept in memory so the caller can store them inline or as a chunk. Large
+        files are streamed straight into a binary chunk when ``store_large`` is set, otherwise they
+        are only hashed.
+        """
+        fingerprinted = self.placeholder_fingerprint != "hash"
+        if fingerprinted and self.skip_binary_content and self._binary_by_extension(file_path):
+            return self._fingerprint_placeholder(file_path, stat)
 
-    def _calculate_file_hash(self, file_path: Path) -> str:
-        hash_sha256 = hashlib.sha256()
+        hasher = new_hasher(self.hash_algorithm)
+        chunk_file = None
         try:
-            with open(file_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_sha256.update(chunk)
-            return hash_sha256.hexdigest()
+            with open(file_path, "rb", buffering=0) as f:
+                block = f.read(READ_BUFFER_SIZE)
+                is_placeholder = self._should_use_placeholder(file_path, block)
+                if is_placeholder and fingerprinted:
+                    # Binary by content: the sniffed block and open file serve the fingerprint too
+                    return self._fingerprint_placeholder(file_path, stat, f, block)
+                keep_inline = not is_placeholder and stat.st_size < INLINE_CONTENT_LIMIT
+                if not is_placeholder and not keep_inline and store_large:
+                    chunk_file = open(self._chunk_staging_path(), "wb")  # noqa: SIM115
+
+                head = block[:EDGE_SAMPLE_SIZE]
+                tail = b""
+                size_read = 0
+                signer = BlockSigner() if self.record_patches and not is_placeholder else None
+                parts = []
+                while block:
+                    hasher.update(block)
+                    size_read += len(block)
+                    if signer:
+                        signer.update(block)
+                    tail = (tail + block[-EDGE_SAMPLE_SIZE:])[-EDGE_SAMPLE_SIZE:]
+                    if keep_inline:
+                        parts.append(block)
+                    elif chunk_file:
+                        chunk_file.write(block)
+                    block = f.read(READ_BUFFER_SIZE)
+
+                data = b"".join(parts) if keep_inline else None
+                samples = _read_samples(io.BytesIO(data) if keep_inline else f, size_read)
         except (PermissionError, OSError) as e:
+            if chunk_file:
+                chunk_file.close()
+                Path(chunk_file.name).unlink(missing_ok=True)
+                chunk_file = None
             print(f"Warning: Cannot read file {file_path}: {e}")
             # Track unreadable file for reporting
-            self.unreadable_files.append(str(file_path))
+            self.unreadable_files.add(str(file_path))
             # Return a special hash to indicate the file couldn't be read
-            return f"unreadable_{file_path.stat().st_size}_{file_path.stat().st_mtime}"
+            return IngestResult(
+                content_hash=f"unreadable_{stat.st_size}_{stat.st_mtime}",
+                is_placeholder=self._should_use_placeholder(file_path, b""),
+                unreadable=True,
+            )
+        finally:
+            if chunk_file:
+                chunk_file.close()
 
-    def _store_binary_chunk(self, content: bytes) -> str:
-        chunk_id = f"chunk_{self.chunk_counter}"
-        self.chunk_counter += 1
+        if is_placeholder:
+            self.placeholder_files.add(str(file_path))
 
-        chunk_file = self.temp_dir / f"{chunk_id}.bin"
-        chunk_file.write_bytes(content)
+        # The content hash of a whole file doubles as the address of its chunk
+        chunk_id = self._commit_chunk(Path(chunk_file.name), hasher.hexdigest()) if chunk_file else None
 
-        return chunk_id
+        return IngestResult(
+            content_hash=hasher.hexdigest(),
+            is_placeholder=is_placeholder,
+            data=data,
+            binary_chunk_id=chunk_id,
+            hasher=hasher,
+            head=head,
+            tail=tail,
+            samples=samples,
+            blocks=signer.signature() if signer else None,
+        )
 
-    def _capture_initial_state(self):
-        print(f"Capturing initial state of {self.watch_dir}")
-        for root, _dirs, files in os.walk(self.watch_dir):
-            root_path = Path(root)
-
-            # Record directory creation
-            if root_path != self.watch_dir:
-                rel_path = root_path.relative_to(self.watch_dir)
-                norm_path = self._normalize_path(rel_path)
-                event = EPUEvent(timestamp=time.time(), event_type="initial_dir", src_path=norm_path, is_directory=True)
-                self.events.append(event)
-
-            # Record file creation
-            for file in files:
-                file_path = root_path / file
-                rel_path = file_path.relative_to(self.watch_dir)
-                norm_path = self._normalize_path(rel_path)
-
-                size = file_path.stat().st_size
-                content_hash = self._calculate_file_hash(file_path)
-
-                # Store initial file state
-                self.file_states[norm_path] = {"size": size, "hash": content_hash, "content": None}
-
-                content = None
-                binary_chunk_id = None
-                is_placeholder = self._should_use_placeholder(file_path)
-
-                if is_placeholder:
-                    # Create placeholder - store only size information
-                    self.placeholder_files.append(str(file_path))
-                    # Don't store any content for placeholders
-                elif size < 1024 * 1024:  # 1MB limit for inline content
-                    try:
-                        content = file_path.read_text(encoding="utf-8", errors="ignore")
-                        self.file_states[norm_path]["content"] = content
-                    except Exception:
-                        # Binary file or permission error - try to store as chunk
-                        try:
-                            binary_content = file_path.read_bytes()
-                            binary_chunk_id = self._store_binary_chunk(binary_content)
-                        except (PermissionError, OSError) as e:
-                            print(f"Warning: Cannot read file content for {file_path}: {e}")
-                            # Track unreadable file for reporting
-                            self.unreadable_files.append(str(file_path))
-                            # Skip storing content for unreadable files
-                            pass
+    def _fingerprint_placeholder(
+        self, file_path: Path, stat: os.stat_result, f: BinaryIO | None = None, head: bytes = b""
+    ) -> IngestResult:
+        """Identify a placeholder file by its metadata instead of hashing content that is never stored.
+
+        A file already opened to sniff its content is sampled through ``f``, reusing ``head``, the
+        bytes read from its start.
+        """
+        fingerprint = f"fingerprint_{stat.st_size}_{stat.st_mtime_ns}_{stat.st_ino}"
+        if self.placeholder_fingerprint == "sampled":
+            try:
+                if f is None:
+                    with open(file_path, "rb") as f:
+                        sample = _edge_sample(f, stat.st_size)
                 else:
-                    # Large file - store as chunk
-                    try:
-                        binary_content = file_path.read_bytes()
-                        binary_chunk_id = self._store_binary_chunk(binary_content)
-                    except (PermissionError, OSError) as e:
-                        print(f"Warning: Cannot read large file content for {file_path}: {e}")
-                        # Track unreadable file for reporting
-                        self.unreadable_files.append(str(file_path))
-                        # Skip storing content for unreadable files
-                        pass
-
-                # Get file timestamps
-                stat = file_path.stat()
-
-                event = EPUEvent(
-                    timestamp=time.time(),
-                    event_type="initial_file",
-                    src_path=norm_path,
-                    is_directory=False,
-                    content=content,
-                    size=size,
-                    content_hash=content_hash,
-                    binary_chunk_id=binary_chunk_id,
-                    operation_data={"mtime": stat.st_mtime, "atime": stat.st_atime},
-                    is_placeholder=is_placeholder,
+                    sample = _edge_sample(f, stat.st_size, head)
+            except (PermissionError, OSError) as e:
+                print(f"Warning: Cannot read file {file_path}: {e}")
+                self.unreadable_files.add(str(file_path))
+                return IngestResult(
+                    content_hash=f"unreadable_{stat.st_size}_{stat.st_mtime}", is_placeholder=True, unreadable=True
                 )
-                self.events.append(event)
+            fingerprint += "_" + hashlib.blake2b(sample, digest_size=16).hexdigest()
+
+        self.placeholder_files.add(str(file_path))
+        return IngestResult(content_hash=fingerprint, is_placeholder=True)
+
+    def _store_ingested_content(self, ingest: IngestResult) -> tuple[str | None, str | None]:
+        """Return ``(content, binary_chunk_id)`` for an ingested file: inline UTF-8 text or a binary chunk."""
+        if ingest.data is None:
+            return None, ingest.binary_chunk_id
+        try:
+            return ingest.data.decode("utf-8"), None
+        except UnicodeDecodeError:
+            return None, self._store_binary_chunk(ingest.data)
+
+    def _chunk_staging_path(self) -> Path:
+        # Unique per thread, so concurrent writers never share a staging file
+        return self.temp_dir / f".staging_{threading.get_ident()}_{time.monotonic_ns()}.tmp"
+
+    def _commit_chunk(self, staging_path: Path, digest: str) -> str:
+        """Move a fully written chunk to its content address, dropping it if that payload is already stored."""
+        chunk_file = self.temp_dir / f"{digest}.bin"
+        size = staging_path.stat().st_size
+        with self._chunk_lock:
+            if chunk_file.exists():
+                staging_path.unlink()
+                self.chunk_stats["deduplicated"] += 1
+                self.chunk_stats["bytes_saved"] += size
+            else:
+                os.replace(staging_path, chunk_file)
+                self.chunk_stats["stored"] += 1
+        return digest
+
+    def _store_binary_chunk(self, content: bytes) -> str:
+        hasher = new_hasher(self.hash_algorithm)
+        hasher.update(content)
+        digest = hasher.hexdigest()
+        chunk_file = self.temp_dir / f"{digest}.bin"
+        with self._chunk_lock:
+            if chunk_file.exists():
+                self.chunk_stats["deduplicated"] += 1
+                self.chunk_stats["bytes_saved"] += len(content)
+                return digest
+        staging_path = self._chunk_staging_path()
+        staging_path.write_bytes(content)
+        return self._commit_chunk(staging_path, digest)
+
+    def _capture_initial_state(self):
+        print(f"Capturing initial state of {self.watch_dir} with {self.scan_workers} workers")
+        progress = ScanProgress("Initial scan")
+
+        # Files are hashed and read in parallel, but results are journalled strictly in scan order.
+        # The in-flight window bounds how much file content is held in memory at once.
+        max_in_flight = self.scan_workers * 4
+        pending: deque[tuple[EPUEvent, None] | Future[tuple[EPUEvent, IngestResult]]] = deque()
+        with ThreadPoolExecutor(max_workers=self.scan_workers, thread_name_prefix="epurecorder-scan") as pool:
+            for entry in scan_tree(self.watch_dir):
+                if entry.is_directory:
+                    event = EPUEvent(
+                        timestamp=0.0, event_type="initial_dir", src_path=entry.rel_path, is_directory=True
+                    )
+                    pending.append((event, None))
+                else:
+                    pending.append(pool.submit(self._capture_file, entry))
+
+                while len(pending) > max_in_flight:
+                    self._journal_initial_event(pending.popleft(), progress)
+
+            while pending:
+                self._journal_initial_event(pending.popleft(), progress)
+
+        progress.finish()
+
+    def _journal_initial_event(self, item, progress: ScanProgress):
+        event, ingest = item.result() if isinstance(item, Future) else item
+        event.timestamp = time.time()
+        if event.is_directory:
+            self.known_dirs.add(event.src_path)
+        else:
+            self._set_state(event.src_path, event.size, event.content_hash, ingest)
+            progress.update(event.size or 0)
+        self.journal.append(event)
+
+    def _capture_file(self, entry: ScanEntry) -> tuple[EPUEvent, IngestResult]:
+        """Hash and read one file for the initial state; runs on a scan worker thread."""
+        ingest = self._ingest_file(entry.path, entry.stat)
+        content, binary_chunk_id = self._store_ingested_content(ingest)
+
+        event = EPUEvent(
+            timestamp=0.0,
+            event_type="initial_file",
+            src_path=entry.rel_path,
+            is_directory=False,
+            content=content,
+            size=entry.stat.st_size,
+            content_hash=ingest.content_hash,
+            binary_chunk_id=binary_chunk_id,
+            operation_data={"mtime": entry.stat.st_mtime, "atime": entry.stat.st_atime},
+            is_placeholder=ingest.is_placeholder,
+        )
+        return event, ingest
 
     def on_created(self, event: FileSystemEvent):
-        self._record_event(event, "created")
+        self.dispatcher.submit(
+            os.path.dirname(event.src_path), self._process_notification, event, "created", time.time()
+        )
 
     def on_modified(self, event: FileSystemEvent):
-        self._record_event(event, "modified")
+        self.dispatcher.submit(
+            os.path.dirname(event.src_path), self._process_notification, event, "modified", time.time()
+        )
 
     def on_deleted(self, event: FileSystemEvent):
-        self._record_event(event, "deleted")
+        # Deleting a directory touches state for every path below it, so it is ordered against all workers
+        keys = None if event.is_directory else [os.path.dirname(event.src_path)]
+        self.dispatcher.submit_multi(keys, self._process_notification, event, "deleted", time.time())
 
     def on_moved(self, event: FileSystemEvent):
+        keys = None if event.is_directory else [os.path.dirname(event.src_path), os.path.dirname(event.dest_path)]
+        self.dispatcher.submit_multi(keys, self._process_notification, event, "moved", time.time())
+
+    def drain(self):
+        """Block until every notification received so far has been processed."""
+        self.dispatcher.join()
+
+    def _process_notification(self, event: FileSystemEvent, event_type: str, timestamp: float):
+        """Handle a notification on a worker thread, timestamped with when the observer saw it."""
+        if self.coalescer and event_type in ("created", "modified") and not event.is_directory:
+            self.coalescer.add(event_type, event.src_path, timestamp)
+            return
+
+        self._notification.timing = (timestamp, timestamp)
+        try:
+            if event_type == "moved":
+                self._record_move(event)
+                return
+            if event_type == "deleted" and self.coalescer:
+                self.coalescer.discard(event.src_path, event.is_directory)
+            self._record_event(event, event_type)
+        finally:
+            self._notification.timing = None
+
+    def _record_move(self, event: FileSystemEvent):
         src_rel = Path(event.src_path).relative_to(self.watch_dir)
         dest_rel = Path(event.dest_path).relative_to(self.watch_dir)
 
         src_norm = self._normalize_path(src_rel)
         dest_norm = self._normalize_path(dest_rel)
 
+        # Pending changes follow the file; a file created and renamed within the quiet window
+        # is simply recorded as created at its final path
+        rekeyed = self.coalescer.rekey(event.src_path, event.dest_path, event.is_directory) if self.coalescer else []
+        if rekeyed and not event.is_directory and src_norm not in self.file_states:
+            return
+
         # Update file state tracking
-        if src_norm in self.file_states:
-            self.file_states[dest_norm] = self.file_states.pop(src_norm)
+        self._move_state(src_norm, dest_norm, event.is_directory)
 
         fs_event = EPUEvent(
             timestamp=time.time(),
@@ -318,9 +785,35 @@ class EPURecorder(FileSystemEventHandler):
             dest_path=dest_norm,
             is_directory=event.is_directory,
         )
-        self.events.append(fs_event)
+        self._journal_event(fs_event)
         print(f"MOVED: {src_norm} -> {dest_norm}")
 
+    def _flush_pending_change(self, change: PendingChange):
+        """Queue a debounced change for recording behind earlier work on its directory."""
+        self.dispatcher.submit(os.path.dirname(change.src_path), self._record_pending_change, change)
+
+    def _record_pending_change(self, change: PendingChange):
+        """Record a debounced change, timestamped with its first notification."""
+        event_cls = FileCreatedEvent if change.event_type == "created" else FileModifiedEvent
+        self._notification.timing = (change.first_timestamp, change.last_timestamp)
+        try:
+            self._record_event(event_cls(change.src_path), change.event_type)
+        finally:
+            self._notification.timing = None
+
+    def _journal_event(self, fs_event: EPUEvent):
+        """Journal a live event, stamped with the time of the notification(s) that produced it."""
+        timing = getattr(self._notification, "timing", None)
+        if timing:
+            first_timestamp, last_timestamp = timing
+            fs_event.timestamp = first_timestamp
+            if last_timestamp != first_timestamp:
+                fs_event.operation_data = {**(fs_event.operation_data or {}), "last_timestamp": last_timestamp}
+        if getattr(self._notification, "reconciled", False):
+            # Synthesised from a rescan rather than a notification
+            fs_event.operation_data = {**(fs_event.operation_data or {}), "reconciled": True}
+        self.journal.append(fs_event)
+
     def _record_event(self, event: FileSystemEvent, event_type: str):
         event_path = Path(event.src_path)
         rel_path = event_path.relative_to(self.watch_dir)
@@ -328,78 +821,56 @@ class EPURecorder(FileSystemEventHandler):
 
         if event.is_directory:
             # Handle directory events
+            if event_type == "deleted":
+                self._forget_state(norm_path, is_directory=True)
+            elif event_type == "created":
+                self.known_dirs.add(norm_path)
             fs_event = EPUEvent(
                 timestamp=time.time(),
                 event_type=event_type,
                 src_path=norm_path,
                 is_directory=True,
             )
-            self.events.append(fs_event)
+            self._journal_event(fs_event)
             print(f"{event_type.upper()}: {norm_path}")
             return
 
         # Handle file events with diff-based recording
         if event_type == "deleted":
             # Remove from state tracking
-            self.file_states.pop(norm_path, None)
+            self._forget_state(norm_path, is_directory=False)
             fs_event = EPUEvent(
                 timestamp=time.time(),
                 event_type=event_type,
                 src_path=norm_path,
                 is_directory=False,
             )
-            self.events.append(fs_event)
+            self._journal_event(fs_event)
             print(f"DELETED: {norm_path}")
             return
 
-        if not event_path.exists():
+        try:
+            stat = event_path.stat()
+        except FileNotFoundError:
             return
 
-        # Get current file state
-        current_size = event_path.stat().st_size
-        current_hash = self._calculate_file_hash(event_path)
-
-        # Check if this is a new file or modification
-        if event_type == "created" or norm_path not in self.file_states:
-            self._record_file_creation(event_path, norm_path, current_size, current_hash)
-        else:
-            self._record_file_modification(event_path, norm_path, current_size, current_hash)
-
-    def _record_file_creation(self, file_path: Path, norm_path: str, size: int, content_hash: str):
-        content = None
-        binary_chunk_id = None
-        is_placeholder = self._should_use_placeholder(file_path)
-
-        if is_placeholder:
-            # Create placeholder - store only size information
-            self.placeholder_files.append(str(file_path))
-            # Don't store any content for placeholders
-        elif size < 1024 * 1024:  # 1MB limit
-            try:
-                content = file_path.read_text(encoding="utf-8", errors="ignore")
-            except Exception:
-                try:
-                    binary_content = file_path.read_bytes()
-                    binary_chunk_id = self._store_binary_chunk(binary_content)
-                except (PermissionError, OSError) as e:
-                    print(f"Warning: Cannot read file content for {file_path}: {e}")
-                    # Track unreadable file for reporting
-                    self.unreadable_files.append(str(file_path))
-                    # Skip storing content for unreadable files
-                    pass
-        else:
-            try:
-                binary_content = file_path.read_bytes()
-                binary_chunk_id = self._store_binary_chunk(binary_content)
-            except (PermissionError, OSError) as e:
-                print(f"Warning: Cannot read large file content for {file_path}: {e}")
-                # Track unreadable file for reporting
-                self.unreadable_files.append(str(file_path))
-                # Skip storing content for unreadable files
-                pass
+        # A file already tracked is compared with its recorded state even when reported as created,
+        # e.g. when a rescan recorded it while the created notification waited in the coalescer
+        if norm_path not in self.file_states:
+            ingest = self._ingest_file(event_path, stat)
+            self._record_file_creation(event_path, norm_path, stat.st_size, ingest)
+        elif not self._record_incremental_append(event_path, norm_path, stat):
+            # Large files are only hashed here; their content is stored only if the change needs it
+            ingest = self._ingest_file(event_path, stat, store_large=False)
+            self._record_file_modification(event_path, norm_path, stat, ingest)
+
+    def _record_file_creation(self, file_path: Path, norm_path: str, size: int, ingest: IngestResult):
+        content, binary_chunk_id = self._store_ingested_content(ingest)
+        content_hash = ingest.content_hash
+        is_placeholder = ingest.is_placeholder
 
         # Update state tracking
-        self.file_states[norm_path] = {"size": size, "hash": content_hash, "content": content}
+        self._set_state(norm_path, size, content_hash, ingest)
 
         fs_event = EPUEvent(
             timestamp=time.time(),
@@ -412,36 +883,118 @@ class EPURecorder(FileSystemEventHandler):
             binary_chunk_id=binary_chunk_id,
             is_placeholder=is_placeholder,
         )
-        self.events.append(fs_event)
+        self._journal_event(fs_event)
         print(f"CREATED: {norm_path}" + (" (binary placeholder)" if is_placeholder else ""))
 
-    def _record_file_modification(self, file_path: Path, norm_path: str, current_size: int, current_hash: str):
-        old_state = self.file_states.get(norm_path, {})
-        old_size = old_state.get("size", 0)
-        old_hash = old_state.get("hash", "")
+    def _record_file_modification(self, file_path: Path, norm_path: str, stat: os.stat_result, ingest: IngestResult):
+        current_size = stat.st_size
+        current_hash = ingest.content_hash
+        old_state = self.file_states[norm_path]
+        old_size = old_state.size
+        old_hash = old_state.hash
 
         # Skip if file hasn't actually changed
         if current_hash == old_hash:
             return
 
+        if ingest.is_placeholder:
+            # Only the new size and fingerprint are recorded, never appended or patched content
+            self._record_full_modification(file_path, norm_path, stat, ingest)
+            return
+
         # Determine modification type
         if current_size > old_size:
             # Likely an append operation
-            self._record_append_operation(file_path, norm_path, old_size, current_size, current_hash)
+            self._record_append_operation(file_path, norm_path, old_size, current_size, current_hash, ingest)
         elif current_size < old_size:
             # File was truncated
             self._record_truncate_operation(file_path, norm_path, current_size, current_hash)
         else:
             # Same size but different content - full modification
-            self._record_full_modification(file_path, norm_path, current_size, current_hash)
+            self._record_full_modification(file_path, norm_path, stat, ingest)
+
+    def _record_incremental_append(self, file_path: Path, norm_path: str, stat: os.stat_result) -> bool:
+        """Record a growing file by hashing only the new bytes, resuming the hash state kept for the path.
+
+        If the previously seen content changed (its head, its tail or one of a fixed number of sampled
+        blocks), the file was rewritten rather than appended to and is recorded as a full modification.
+        Returns False when there is no resumable state or the file did not grow, leaving the caller to
+        rehash the whole file.
+        """
+        old_size = self.file_states[norm_path].size
+        delta = self.delta_cache.get(norm_path)
+        if delta is None or stat.st_size <= old_size:
+            return False
+
+        old_blocks = delta.blocks
+        # Re-read from the start of the last (possibly partial) block so the block signature can be extended
+        aligned = old_size - old_size % BLOCK_SIZE if old_blocks is not None else old_size
+        try:
+            with open(file_path, "rb") as f:
+                head, tail = delta.head, delta.tail
+                prefix_unchanged = f.read(len(head)) == head
+                if prefix_unchanged:
+                    f.seek(old_size - len(tail))
+                    prefix_unchanged = f.read(len(tail)) == tail
+                if prefix_unchanged:
+                    # Edits in the middle are caught by sampling, so an append never rereads the whole prefix
+                    prefix_unchanged = _samples_match(f, delta.samples)
+                if prefix_unchanged:
+                    f.seek(aligned)
+                    tail_region = f.read(stat.st_size - aligned)
+                    samples = _read_samples(f, aligned + len(tail_region))
+        except (PermissionError, OSError):
+            return False
+
+        if not prefix_unchanged:
+            self._record_full_modification(
+                file_path, norm_path, stat, self._ingest_file(file_path, stat, store_large=False)
+            )
+            return True
+
+        appended_content = tail_region[old_size - aligned :]
+        blocks = None
+        if old_blocks is not None:
+            blocks = old_blocks[: aligned // BLOCK_SIZE * DIGEST_SIZE] + sign(tail_region)
+
+        new_size = old_size + len(appended_content)
+        hasher = delta.hasher.copy()
+        hasher.update(appended_content)
+        ingest = IngestResult(
+            content_hash=hasher.hexdigest(),
+            hasher=hasher,
+            head=(head + appended_content)[:EDGE_SAMPLE_SIZE] if len(head) < EDGE_SAMPLE_SIZE else head,
+            tail=(tail + appended_content[-EDGE_SAMPLE_SIZE:])[-EDGE_SAMPLE_SIZE:],
+            samples=samples,
+            blocks=blocks,
+        )
+        if str(file_path) in self.placeholder_files:
+            # Record the new size of a placeholder without storing the appended bytes
+            ingest.is_placeholder = True
+            self._record_full_modification(file_path, norm_path, stat, ingest)
+            return True
+        self._record_append_operation(
+            file_path, norm_path, old_size, new_size, ingest.content_hash, ingest, appended_content
+        )
+        return True
 
-    def _record_append_operation(self, file_path: Path, norm_path: str, old_size: int, new_size: int, new_hash: str):
+    def _record_append_operation(
+        self,
+        file_path: Path,
+        norm_path: str,
+        old_size: int,
+        new_size: int,
+        new_hash: str,
+        ingest: IngestResult,
+        appended_content: bytes | None = None,
+    ):
         try:
             # Read only the appended content
             try:
-                with open(file_path, "rb") as f:
-                    f.seek(old_size)
-                    appended_content = f.read(new_size - old_size)
+                if appended_content is None:
+                    with open(file_path, "rb") as f:
+                        f.seek(old_size)
+                        appended_content = f.read(new_size - old_size)
 
                 # Try to decode as text, otherwise store as binary
                 append_data = None
@@ -454,13 +1007,13 @@ class EPURecorder(FileSystemEventHandler):
             except (PermissionError, OSError) as e:
                 print(f"Warning: Cannot read appended content for {file_path}: {e}")
                 # Track unreadable file for reporting
-                self.unreadable_files.append(str(file_path))
+                self.unreadable_files.add(str(file_path))
                 # Skip storing content for unreadable files
                 append_data = None
                 binary_chunk_id = None
 
             # Update state
-            self.file_states[norm_path].update({"size": new_size, "hash": new_hash})
+            self._set_state(norm_path, new_size, new_hash, ingest)
 
             fs_event = EPUEvent(
                 timestamp=time.time(),
@@ -474,16 +1027,17 @@ class EPURecorder(FileSystemEventHandler):
                 file_position=old_size,
                 operation_data={"append_size": new_size - old_size},
             )
-            self.events.append(fs_event)
+            self._journal_event(fs_event)
             print(f"APPENDED: {norm_path} (+{new_size - old_size} bytes)")
 
         except Exception as e:
             print(f"Error recording append for {norm_path}: {e}")
-            self._record_full_modification(file_path, norm_path, new_size, new_hash)
+            stat = file_path.stat()
+            self._record_full_modification(file_path, norm_path, stat, self._ingest_file(file_path, stat))
 
     def _record_truncate_operation(self, file_path: Path, norm_path: str, new_size: int, new_hash: str):
-        # Update state
-        self.file_states[norm_path].update({"size": new_size, "hash": new_hash})
+        # Update state; the resumable hash now covers bytes that are gone
+        self._set_state(norm_path, new_size, new_hash)
 
         fs_event = EPUEvent(
             timestamp=time.time(),
@@ -494,45 +1048,23 @@ class EPURecorder(FileSystemEventHandler):
             content_hash=new_hash,
             operation_data={"new_size": new_size},
         )
-        self.events.append(fs_event)
+        self._journal_event(fs_event)
         print(f"TRUNCATED: {norm_path} to {new_size} bytes")
 
-    def _record_full_modification(self, file_path: Path, norm_path: str, size: int, content_hash: str):
-        content = None
-        binary_chunk_id = None
-        is_placeholder = self._should_use_placeholder(file_path)
+    def _record_full_modification(self, file_path: Path, norm_path: str, stat: os.stat_result, ingest: IngestResult):
+        if self._record_patch(file_path, norm_path, stat, ingest):
+            return
 
-        if is_placeholder:
-            # For placeholder files, just track the size change
-            if str(file_path) not in self.placeholder_files:
-                self.placeholder_files.append(str(file_path))
-        elif size < 1024 * 1024:  # 1MB limit
-            try:
-                content = file_path.read_text(encoding="utf-8", errors="ignore")
-                self.file_states[norm_path]["content"] = content
-            except Exception:
-                try:
-                    binary_content = file_path.read_bytes()
-                    binary_chunk_id = self._store_binary_chunk(binary_content)
-                except (PermissionError, OSError) as e:
-                    print(f"Warning: Cannot read file content for {file_path}: {e}")
-                    # Track unreadable file for reporting
-                    self.unreadable_files.append(str(file_path))
-                    # Skip storing content for unreadable files
-                    pass
-        else:
-            try:
-                binary_content = file_path.read_bytes()
-                binary_chunk_id = self._store_binary_chunk(binary_content)
-            except (PermissionError, OSError) as e:
-                print(f"Warning: Cannot read large file content for {file_path}: {e}")
-                # Track unreadable file for reporting
-                self.unreadable_files.append(str(file_path))
-                # Skip storing content for unreadable files
-                pass
+        if not (ingest.data is not None or ingest.binary_chunk_id or ingest.is_placeholder or ingest.unreadable):
+            # Large file that was only hashed so far - read it again into the chunk store
+            ingest = self._ingest_file(file_path, stat)
+        content, binary_chunk_id = self._store_ingested_content(ingest)
+        size = stat.st_size
+        content_hash = ingest.content_hash
+        is_placeholder = ingest.is_placeholder
 
         # Update state
-        self.file_states[norm_path].update({"size": size, "hash": content_hash})
+        self._set_state(norm_path, size, content_hash, ingest)
 
         fs_event = EPUEvent(
             timestamp=time.time(),
@@ -545,9 +1077,57 @@ class EPURecorder(FileSystemEventHandler):
             binary_chunk_id=binary_chunk_id,
             is_placeholder=is_placeholder,
         )
-        self.events.append(fs_event)
+        self._journal_event(fs_event)
         print(f"MODIFIED: {norm_path}" + (" (binary placeholder)" if is_placeholder else ""))
 
+    def _record_patch(self, file_path: Path, norm_path: str, stat: os.stat_result, ingest: IngestResult) -> bool:
+        """Record a rewrite as the changed byte ranges only, if few enough blocks differ.
+
+        The changed ranges are concatenated into one binary chunk; ``operation_data["patches"]``
+        lists their ``[offset, length]`` in the new file. Returns False when there is no block
+        signature to compare against or the change is too large to be worth a delta.
+        """
+        delta = self.delta_cache.get(norm_path)
+        old_blocks = delta.blocks if delta is not None else None
+        if old_blocks is None or ingest.blocks is None or not stat.st_size:
+            return False
+
+        ranges = changed_ranges(old_blocks, ingest.blocks, stat.st_size)
+        changed_bytes = sum(length for _offset, length in ranges)
+        if changed_bytes > stat.st_size * PATCH_MAX_CHANGED_RATIO:
+            return False
+
+        try:
+            if ingest.data is not None:
+                patch_data = b"".join(ingest.data[offset : offset + length] for offset, length in ranges)
+            else:
+                with open(file_path, "rb") as f:
+                    parts = []
+                    for offset, length in ranges:
+                        f.seek(offset)
+                        parts.append(f.read(length))
+                    patch_data = b"".join(parts)
+        except (PermissionError, OSError):
+            return False
+
+        binary_chunk_id = self._store_binary_chunk(patch_data) if patch_data else None
+        self._set_state(norm_path, stat.st_size, ingest.content_hash, ingest)
+
+        fs_event = EPUEvent(
+            timestamp=time.time(),
+            event_type="patched",
+            src_path=norm_path,
+            is_directory=False,
+            size=stat.st_size,
+            content_hash=ingest.content_hash,
+            binary_chunk_id=binary_chunk_id,
+            file_position=ranges[0][0] if ranges else stat.st_size,
+            operation_data={"patches": [list(r) for r in ranges], "new_size": stat.st_size},
+        )
+        self._journal_event(fs_event)
+        print(f"PATCHED: {norm_path} ({len(ranges)} ranges, {changed_bytes} of {stat.st_size} bytes)")
+        return True
+
     def start_recording(self):
         print(f"Starting recording of {self.watch_dir}")
         print(f"Recording will be saved to {self.output_file}")
@@ -555,11 +1135,18 @@ class EPURecorder(FileSystemEventHandler):
 
         self.observer.schedule(self, str(self.watch_dir), recursive=True)
         self.observer.start()
+        if self.coalescer:
+            self.coalescer.start()
         self.running = True
 
         try:
+            last_report = time.monotonic()
             while self.running:
                 time.sleep(1)
+                if time.monotonic() - last_report >= 10:
+                    last_report = time.monotonic()
+                    self._report_queue(only_if_busy=True)
+                self._maybe_reconcile()
         except KeyboardInterrupt:
             self.stop_recording()
 
@@ -569,21 +1156,27 @@ class EPURecorder(FileSystemEventHandler):
         if self.observer.is_alive():
             self.observer.stop()
             self.observer.join()
-
-        # Create tar.gz archive
+        # Queued notifications may still feed the coalescer, so drain before its final flush
+        self.drain()
+        if self.coalescer:
+            self.coalescer.stop()
+        self.dispatcher.stop()
+        self._report_queue()
+
+        # Create tar.gz archive from the journal
+        self.journal.close()
         self._create_archive()
 
         # Cleanup temp directory
         shutil.rmtree(self.temp_dir, ignore_errors=True)
 
         print(f"Recording saved to {self.output_file}")
-        print(f"Captured {len(self.events)} events")
+        print(f"Captured {len(self.journal)} events")
 
         # Report unreadable files
-        unique_unreadable = list(set(self.unreadable_files))
-        if unique_unreadable:
-            print(f"\nUnreadable files report ({len(unique_unreadable)} files):")
-            for file_path in sorted(unique_unreadable):
+        if self.unreadable_files:
+            print(f"\nUnreadable files report ({len(self.unreadable_files)} files):")
+            for file_path in sorted(self.unreadable_files):
                 print(f"  - {file_path}")
             print(
                 "\nNote: These files were tracked but their content could not be read due to permission restrictions."
@@ -592,33 +1185,73 @@ class EPURecorder(FileSystemEventHandler):
             print("\nAll files were readable during recording.")
 
         # Report placeholder files
-        unique_placeholders = list(set(self.placeholder_files))
-        if unique_placeholders:
-            print(f"\nBinary placeholder files report ({len(unique_placeholders)} files):")
-            for file_path in sorted(unique_placeholders):
+        if self.placeholder_files:
+            print(f"\nBinary placeholder files report ({len(self.placeholder_files)} files):")
+            for file_path in sorted(self.placeholder_files):
                 print(f"  - {file_path}")
             print("\nNote: These binary files were replaced with empty placeholders to reduce archive size.")
 
+    def _report_queue(self, only_if_busy: bool = False):
+        stats = self.dispatcher.stats()
+        if only_if_busy and not stats.depth:
+            return
+        print(
+            f"Event queue: depth {stats.depth} (max {stats.max_depth}), lag {stats.last_lag:.2f}s "
+            f"(max {stats.max_lag:.2f}s), {stats.processed} processed"
+        )
+
     def _create_archive(self):
         print("\nPacking recording data...")
 
-        # Prepare recording data
-        events_data = [asdict(event) for event in self.events]
-        recording = {
-            "metadata": {
-                "recorded_at": datetime.now().isoformat(),
-                "watch_dir": str(self.watch_dir),
-                "total_events": len(self.events),
-                "version": "2.0",
-                "platform": sys.platform,
-            },
-            "events": events_data,
+        metadata = {
+            "recorded_at": datetime.now().isoformat(),
+            "watch_dir": str(self.watch_dir),
+            "total_events": len(self.journal),
+            "version": "3.0" if self.archive_format == "v3" else "2.0",
+            "platform": sys.platform,
+            "started_at": self.session["started_at"],
+            "placeholder_fingerprint": self.session.get("placeholder_fingerprint", "hash"),
+            "hash_algorithm": self.session.get("hash_algorithm", "sha256"),
         }
+        if self.session.get("resumed_at"):
+            metadata["resumed_at"] = self.session["resumed_at"]
 
-        # Create recording.json in temp directory
+        if self.archive_format == "v3":
+            self._create_container(metadata)
+        else:
+            self._create_tar_archive(metadata)
+
+        if self.chunk_stats["deduplicated"]:
+            print(
+                f"Deduplicated {self.chunk_stats['deduplicated']} repeated payloads "
+                f"({self.chunk_stats['bytes_saved'] / 1e6:.1f} MB not stored twice)"
+            )
+        print(f"Packing complete: {self.output_file}")
+
+    def _create_container(self, metadata: dict):
+        print("Creating indexed recording container...")
+        writer = ContainerWriter(self.output_file)
+        for event_data in iter_journal(self.journal.path):
+            writer.add_event(event_data)
+        chunk_files = sorted(self.temp_dir.glob("*.bin"))
+        if chunk_files:
+            print(f"Packing {len(chunk_files)} binary chunks...")
+        for chunk_file in chunk_files:
+            writer.add_chunk(chunk_file.stem, chunk_file)
+        writer.close(metadata)
+        print(f"Container created with {writer.event_count} events and {len(chunk_files)} binary chunks")
+
+    def _create_tar_archive(self, metadata: dict):
+        # Stream recording.json from the journal so memory stays flat regardless of session length
         print("Creating recording metadata...")
         recording_file = self.temp_dir / "recording.json"
-        recording_file.write_text(json.dumps(recording, indent=2))
+        with open(recording_file, "w", encoding="utf-8") as f:
+            f.write('{"metadata": ' + json.dumps(metadata, indent=2) + ',\n"events": [\n')
+            for i, event_data in enumerate(iter_journal(self.journal.path)):
+                if i:
+                    f.write(",\n")
+                f.write(json.dumps(event_data))
+            f.write("\n]}\n")
 
         # Create tar.gz archive
         print("Creating compressed archive...")
@@ -634,4 +1267,52 @@ class EPURecorder(FileSystemEventHandler):
                 tar.add(chunk_file, arcname=f"chunks/{chunk_file.name}")
 
         print(f"Archive created with {chunk_count} binary chunks")
-        print(f"Packing complete: {self.output_file}")
+
+
+def _has_prefix(path: str, prefix: str) -> bool:
+    return path.startswith(prefix + "/")
+
+
+def _replace_prefix(path: str, src: str, dest: str) -> str:
+    if path == src:
+        return dest
+    if _has_prefix(path, src):
+        return dest + path[len(src) :]
+    return path
+
+
+def _sample_digest(block: bytes) -> bytes:
+    return hashlib.blake2b(block, digest_size=8).digest()
+
+
+def _read_samples(f, size: int) -> tuple[tuple[int, bytes], ...]:
+    """Digest ``SAMPLED_BLOCKS`` whole blocks spread evenly over the first ``size`` bytes of ``f``."""
+    blocks = size // SAMPLE_BLOCK_SIZE
+    offsets = (
+        sorted({i * blocks // SAMPLED_BLOCKS * SAMPLE_BLOCK_SIZE for i in range(SAMPLED_BLOCKS)}) if blocks else []
+    )
+    samples = []
+    for offset in offsets:
+        f.seek(offset)
+        samples.append((offset, _sample_digest(f.read(SAMPLE_BLOCK_SIZE))))
+    return tuple(samples)
+
+
+def _samples_match(f, samples: tuple[tuple[int, bytes], ...]) -> bool:
+    for offset, digest in samples:
+        f.seek(offset)
+        if _sample_digest(f.read(SAMPLE_BLOCK_SIZE)) != digest:
+            return False
+    return True
+
+
+def _edge_sample(f: BinaryIO, size: int, head: bytes = b"") -> bytes:
+    """The first and last ``FINGERPRINT_SAMPLE_SIZE`` bytes of ``f``, the first from ``head`` if it holds them."""
+    sample = head[:FINGERPRINT_SAMPLE_SIZE]
+    if len(sample) < min(FINGERPRINT_SAMPLE_SIZE, size):
+        f.seek(0)
+        sample = f.read(FINGERPRINT_SAMPLE_SIZE)
+    if size > FINGERPRINT_SAMPLE_SIZE:
+        f.seek(max(FINGERPRINT_SAMPLE_SIZE, size - FINGERPRINT_SAMPLE_SIZE))
+        sample += f.read(FINGERPRINT_SAMPLE_SIZE)
+    return sample
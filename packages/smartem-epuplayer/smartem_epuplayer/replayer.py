@@ -1,23 +1,226 @@
-import hashlib
-import json
+import copy
+import heapq
 import os
+import random
 import shutil
 import tarfile
 import tempfile
 import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path, PurePosixPath
+from typing import BinaryIO
 
-from .models import EPUEvent
+from .cache import RecordingCache, is_archive
+from .container import RecordingContainer, is_container
+from .dag import DependencyExecutor
+from .fileops import COPY_BUFFER_SIZE, copy_from_file, create_placeholder
+from .hashing import available_hash_algorithms, hash_file
+from .jsonstream import iter_recording_events, read_recording_metadata
+from .models import EPUEvent, EventTable
+from .scheduler import LatenessStats, ReplayClock, SharedEventWindow
+from .verification import VERIFY_MODES, FinalState, IncrementalHashes
+
+# Threads hashing files when verifying the final state of a replay
+VERIFY_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+
+@dataclass
+class ReplayTarget:
+    """One of several directories a recording is replayed into at once."""
+
+    target_dir: str | Path
+    # Seconds after the replay starts at which this target's first event is due
+    start_offset: float = 0.0
+    # Each event is delayed by up to this many extra seconds, at random
+    jitter: float = 0.0
+
+
+class _FanoutTarget:
+    """Replay state of one fan-out target: a view of the recording writing into its own directory."""
+
+    def __init__(
+        self,
+        replayer: "EPUReplayer",
+        target: ReplayTarget,
+        index: int,
+        verify_integrity: bool,
+        verify_mode: str,
+        seed: int | None,
+    ):
+        self.replayer = copy.copy(replayer)
+        self.replayer.target_dir = Path(target.target_dir)
+        self.target = target
+        self.index = index
+        self.position = 0  # Next event to apply
+        self.due = 0.0
+        self.final_state = FinalState() if verify_integrity and verify_mode == "final" else None
+        self.hashes = (
+            IncrementalHashes(replayer.hash_algorithm) if verify_integrity and verify_mode == "streaming" else None
+        )
+        self.verification_errors: list[str] = []
+        self.skipped_unreadable: list[str] = []
+        self._random = random.Random(None if seed is None else f"{seed}:{index}")
+
+    def schedule(self, offset: float) -> float:
+        """Due time of the next event, given its offset in the recording; never earlier than the previous one."""
+        due = offset + self.target.start_offset
+        if self.target.jitter:
+            due += self._random.uniform(0, self.target.jitter)
+        self.due = max(self.due, due)
+        return self.due
+
+    def apply(self, event: EPUEvent, verify_each: bool, skip_unreadable: bool, executor: DependencyExecutor | None):
+        replayer = self.replayer
+        if self.final_state is not None:
+            self.final_state.track(event, replayer._is_verifiable(event))
+        args = (event, verify_each, self.hashes, skip_unreadable, self.verification_errors, self.skipped_unreadable)
+        if not executor:
+            replayer._apply_event(*args)
+            return
+        # Targets never share paths, so only events within one target are ordered against each other
+        keys, after, barrier = replayer._event_dependencies(event)
+        keys = tuple(f"{self.index}:{key}" for key in keys)
+        after = tuple(f"{self.index}:{key}" for key in after)
+        executor.submit(replayer._apply_event, *args, keys=keys, after=after, barrier=barrier)
+
+
+class ReplayRun:
+    """One pass over a recording into one or more targets, decoded once for all of them."""
+
+    def __init__(self, replayer: "EPUReplayer", window: SharedEventWindow, targets: list[_FanoutTarget]):
+        self.replayer = replayer
+        self.window = window
+        self.targets = targets
+        self.remaining = len(targets)  # Targets that have not applied every event yet
+
+
+class ReplayTimeline:
+    """Apply the events of any number of recordings to their targets in due-time order, from one heap.
+
+    Entries are ordered by due time, then by position in their recording, so in burst mode (no
+    clock) every target advances in step and only a few decoded events are held at a time. Runs
+    can be added while the timeline is running, to start a recording again once it has finished.
+    """
+
+    def __init__(
+        self,
+        clock: ReplayClock | None,
+        verify_each: bool,
+        skip_unreadable: bool,
+        executor: DependencyExecutor | None = None,
+    ):
+        self.clock = clock
+        self.verify_each = verify_each
+        self.skip_unreadable = skip_unreadable
+        self.executor = executor
+        self.runs: list[ReplayRun] = []
+        self.start_time = time.time()
+        self._heap: list[tuple[float, int, int, ReplayRun, _FanoutTarget]] = []
+        self._next_index = 0
+
+    def add(
+        self,
+        replayer: "EPUReplayer",
+        targets: list[ReplayTarget],
+        clock: ReplayClock | None,
+        verify_integrity: bool,
+        verify_mode: str,
+        seed: int | None = None,
+    ) -> ReplayRun:
+        """Schedule a pass over ``replayer``'s recording, timed by ``clock``, into each of ``targets``."""
+        states = []
+        for target in targets:
+            state = _FanoutTarget(replayer, target, self._next_index, verify_integrity, verify_mode, seed)
+            self._next_index += 1
+            state.replayer.target_dir.mkdir(parents=True, exist_ok=True)
+            if not self.clock and (target.start_offset or target.jitter):
+                print(f"Burst mode: ignoring start offset and jitter of {state.replayer.target_dir}")
+            states.append(state)
+
+        run = ReplayRun(replayer, SharedEventWindow(replayer.iter_events(), len(states), clock), states)
+        self.runs.append(run)
+        for state in states:
+            if not self._schedule(run, state):
+                run.remaining -= 1
+        return run
+
+    def _schedule(self, run: ReplayRun, state: _FanoutTarget) -> bool:
+        item = run.window.get(state.position)
+        if item is None:
+            return False
+        due = state.schedule(item[0]) if self.clock else 0.0
+        heapq.heappush(self._heap, (due, state.position, state.index, run, state))
+        return True
+
+    def run(self, on_finished: Callable[[ReplayRun], None] | None = None):
+        """Apply every event; ``on_finished`` is called as each run's last target applies its last event."""
+        while self._heap:
+            due, position, _, run, state = heapq.heappop(self._heap)
+            if self.clock:
+                self.clock.wait_until(due)
+            _, event = run.window.get(position)
+            state.apply(event, self.verify_each, self.skip_unreadable, self.executor)
+            state.position += 1
+
+            applied_by_all = run.window.start
+            run.window.release(position)
+            if run.window.start > applied_by_all and run.window.start % 50 == 0:
+                self._print_progress(run)
+            if not self._schedule(run, state):
+                run.remaining -= 1
+                if not run.remaining and on_finished:
+                    on_finished(run)
+
+        if self.executor:
+            self.executor.join()
+
+    def _print_progress(self, run: ReplayRun):
+        elapsed = time.time() - self.start_time
+        total = f"/{run.replayer.event_count}" if run.replayer.event_count else ""
+        print(
+            f"Progress: {run.replayer.recording_file.name}: {run.window.start}{total} events applied to "
+            f"{len(run.targets)} targets - {elapsed:.1f}s elapsed, {len(run.window)} events buffered"
+        )
+
+    def verify_final_states(self, workers: int):
+        for run in self.runs:
+            for state in run.targets:
+                if state.final_state is not None:
+                    state.verification_errors.extend(state.replayer._verify_final_state(state.final_state, workers))
+
+    def report(self):
+        if self.clock and self.clock.lateness.count:
+            print(f"Event lateness: {self.clock.lateness.summary()}")
+        for run in self.runs:
+            for state in run.targets:
+                print(f"\n{state.replayer.target_dir}:")
+                run.replayer._report(
+                    state.verification_errors, state.skipped_unreadable if self.skip_unreadable else []
+                )
 
 
 class EPUReplayer:
-    def __init__(self, recording_file: str, target_dir: str):
+    def __init__(self, recording_file: str, target_dir: str, cache: RecordingCache | None = None):
         self.recording_file = Path(recording_file)
         self.target_dir = Path(target_dir)
-        self.events: list[EPUEvent] = []
+        # Archives are unpacked into the shared cache when given, otherwise into a temporary directory
+        self.cache = cache
+        # Cache entry leased for this replayer, released once the replay is over
+        self.cache_entry: Path | None = None
         self.chunks_dir: Path | None = None
         self.temp_dir: Path | None = None
+        self.container: RecordingContainer | None = None
         self.metadata: dict = {}
+        # JSON document the events are streamed from, for legacy recordings and v2 archives
+        self.events_file: Path | None = None
+        self.event_count: int | None = None
+        self._events: EventTable | None = None
+        # Reserve disk blocks for placeholder files instead of leaving them sparse
+        self.allocate_placeholders = False
+        # How far behind schedule events were applied in the last timed replay
+        self.lateness: LatenessStats | None = None
 
         self._load_recording()
 
@@ -25,70 +228,130 @@ class EPUReplayer:
         if not self.recording_file.exists():
             raise FileNotFoundError(f"Recording file not found: {self.recording_file}")
 
-        # Check if it's a tar.gz archive or legacy JSON
-        if self.recording_file.suffix.lower() == ".gz" or tarfile.is_tarfile(self.recording_file):
+        # Check if it's an indexed container, a tar.gz archive or legacy JSON
+        if is_container(self.recording_file):
+            self._load_from_container()
+        elif is_archive(self.recording_file):
             self._load_from_archive()
         else:
             self._load_from_json()
 
-        print(f"Loaded recording with {len(self.events)} events")
+        if self.event_count is None:
+            self.event_count = self.metadata.get("total_events")
+        if self.event_count is not None:
+            print(f"Loaded recording with {self.event_count} events")
         print(f"Recorded from: {self.metadata['watch_dir']}")
         print(f"Recorded at: {self.metadata['recorded_at']}")
 
+    @property
+    def hash_algorithm(self) -> str:
+        # Recordings made before the algorithm was selectable always used SHA-256
+        return self.metadata.get("hash_algorithm", "sha256")
+
+    @property
+    def events(self) -> EventTable:
+        """All events, held in a compact table. Replay streams them instead of loading them here."""
+        if self._events is None:
+            self._events = EventTable(self.iter_events())
+        return self._events
+
+    def iter_events(self) -> Iterator[EPUEvent]:
+        """Decode events one at a time, in recorded order."""
+        if self.container:
+            for event_data in self.container.iter_events():
+                yield EPUEvent(**event_data)
+            return
+        with open(self.events_file, encoding="utf-8") as f:
+            for event_data in iter_recording_events(f):
+                yield EPUEvent(**event_data)
+
     def _load_from_archive(self):
-        print("\nUnpacking recording archive...")
-        self.temp_dir = Path(tempfile.mkdtemp(prefix="epureplayer_"))
+        if self.cache:
+            self.cache_entry = unpacked = self.cache.prepare(self.recording_file)
+        else:
+            print("\nUnpacking recording archive...")
+            self.temp_dir = unpacked = Path(tempfile.mkdtemp(prefix="epureplayer_"))
 
-        print("Extracting archive contents...")
-        with tarfile.open(self.recording_file, "r:gz") as tar:
-            tar.extractall(self.temp_dir)
+            print("Extracting archive contents...")
+            with tarfile.open(self.recording_file, "r:gz") as tar:
+                tar.extractall(self.temp_dir)
 
         # Load recording.json
         print("Loading recording metadata...")
-        recording_file = self.temp_dir / "recording.json"
+        recording_file = unpacked / "recording.json"
         if not recording_file.exists():
             raise ValueError("Invalid archive: missing recording.json")
 
-        data = json.loads(recording_file.read_text())
-        self.metadata = data["metadata"]
+        self.events_file = recording_file
+        with open(recording_file, encoding="utf-8") as f:
+            self.metadata = read_recording_metadata(f)
 
         # Set chunks directory
-        self.chunks_dir = self.temp_dir / "chunks"
+        self.chunks_dir = unpacked / "chunks"
 
         # Count binary chunks
         chunk_count = len(list(self.chunks_dir.glob("*.bin"))) if self.chunks_dir.exists() else 0
         if chunk_count > 0:
             print(f"Found {chunk_count} binary chunks")
 
-        print("Processing events...")
-        for event_data in data["events"]:
-            event = EPUEvent(**event_data)
-            self.events.append(event)
+        print("Unpacking complete")
 
-        print(f"Unpacking complete: {len(self.events)} events loaded")
+    def _load_from_container(self):
+        # Events and chunks are read in place; nothing is extracted
+        self.container = RecordingContainer(self.recording_file)
+        self.metadata = self.container.metadata
+        if self.container.chunks:
+            print(f"Found {len(self.container.chunks)} binary chunks")
+        self.event_count = len(self.container)
 
     def _load_from_json(self):
-        data = json.loads(self.recording_file.read_text())
-        self.metadata = data["metadata"]
-
-        for event_data in data["events"]:
-            event = EPUEvent(**event_data)
-            self.events.append(event)
+        self.events_file = self.recording_file
+        with open(self.recording_file, encoding="utf-8") as f:
+            self.metadata = read_recording_metadata(f)
 
     def _normalize_target_path(self, src_path: str) -> Path:
         # Convert POSIX path to target platform
         posix_path = PurePosixPath(src_path)
         return self.target_dir / Path(*posix_path.parts)
 
-    def _load_binary_chunk(self, chunk_id: str) -> bytes:
+    def _chunk_path(self, chunk_id: str) -> Path:
         if not self.chunks_dir:
             raise ValueError("No chunks directory available")
 
+        # Both legacy counter IDs (chunk_<n>) and content digests are stored as chunks/<id>.bin
+        chunk_name = PurePosixPath(chunk_id).name
+        if chunk_name != chunk_id or not chunk_name:
+            raise ValueError(f"Invalid binary chunk ID: {chunk_id}")
+
         chunk_file = self.chunks_dir / f"{chunk_id}.bin"
         if not chunk_file.exists():
             raise FileNotFoundError(f"Binary chunk not found: {chunk_id}")
 
-        return chunk_file.read_bytes()
+        return chunk_file
+
+    def _open_binary_chunk(self, chunk_id: str) -> BinaryIO:
+        if self.container:
+            return self.container.open_chunk(chunk_id)
+        return open(self._chunk_path(chunk_id), "rb")  # noqa: SIM115
+
+    def _write_binary_chunk(self, chunk_id: str, target_path: Path, append: bool = False):
+        """Replace ``target_path`` with a chunk, or add it to the end, without holding the chunk in memory."""
+        # Resolve the chunk first so a missing one leaves the target untouched
+        if self.container:
+            extent = self.container.extent(chunk_id)
+        else:
+            chunk_file = self._chunk_path(chunk_id)
+
+        # Not "ab": copy_file_range refuses destinations opened with O_APPEND
+        with open(target_path, "r+b" if append else "wb") as f:
+            f.seek(0, os.SEEK_END)
+            if not self.container:
+                copy_from_file(f, chunk_file)
+            elif not extent.compressed:
+                copy_from_file(f, self.container.path, extent.offset, extent.size)
+            else:
+                with self.container.open_chunk(chunk_id) as chunk:
+                    shutil.copyfileobj(chunk, f, COPY_BUFFER_SIZE)
 
     def _is_unreadable_file(self, event: EPUEvent) -> bool:
         return event.content_hash is not None and event.content_hash.startswith("unreadable_")
@@ -100,117 +363,271 @@ class EPUReplayer:
         max_delay: float | None = None,
         burst_mode: bool = False,
         skip_unreadable: bool = False,
+        workers: int = 1,
+        verify_mode: str = "each",
+        allocate_placeholders: bool = False,
+        targets: list[ReplayTarget] | None = None,
+        seed: int | None = None,
     ):
-        print(f"Replaying to {self.target_dir}")
-
-        if burst_mode:
-            print("Burst mode: Processing events as fast as possible")
+        """Replay into ``target_dir``, or into every one of ``targets`` from a single pass over the recording.
+
+        ``seed`` makes the random per-event jitter of fan-out targets reproducible.
+        """
+        if verify_mode not in VERIFY_MODES:
+            raise ValueError(f"Unknown verify mode {verify_mode!r}, expected one of {', '.join(VERIFY_MODES)}")
+        self.allocate_placeholders = allocate_placeholders
+        if targets:
+            print(f"Replaying to {len(targets)} targets")
         else:
-            print(f"Speed multiplier: {speed_multiplier}x")
-            if max_delay:
-                print(f"Maximum delay capped at: {max_delay}s")
+            print(f"Replaying to {self.target_dir}")
+        self._print_settings(speed_multiplier, max_delay, burst_mode, workers)
+        verify_integrity = self._check_verification(verify_integrity, verify_mode)
+        if targets:
+            self._replay_fanout(
+                targets,
+                speed_multiplier,
+                verify_integrity,
+                max_delay,
+                burst_mode,
+                skip_unreadable,
+                workers,
+                verify_mode,
+                seed,
+            )
+            return
 
         # Create target directory
         self.target_dir.mkdir(parents=True, exist_ok=True)
 
+        # "each" re-hashes a file after every change, "streaming" hashes only the bytes an append added,
+        # and "final" checks every file once, after the last event
+        final_state = FinalState() if verify_integrity and verify_mode == "final" else None
+        hashes = IncrementalHashes(self.hash_algorithm) if verify_integrity and verify_mode == "streaming" else None
+        verify_each = verify_integrity and verify_mode != "final"
+
         verification_errors = []
-        skipped_unreadable_count = 0
+        skipped_unreadable = []
         start_time = time.time()
-        total_original_duration = 0
-
-        if len(self.events) > 1:
-            total_original_duration = self.events[-1].timestamp - self.events[0].timestamp
+        first_timestamp = previous_timestamp = None
+        executor = DependencyExecutor(workers, name="epureplayer-worker") if workers > 1 else None
+        clock = None if burst_mode else ReplayClock(speed_multiplier, max_delay)
+        self.lateness = clock.lateness if clock else None
 
         try:
-            for i, event in enumerate(self.events):
-                # Calculate and apply delay
-                if i > 0 and not burst_mode:
-                    time_diff = event.timestamp - self.events[i - 1].timestamp
-                    delay = time_diff / speed_multiplier
-
-                    # Apply maximum delay cap if specified
-                    if max_delay and delay > max_delay:
-                        delay = max_delay
-
-                    # Minimum delay to prevent overwhelming the system
-                    if delay > 0.001:  # 1ms minimum
-                        time.sleep(delay)
-                elif burst_mode and i > 0:
-                    # Minimal delay in burst mode to prevent system overload
+            # Events are decoded as they are applied, so the first one lands without waiting for the rest
+            for i, event in enumerate(self.iter_events()):
+                # Wait for the event's deadline, measured from the start of the replay
+                if clock:
+                    clock.wait(event.timestamp)
+                elif i > 0 and not executor:
+                    # Minimal delay in burst mode to prevent system overload; in parallel mode the
+                    # bounded number of outstanding events holds the reader back instead
                     time.sleep(0.001)
-
-                was_skipped = self._replay_event(event, skip_unreadable=skip_unreadable)
-                if was_skipped:
-                    skipped_unreadable_count += 1
-
-                # Verify integrity after certain operations
-                if (
-                    verify_integrity
-                    and event.content_hash
-                    and not event.is_directory
-                    and not self._is_unreadable_file(event)
-                ):
-                    error = self._verify_file_integrity(event)
-                    if error:
-                        verification_errors.append(error)
+                if first_timestamp is None:
+                    first_timestamp = event.timestamp
+                previous_timestamp = event.timestamp
+
+                if final_state is not None:
+                    final_state.track(event, self._is_verifiable(event))
+                args = (event, verify_each, hashes, skip_unreadable, verification_errors, skipped_unreadable)
+                if executor:
+                    keys, after, barrier = self._event_dependencies(event)
+                    executor.submit(self._apply_event, *args, keys=keys, after=after, barrier=barrier)
+                else:
+                    self._apply_event(*args)
 
                 # Progress indicator with timing info
                 if i % 50 == 0:  # Every 50 events for better performance
                     elapsed = time.time() - start_time
-                    progress_pct = ((i + 1) / len(self.events)) * 100
-                    print(f"Progress: {i + 1}/{len(self.events)} events ({progress_pct:.1f}%) - {elapsed:.1f}s elapsed")
+                    if self.event_count:
+                        progress_pct = ((i + 1) / self.event_count) * 100
+                        print(
+                            f"Progress: {i + 1}/{self.event_count} events ({progress_pct:.1f}%) - "
+                            f"{elapsed:.1f}s elapsed"
+                        )
+                    else:
+                        print(f"Progress: {i + 1} events - {elapsed:.1f}s elapsed")
 
+            if executor:
+                executor.join()
+            if final_state is not None:
+                verification_errors.extend(self._verify_final_state(final_state, workers))
             elapsed_total = time.time() - start_time
+            total_original_duration = previous_timestamp - first_timestamp if first_timestamp is not None else 0
             print(f"\nReplay completed in {elapsed_total:.1f}s!")
 
             if total_original_duration > 0:
                 compression_ratio = total_original_duration / elapsed_total
                 print(f"Time compression: {compression_ratio:.1f}x (original: {total_original_duration:.1f}s)")
+            if clock and clock.lateness.count:
+                print(f"Event lateness: {clock.lateness.summary()}")
 
-            if skip_unreadable and skipped_unreadable_count > 0:
-                print(f"\nSkipped {skipped_unreadable_count} unreadable files during replay.")
+            self._report(verification_errors, skipped_unreadable if skip_unreadable else [])
 
-            if verification_errors:
-                print(f"\nIntegrity verification found {len(verification_errors)} issues:")
-                for error in verification_errors[:5]:  # Show first 5 errors
-                    print(f"  - {error}")
-                if len(verification_errors) > 5:
-                    print(f"  ... and {len(verification_errors) - 5} more")
-            else:
-                print("\nIntegrity verification passed!")
+        finally:
+            # Workers may still be reading chunks from the temp directory
+            if executor:
+                executor.shutdown()
+            self.release_recording()
+
+    def _replay_fanout(
+        self,
+        targets: list[ReplayTarget],
+        speed_multiplier: float,
+        verify_integrity: bool,
+        max_delay: float | None,
+        burst_mode: bool,
+        skip_unreadable: bool,
+        workers: int,
+        verify_mode: str,
+        seed: int | None,
+    ):
+        """Decode the recording once and apply every event to each target when that target is due.
+
+        Targets are scheduled from one heap, ordered by due time and then by position, so in burst
+        mode they advance in step and only a few events are held in memory at a time.
+        """
+        verify_each = verify_integrity and verify_mode != "final"
+        start_time = time.time()
+        executor = DependencyExecutor(workers, name="epureplayer-worker") if workers > 1 else None
+        clock = None if burst_mode else ReplayClock(speed_multiplier, max_delay)
+        self.lateness = clock.lateness if clock else None
+        timeline = ReplayTimeline(clock, verify_each, skip_unreadable, executor)
+
+        try:
+            run = timeline.add(self, targets, clock, verify_integrity, verify_mode, seed)
+            timeline.run()
+            timeline.verify_final_states(workers)
+
+            elapsed_total = time.time() - start_time
+            print(f"\nReplay to {len(targets)} targets completed in {elapsed_total:.1f}s!")
+            window = run.window
+            if window.first_timestamp is not None and window.last_timestamp > window.first_timestamp:
+                original = window.last_timestamp - window.first_timestamp
+                print(f"Time compression: {original / elapsed_total:.1f}x (original: {original:.1f}s)")
+            timeline.report()
 
         finally:
-            # Cleanup temp directory if created
-            if self.temp_dir and self.temp_dir.exists():
-                shutil.rmtree(self.temp_dir, ignore_errors=True)
+            if executor:
+                executor.shutdown()
+            self.release_recording()
+
+    def release_recording(self):
+        """Close the container, and remove the temporary unpacking directory or give back the cache lease."""
+        if self.container:
+            # An open handle keeps Windows from deleting or replacing the recording
+            self.container.close()
+            self.container = None
+        if self.temp_dir and self.temp_dir.exists():
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+        if self.cache_entry:
+            self.cache.release(self.cache_entry)
+            self.cache_entry = None
+
+    def _print_settings(self, speed_multiplier: float, max_delay: float | None, burst_mode: bool, workers: int):
+        if burst_mode:
+            print("Burst mode: Processing events as fast as possible")
+        else:
+            print(f"Speed multiplier: {speed_multiplier}x")
+            if max_delay:
+                print(f"Maximum delay capped at: {max_delay}s")
+        if workers > 1:
+            print(f"Parallel replay: {workers} workers")
+
+    def _check_verification(self, verify_integrity: bool, verify_mode: str) -> bool:
+        if verify_integrity and self.hash_algorithm not in available_hash_algorithms():
+            print(f"Warning: {self.hash_algorithm} is not available here, skipping integrity verification")
+            return False
+        if verify_integrity and verify_mode != "each":
+            print(f"Verification mode: {verify_mode}")
+        return verify_integrity
+
+    def _report(self, verification_errors: list[str], skipped_unreadable: list[str]):
+        if skipped_unreadable:
+            print(f"\nSkipped {len(skipped_unreadable)} unreadable files during replay.")
+
+        if verification_errors:
+            print(f"\nIntegrity verification found {len(verification_errors)} issues:")
+            for error in verification_errors[:5]:  # Show first 5 errors
+                print(f"  - {error}")
+            if len(verification_errors) > 5:
+                print(f"  ... and {len(verification_errors) - 5} more")
+        else:
+            print("\nIntegrity verification passed!")
 
-    def _verify_file_integrity(self, event: EPUEvent) -> str | None:
+    def _apply_event(
+        self,
+        event: EPUEvent,
+        verify_integrity: bool,
+        hashes: IncrementalHashes | None,
+        skip_unreadable: bool,
+        verification_errors: list[str],
+        skipped_unreadable: list[str],
+    ):
+        if self._replay_event(event, skip_unreadable=skip_unreadable):
+            skipped_unreadable.append(event.src_path)
+
+        if hashes:
+            hashes.track(event, self._is_verifiable(event))
+        # Verify integrity after certain operations
+        if verify_integrity and self._is_verifiable(event):
+            error = self._verify_file_integrity(event, hashes=hashes)
+            if error:
+                verification_errors.append(error)
+
+    def _is_verifiable(self, event: EPUEvent) -> bool:
+        return bool(event.content_hash) and not event.is_directory and not self._is_unreadable_file(event)
+
+    def _verify_final_state(self, final_state: FinalState, workers: int) -> list[str]:
+        print(f"Verifying final state of {len(final_state)} files...")
+        with ThreadPoolExecutor(max(workers, VERIFY_WORKERS), thread_name_prefix="epureplayer-verify") as pool:
+            results = pool.map(lambda item: self._verify_file_integrity(item[1], path=item[0]), final_state.items())
+            return [error for error in results if error]
+
+    def _event_dependencies(self, event: EPUEvent) -> tuple[tuple[str, ...], tuple[str, ...], bool]:
+        """Return the paths an event changes, the parent directories it needs, and whether it is a barrier.
+
+        Moves and deletes can affect whole subtrees, so they run alone, after everything before them.
+        Any other event only needs earlier events on its own path and its parent directories applied.
+        """
+        if event.event_type in ("moved", "deleted"):
+            return (), (), True
+        parents = tuple(str(parent) for parent in PurePosixPath(event.src_path).parents if parent.parts)
+        return (event.src_path,), parents, False
+
+    def _verify_file_integrity(
+        self, event: EPUEvent, path: str | None = None, hashes: IncrementalHashes | None = None
+    ) -> str | None:
+        """Check the file an event produced, now at ``path`` if it has moved since."""
         if not event.content_hash:
             return None
 
-        target_path = self._normalize_target_path(event.src_path)
+        target_path = self._normalize_target_path(path or event.src_path)
+        # Problems are reported against the event that produced the expected content
+        name = event.src_path if path in (None, event.src_path) else f"{event.src_path} (moved to {path})"
 
         if not target_path.exists():
-            return f"File missing after replay: {event.src_path}"
+            return f"File missing after replay: {name}"
+
+        if event.is_placeholder:
+            # Placeholder content is never recorded, and its fingerprint may not be a content hash
+            actual_size = target_path.stat().st_size
+            if event.size is not None and actual_size != event.size:
+                return f"Size mismatch for placeholder {name}: expected {event.size}, got {actual_size}"
+            return None
 
         try:
-            actual_hash = self._calculate_file_hash(target_path)
+            # Streaming verification only reads what an append added
+            actual_hash = hashes.hash_after(event, target_path) if hashes else self._calculate_file_hash(target_path)
             if actual_hash != event.content_hash:
-                return (
-                    f"Hash mismatch for {event.src_path}: "
-                    f"expected {event.content_hash[:8]}..., got {actual_hash[:8]}..."
-                )
+                return f"Hash mismatch for {name}: expected {event.content_hash[:8]}..., got {actual_hash[:8]}..."
         except Exception as e:
-            return f"Error verifying {event.src_path}: {e}"
+            return f"Error verifying {name}: {e}"
 
         return None
 
     def _calculate_file_hash(self, file_path: Path) -> str:
-        hash_sha256 = hashlib.sha256()
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_sha256.update(chunk)
-        return hash_sha256.hexdigest()
+        return hash_file(file_path, self.hash_algorithm)
 
     def _replay_event(self, event: EPUEvent, skip_unreadable: bool = False) -> bool:
         target_path = self._normalize_target_path(event.src_path)
@@ -237,6 +654,9 @@ class EPUReplayer:
             elif event.event_type == "truncated" and not event.is_directory:
                 self._replay_file_truncate(event, target_path)
 
+            elif event.event_type == "patched" and not event.is_directory:
+                self._replay_file_patch(event, target_path)
+
             elif event.event_type == "deleted":
                 if target_path.exists():
                     if event.is_directory:
@@ -261,25 +681,20 @@ class EPUReplayer:
         target_path.parent.mkdir(parents=True, exist_ok=True)
 
         if getattr(event, "is_placeholder", False):
-            # Create empty placeholder file with correct size
-            with open(target_path, "wb") as f:
-                if event.size:
-                    f.write(b"\0" * event.size)
+            # Create empty placeholder file with correct size, sparse unless allocation was asked for
+            create_placeholder(target_path, event.size, allocate=self.allocate_placeholders)
             print(f"Created binary placeholder file: {event.src_path} ({event.size} bytes)")
         elif event.content is not None:
             # Text content
-            target_path.write_text(event.content)
+            target_path.write_text(event.content, encoding="utf-8", newline="")
             print(f"Created file: {event.src_path}")
         elif event.binary_chunk_id:
             # Binary content from chunk
-            binary_content = self._load_binary_chunk(event.binary_chunk_id)
-            target_path.write_bytes(binary_content)
+            self._write_binary_chunk(event.binary_chunk_id, target_path)
             print(f"Created file: {event.src_path}")
         else:
             # Create empty file with correct size
-            with open(target_path, "wb") as f:
-                if event.size:
-                    f.write(b"\0" * event.size)
+            create_placeholder(target_path, event.size, allocate=self.allocate_placeholders)
             print(f"Created file: {event.src_path}")
 
         # Set timestamps if available
@@ -298,20 +713,15 @@ class EPUReplayer:
 
         if getattr(event, "is_placeholder", False):
             # For placeholder files, just update the size
-            with open(target_path, "r+b") as f:
-                f.truncate(event.size or 0)
-                if event.size:
-                    f.seek(0)
-                    f.write(b"\0" * event.size)
+            create_placeholder(target_path, event.size, allocate=self.allocate_placeholders)
             print(f"Modified binary placeholder file: {event.src_path} ({event.size} bytes)")
         elif event.content is not None:
             # Text content - full replacement
-            target_path.write_text(event.content)
+            target_path.write_text(event.content, encoding="utf-8", newline="")
             print(f"Modified file: {event.src_path}")
         elif event.binary_chunk_id:
             # Binary content - full replacement
-            binary_content = self._load_binary_chunk(event.binary_chunk_id)
-            target_path.write_bytes(binary_content)
+            self._write_binary_chunk(event.binary_chunk_id, target_path)
             print(f"Modified file: {event.src_path}")
         else:
             print(f"Modified file: {event.src_path}")
@@ -333,13 +743,11 @@ class EPUReplayer:
 
         if event.content is not None:
             # Text append
-            with open(target_path, "a", encoding="utf-8") as f:
+            with open(target_path, "a", encoding="utf-8", newline="") as f:
                 f.write(event.content)
         elif event.binary_chunk_id:
             # Binary append
-            binary_content = self._load_binary_chunk(event.binary_chunk_id)
-            with open(target_path, "ab") as f:
-                f.write(binary_content)
+            self._write_binary_chunk(event.binary_chunk_id, target_path, append=True)
 
         append_size = event.operation_data.get("append_size", 0) if event.operation_data else 0
         print(f"Appended to file: {event.src_path} (+{append_size} bytes)")
@@ -355,3 +763,23 @@ class EPUReplayer:
             f.truncate(new_size)
 
         print(f"Truncated file: {event.src_path} to {new_size} bytes")
+
+    def _replay_file_patch(self, event: EPUEvent, target_path: Path):
+        if not target_path.exists():
+            print(f"Warning: Cannot patch non-existent file {event.src_path}")
+            return
+
+        operation_data = event.operation_data or {}
+        patches = operation_data.get("patches", [])
+
+        with open(target_path, "r+b") as f:
+            if patches:
+                # Changed ranges are stored back to back in a single chunk
+                with self._open_binary_chunk(event.binary_chunk_id) as chunk:
+                    for offset, length in patches:
+                        f.seek(offset)
+                        f.write(chunk.read(length))
+            f.truncate(operation_data.get("new_size", event.size))
+
+        patched_bytes = sum(length for _offset, length in patches)
+        print(f"Patched file: {event.src_path} ({len(patches)} ranges, {patched_bytes} bytes)")
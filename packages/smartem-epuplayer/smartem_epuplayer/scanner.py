@@ -0,0 +1,80 @@
+import os
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+
+@dataclass
+class ScanEntry:
+    path: Path
+    rel_path: str  # POSIX path relative to the scan root
+    is_directory: bool
+    stat: os.stat_result | None = None
+
+
+def scan_tree(root: Path) -> Iterator[ScanEntry]:
+    """Walk ``root`` with ``os.scandir`` in a deterministic order.
+
+    Every directory below ``root`` is yielded before its contents, files before subdirectories,
+    each sorted by name, so repeated scans of the same tree produce the same sequence. File entries
+    carry the ``stat`` result from the scan. Symlinked directories are not followed and unreadable
+    directories are skipped, as with ``os.walk``.
+    """
+    stack: list[tuple[Path, str]] = [(root, "")]
+    while stack:
+        dir_path, rel_dir = stack.pop()
+        if rel_dir:
+            yield ScanEntry(dir_path, rel_dir, is_directory=True)
+
+        try:
+            with os.scandir(dir_path) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+
+        subdirs = []
+        for entry in entries:
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                if entry.is_dir():
+                    if not entry.is_symlink():
+                        subdirs.append((Path(entry.path), rel_path))
+                    continue
+                stat = entry.stat()
+            except OSError:
+                continue
+            yield ScanEntry(Path(entry.path), rel_path, is_directory=False, stat=stat)
+
+        # Push in reverse so subdirectories are visited in name order
+        stack.extend(reversed(subdirs))
+
+
+class ScanProgress:
+    """Periodically report scan throughput in files/s and MB/s."""
+
+    def __init__(self, label: str, interval: float = 2.0):
+        self.label = label
+        self.interval = interval
+        self.files = 0
+        self.bytes = 0
+        self.start = time.monotonic()
+        self._last_report = self.start
+
+    def update(self, size: int):
+        self.files += 1
+        self.bytes += size
+        now = time.monotonic()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            print(f"{self.label}: {self._rates(now)}")
+
+    def finish(self):
+        print(f"{self.label} complete: {self._rates(time.monotonic())}")
+
+    def _rates(self, now: float) -> str:
+        elapsed = max(now - self.start, 1e-9)
+        return (
+            f"{self.files} files, {self.bytes / 1e6:.1f} MB in {elapsed:.1f}s "
+            f"({self.files / elapsed:.0f} files/s, {self.bytes / 1e6 / elapsed:.1f} MB/s)"
+        )
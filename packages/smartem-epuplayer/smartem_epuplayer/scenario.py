@@ -0,0 +1,223 @@
+"""Replay several recordings at once on one timeline, as described by a scenario file.
+
+A scenario lists sessions: a recording replayed into one or more target directories at its own
+speed, starting some seconds after the scenario does, and optionally repeated back to back. For
+example, two Krios sessions and a Glacios session that starts a minute later and runs three
+times, into ``runs/1`` .. ``runs/3``::
+
+    {
+      "sessions": [
+        {"name": "Krios 1", "recording": "krios.tar.gz", "target": "epu/m02", "speed": 100, "max_delay": 1},
+        {"name": "Krios 2", "recording": "krios.tar.gz", "target": "epu/m03", "speed": 100, "start_offset": 20},
+        {"name": "Glacios 1", "recording": "glacios.epurec", "target": "epu/m10/runs/{n}", "start_offset": 60,
+         "repeat": 3}
+      ]
+    }
+
+The same structure can be written as YAML with PyYAML installed. Relative paths are resolved
+against the directory of the scenario file.
+"""
+
+import json
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .cache import RecordingCache, is_archive
+from .dag import DependencyExecutor
+from .hashing import available_hash_algorithms
+from .replayer import EPUReplayer, ReplayRun, ReplayTarget, ReplayTimeline
+from .scheduler import ReplayClock
+from .verification import VERIFY_MODES
+
+try:
+    import yaml
+except ImportError:  # Optional: pip install "smartem-epuplayer[yaml]"
+    yaml = None
+
+
+@dataclass
+class ScenarioSession:
+    recording: Path
+    # Directories to replay into; "{n}" is replaced by the repetition number, from 1
+    targets: list[str]
+    name: str = ""
+    speed: float = 1.0
+    max_delay: float | None = None
+    # Seconds after the scenario starts at which the first event is due
+    start_offset: float = 0.0
+    jitter: float = 0.0
+    # Times to replay the recording, each starting when the previous one has finished
+    repeat: int = 1
+
+
+@dataclass
+class Scenario:
+    sessions: list[ScenarioSession] = field(default_factory=list)
+
+
+# Types accepted for each session field; numbers may be given as int or float, but never as a bool
+_FIELD_TYPES = {
+    "recording": (str,),
+    "target": (str,),
+    "targets": (list,),
+    "name": (str,),
+    "speed": (int, float),
+    "max_delay": (int, float, type(None)),
+    "start_offset": (int, float),
+    "jitter": (int, float),
+    "repeat": (int,),
+}
+
+
+def _parse_session(index: int, data: dict, base_dir: Path) -> ScenarioSession:
+    where = f"Scenario session {index}"
+    if not isinstance(data, dict):
+        raise ValueError(f"{where} is not a mapping of session fields")
+    unknown = set(data) - set(_FIELD_TYPES)
+    if unknown:
+        raise ValueError(f"{where}: unknown fields: {', '.join(sorted(map(str, unknown)))}")
+    for name, value in data.items():
+        if isinstance(value, bool) or not isinstance(value, _FIELD_TYPES[name]):
+            expected = " or ".join("null" if t is type(None) else t.__name__ for t in _FIELD_TYPES[name])
+            raise ValueError(f"{where}: {name} must be {expected}, not {type(value).__name__} {value!r}")
+    data = dict(data)
+    if "recording" not in data:
+        raise ValueError(f"{where} has no recording")
+    targets = data.pop("targets", []) + ([data.pop("target")] if "target" in data else [])
+    if not targets:
+        raise ValueError(f"{where} ({data['recording']}) has no target")
+    if not all(isinstance(target, str) for target in targets):
+        raise ValueError(f"{where}: targets must be a list of directories")
+
+    session = ScenarioSession(**data, targets=[str(base_dir / target) for target in targets])
+    session.recording = base_dir / session.recording
+    session.name = session.name or session.recording.name
+    if session.repeat < 1 or session.speed <= 0:
+        raise ValueError(f"{where} ({session.name}): repeat must be at least 1 and speed positive")
+    return session
+
+
+def load_scenario(path: str | Path) -> Scenario:
+    """Read a scenario from a JSON file, or a YAML file (``.yaml``/``.yml``) when PyYAML is installed."""
+    path = Path(path)
+    with open(path, encoding="utf-8") as f:
+        if path.suffix.lower() in (".yaml", ".yml"):
+            if yaml is None:
+                raise ValueError("YAML scenarios need the PyYAML package: pip install pyyaml")
+            try:
+                data = yaml.safe_load(f)
+            except yaml.YAMLError as e:
+                raise ValueError(f"Scenario {path} is not valid YAML: {e}") from e
+        else:
+            data = json.load(f)
+
+    if not isinstance(data, dict) or not data.get("sessions"):
+        raise ValueError(f"Scenario {path} lists no sessions")
+    sessions = data["sessions"]
+    if not isinstance(sessions, list):
+        raise ValueError(f"Scenario {path}: sessions must be a list")
+    return Scenario([_parse_session(index, session, path.parent) for index, session in enumerate(sessions, 1)])
+
+
+def replay_scenario(
+    scenario: Scenario,
+    verify_integrity: bool = True,
+    burst_mode: bool = False,
+    skip_unreadable: bool = False,
+    workers: int = 1,
+    verify_mode: str = "each",
+    allocate_placeholders: bool = False,
+    cache: RecordingCache | None = None,
+    seed: int | None = None,
+) -> ReplayTimeline:
+    """Replay every session of ``scenario`` against one clock, applying events in due-time order.
+
+    Each recording is loaded once however many sessions use it. Events of every session and
+    repetition are merged on one heap, so a single thread keeps all of them on schedule.
+    """
+    if verify_mode not in VERIFY_MODES:
+        raise ValueError(f"Unknown verify mode {verify_mode!r}, expected one of {', '.join(VERIFY_MODES)}")
+
+    # Each recording's first session provides the target its replayer is created with
+    recordings: dict[Path, str] = {}
+    for session in scenario.sessions:
+        recordings.setdefault(session.recording, session.targets[0])
+    replayers: dict[Path, EPUReplayer] = {}
+    prepared: list[Path] = []
+    try:
+        if cache:
+            # Unpack every archive before replaying any, so pruning for one never evicts another
+            archives = [recording for recording in recordings if is_archive(recording)]
+            keep = {cache.key(archive) for archive in archives}
+            prepared = [cache.prepare(archive, keep=keep) for archive in archives]
+        for recording, target in recordings.items():
+            replayer = EPUReplayer(str(recording), target, cache=cache)
+            replayer.allocate_placeholders = allocate_placeholders
+            replayers[recording] = replayer
+        return _replay_sessions(
+            scenario, replayers, verify_integrity, burst_mode, skip_unreadable, workers, verify_mode, seed
+        )
+    finally:
+        for replayer in replayers.values():
+            replayer.release_recording()
+        for entry in prepared:
+            cache.release(entry)
+
+
+def _replay_sessions(
+    scenario: Scenario,
+    replayers: dict[Path, EPUReplayer],
+    verify_integrity: bool,
+    burst_mode: bool,
+    skip_unreadable: bool,
+    workers: int,
+    verify_mode: str,
+    seed: int | None,
+) -> ReplayTimeline:
+    print(f"\nScenario: {len(scenario.sessions)} sessions from {len(replayers)} recordings")
+    for session in scenario.sessions:
+        repeat = f", {session.repeat} times" if session.repeat > 1 else ""
+        print(
+            f"  {session.name}: {session.speed}x from +{session.start_offset}s into "
+            f"{', '.join(session.targets)}{repeat}"
+        )
+    if verify_integrity:
+        missing = {r.hash_algorithm for r in replayers.values()} - set(available_hash_algorithms())
+        if missing:
+            print(f"Warning: {', '.join(sorted(missing))} not available here, skipping integrity verification")
+            verify_integrity = False
+
+    executor = DependencyExecutor(workers, name="epureplayer-worker") if workers > 1 else None
+    timeline = ReplayTimeline(
+        None if burst_mode else ReplayClock(), verify_integrity and verify_mode != "final", skip_unreadable, executor
+    )
+    sessions: dict[ReplayRun, tuple[ScenarioSession, int]] = {}  # run -> (session, repetition)
+
+    def start(session: ScenarioSession, repetition: int, start_offset: float):
+        targets = [
+            ReplayTarget(target.replace("{n}", str(repetition)), start_offset=start_offset, jitter=session.jitter)
+            for target in session.targets
+        ]
+        clock = None if burst_mode else ReplayClock(session.speed, session.max_delay)
+        run = timeline.add(replayers[session.recording], targets, clock, verify_integrity, verify_mode, seed)
+        sessions[run] = (session, repetition)
+
+    def repeat(run: ReplayRun):
+        session, repetition = sessions[run]
+        if repetition < session.repeat:
+            start(session, repetition + 1, max(state.due for state in run.targets))
+
+    try:
+        for session in scenario.sessions:
+            start(session, 1, session.start_offset)
+        timeline.run(on_finished=repeat)
+        timeline.verify_final_states(workers)
+
+        elapsed = time.time() - timeline.start_time
+        print(f"\nScenario completed in {elapsed:.1f}s: {len(timeline.runs)} replays")
+        timeline.report()
+    finally:
+        if executor:
+            executor.shutdown()
+    return timeline
@@ -0,0 +1,147 @@
+import math
+import time
+from collections import Counter, deque
+from collections.abc import Callable, Iterator
+from typing import Any
+
+
+class LatenessStats:
+    """Distribution of how late events were applied, in a fixed-size log-scale histogram.
+
+    Buckets are an eighth of an octave wide (about 9%), starting at one microsecond, so
+    percentiles are approximate but memory stays constant however long the replay runs.
+    """
+
+    BUCKETS_PER_OCTAVE = 8
+    RESOLUTION = 1e-6
+
+    def __init__(self):
+        self.count = 0
+        self.max = 0.0
+        self._buckets: Counter[int] = Counter()
+
+    def add(self, lateness: float):
+        self.count += 1
+        self.max = max(self.max, lateness)
+        if lateness < self.RESOLUTION:
+            self._buckets[0] += 1
+        else:
+            self._buckets[1 + int(math.log2(lateness / self.RESOLUTION) * self.BUCKETS_PER_OCTAVE)] += 1
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th percentile (0-100), in seconds."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * q / 100))
+        seen = 0
+        for bucket in sorted(self._buckets):
+            seen += self._buckets[bucket]
+            if seen >= rank:
+                upper = self.RESOLUTION * 2 ** (bucket / self.BUCKETS_PER_OCTAVE) if bucket else 0.0
+                return min(upper, self.max)
+        return self.max
+
+    def summary(self) -> str:
+        return (
+            f"p50 {self.percentile(50) * 1000:.1f} ms, p99 {self.percentile(99) * 1000:.1f} ms, "
+            f"max {self.max * 1000:.1f} ms over {self.count} events"
+        )
+
+
+class ReplayClock:
+    """Hold events back until their deadline on the monotonic clock.
+
+    Deadlines are absolute: ``start + (timestamp - first timestamp) / speed``, with each recorded
+    gap optionally capped at ``max_delay``. Time spent applying an event therefore comes out of
+    the wait for the next one instead of adding to it, and a replay that falls behind catches up
+    rather than drifting further. Events recorded out of timestamp order are not held back.
+    """
+
+    def __init__(
+        self,
+        speed_multiplier: float = 1.0,
+        max_delay: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.speed_multiplier = speed_multiplier
+        self.max_delay = max_delay
+        self.lateness = LatenessStats()
+        self._clock = clock
+        self._sleep = sleep
+        self._start: float | None = None
+        self._latest_timestamp = 0.0
+        self._offset = 0.0  # Seconds after start at which the latest event is due
+
+    def due(self, timestamp: float) -> float:
+        """Seconds after the start of the replay at which the event recorded at ``timestamp`` is due.
+
+        Call once per event, in recorded order.
+        """
+        if self._start is None:
+            self._start = self._clock()
+            self._latest_timestamp = timestamp
+        elif timestamp > self._latest_timestamp:
+            delay = (timestamp - self._latest_timestamp) / self.speed_multiplier
+            if self.max_delay:
+                delay = min(delay, self.max_delay)
+            self._offset += delay
+            self._latest_timestamp = timestamp
+        return self._offset
+
+    def wait_until(self, offset: float) -> float:
+        """Sleep until ``offset`` seconds after the start; return how late that is, in seconds."""
+        if self._start is None:
+            self._start = self._clock()
+        deadline = self._start + offset
+        remaining = deadline - self._clock()
+        if remaining > 0:
+            self._sleep(remaining)
+        lateness = max(0.0, self._clock() - deadline)
+        self.lateness.add(lateness)
+        return lateness
+
+    def wait(self, timestamp: float) -> float:
+        """Sleep until the event recorded at ``timestamp`` is due; return how late it is, in seconds."""
+        return self.wait_until(self.due(timestamp))
+
+
+class SharedEventWindow:
+    """Events decoded once and held until every one of ``readers`` has applied them.
+
+    Lets several fan-out targets replay one recording from a single decoder. Memory is bounded by
+    how far the slowest target trails the fastest, not by the length of the recording.
+    """
+
+    def __init__(self, events: Iterator[Any], readers: int, clock: ReplayClock | None = None):
+        self.readers = readers
+        self.start = 0  # Position in the recording of the oldest event held
+        self.first_timestamp: float | None = None
+        self.last_timestamp: float | None = None
+        self._events = events
+        self._clock = clock
+        self._window: deque[list] = deque()  # [due offset, event, readers still to apply it]
+
+    def get(self, position: int) -> tuple[float, Any] | None:
+        """The event at ``position`` and its offset from the replay start, or None past the end."""
+        while position - self.start >= len(self._window):
+            event = next(self._events, None)
+            if event is None:
+                return None
+            if self.first_timestamp is None:
+                self.first_timestamp = event.timestamp
+            self.last_timestamp = event.timestamp
+            due = self._clock.due(event.timestamp) if self._clock else 0.0
+            self._window.append([due, event, self.readers])
+        due, event, _ = self._window[position - self.start]
+        return due, event
+
+    def release(self, position: int):
+        """Record that one reader has applied the event at ``position``."""
+        self._window[position - self.start][2] -= 1
+        while self._window and not self._window[0][2]:
+            self._window.popleft()
+            self.start += 1
+
+    def __len__(self) -> int:
+        return len(self._window)
@@ -0,0 +1,87 @@
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+# Rough in-memory cost of a hashlib object, used when accounting cache size
+HASHER_OVERHEAD = 256
+# Rough in-memory cost of one sampled (offset, digest) pair
+SAMPLE_OVERHEAD = 100
+
+
+@dataclass(slots=True)
+class FileState:
+    """What the recorder needs to know about a tracked file to classify its next change."""
+
+    size: int
+    hash: str
+
+
+@dataclass(slots=True)
+class DeltaState:
+    """Per-path data that makes appends and rewrites cheap to record, but can always be rebuilt."""
+
+    hasher: Any  # Hash state after the last byte seen, resumable for appends
+    head: bytes
+    tail: bytes
+    samples: tuple[tuple[int, bytes], ...]  # (offset, digest) of blocks re-read to validate an append
+    blocks: bytes | None  # Block signature for patch detection
+
+    def cost(self) -> int:
+        samples = SAMPLE_OVERHEAD * len(self.samples)
+        return HASHER_OVERHEAD + len(self.head) + len(self.tail) + samples + len(self.blocks or b"")
+
+
+class FileStateTable(dict[str, FileState]):
+    """``file_states`` mapping whose keys are interned, so each tracked path string exists once."""
+
+    def __setitem__(self, path: str, state: FileState):
+        super().__setitem__(sys.intern(path), state)
+
+
+class DeltaCache:
+    """Size-bounded LRU cache of :class:`DeltaState` per path.
+
+    An evicted entry only costs performance: the next change to that path is hashed in full.
+    Safe to share between recorder worker threads.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, DeltaState] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> DeltaState | None:
+        with self._lock:
+            state = self._entries.get(path)
+            if state is not None:
+                self._entries.move_to_end(path)
+            return state
+
+    def put(self, path: str, state: DeltaState | None):
+        with self._lock:
+            self._pop(path)
+            if state is None or state.cost() > self.max_bytes:
+                return
+            self._entries[sys.intern(path)] = state
+            self.current_bytes += state.cost()
+            while self.current_bytes > self.max_bytes:
+                _path, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.cost()
+                self.evictions += 1
+
+    def pop(self, path: str) -> DeltaState | None:
+        with self._lock:
+            return self._pop(path)
+
+    def _pop(self, path: str) -> DeltaState | None:
+        state = self._entries.pop(path, None)
+        if state is not None:
+            self.current_bytes -= state.cost()
+        return state
+
+    def __len__(self) -> int:
+        return len(self._entries)
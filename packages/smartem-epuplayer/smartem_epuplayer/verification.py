@@ -0,0 +1,102 @@
+"""Cheaper integrity verification for replays of files that change many times.
+
+``each`` mode re-hashes the whole target file after every event, so a file appended N times is
+read N times. :class:`FinalState` instead remembers the last verifiable event per path, to check
+each file once when replay ends. :class:`IncrementalHashes` keeps a running hash per file and
+feeds it only the bytes an append added.
+"""
+
+import dataclasses
+from pathlib import Path
+from typing import Any
+
+from .hashing import HASH_BUFFER_SIZE, new_hasher
+from .models import EPUEvent
+
+VERIFY_MODES = ("each", "final", "streaming")
+
+
+def _is_within(path: str, directory: str) -> bool:
+    return path == directory or path.startswith(directory + "/")
+
+
+def _forget(entries: dict[str, Any], path: str, is_directory: bool):
+    if not is_directory:
+        entries.pop(path, None)
+        return
+    for key in [key for key in entries if _is_within(key, path)]:
+        del entries[key]
+
+
+def _move(entries: dict[str, Any], src: str, dest: str, is_directory: bool):
+    if not is_directory:
+        if src in entries:
+            entries[dest] = entries.pop(src)
+        return
+    _forget(entries, dest, is_directory=True)
+    for key in [key for key in entries if _is_within(key, src)]:
+        entries[dest + key[len(src) :]] = entries.pop(key)
+
+
+class FinalState:
+    """The last verifiable event for every path, followed through moves and deletes."""
+
+    def __init__(self):
+        self._events: dict[str, EPUEvent] = {}
+
+    def track(self, event: EPUEvent, verifiable: bool):
+        """Fold in the next event in replay order."""
+        if event.event_type == "moved":
+            _move(self._events, event.src_path, event.dest_path, event.is_directory)
+        elif event.event_type == "deleted":
+            _forget(self._events, event.src_path, event.is_directory)
+        elif verifiable:
+            # Only what verification needs; text content could be large
+            self._events[event.src_path] = dataclasses.replace(event, content=None, operation_data=None)
+        elif not event.is_directory:
+            # Changed in a way that cannot be checked, so an earlier expectation no longer holds
+            self._events.pop(event.src_path, None)
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def items(self) -> list[tuple[str, EPUEvent]]:
+        """(current path, event that produced its expected content) pairs."""
+        return list(self._events.items())
+
+
+class IncrementalHashes:
+    """Running content hashes of replayed files, so verifying an append reads only the new bytes."""
+
+    def __init__(self, algorithm: str):
+        self.algorithm = algorithm
+        self.bytes_hashed = 0
+        self._states: dict[str, tuple[Any, int]] = {}  # path -> (hasher, bytes hashed)
+
+    def hash_after(self, event: EPUEvent, target_path: Path) -> str:
+        """Return the hash of ``target_path`` after ``event`` was applied to it."""
+        state = self._states.pop(event.src_path, None)
+        if event.event_type == "appended" and state is not None and state[1] == event.file_position:
+            hasher, offset = state
+        else:
+            # Anything but an append onto known content can change bytes anywhere in the file
+            hasher, offset = new_hasher(self.algorithm), 0
+
+        with open(target_path, "rb") as f:
+            f.seek(offset)
+            while block := f.read(HASH_BUFFER_SIZE):
+                hasher.update(block)
+                offset += len(block)
+                self.bytes_hashed += len(block)
+
+        self._states[event.src_path] = (hasher, offset)
+        return hasher.hexdigest()
+
+    def track(self, event: EPUEvent, verifiable: bool):
+        """Follow moves and deletes, and drop state for changes that are not hashed."""
+        if event.event_type == "moved":
+            _move(self._states, event.src_path, event.dest_path, event.is_directory)
+        elif event.event_type == "deleted":
+            _forget(self._states, event.src_path, event.is_directory)
+        elif not verifiable or event.is_placeholder:
+            _forget(self._states, event.src_path, is_directory=False)
@@ -53,3 +53,50 @@ def test_module_import():
     assert EPUEvent is not None
     assert EPURecorder is not None
     assert EPUReplayer is not None
+
+
+def test_cli_scenario_help():
+    result = subprocess.run(
+        [sys.executable, "-m", "smartem_epuplayer", "scenario", "--help"],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0
+    assert "--cache-dir" in result.stdout
+    assert "--cache-max-gb" in result.stdout
+
+
+def test_cli_cache_list(tmp_path):
+    result = subprocess.run(
+        [sys.executable, "-m", "smartem_epuplayer", "cache", "--cache-dir", str(tmp_path), "list"],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0
+    assert str(tmp_path) in result.stdout
+    assert "0 recordings" in result.stdout
+
+
+def test_cli_replay_rejects_stagger_with_one_target(tmp_path):
+    result = subprocess.run(
+        [sys.executable, "-m", "smartem_epuplayer", "replay", "rec.epurec", str(tmp_path), "--stagger", "5"],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 2
+    assert "more than one target" in result.stderr
+
+
+def test_cli_scenario_rejects_mistyped_fields(tmp_path):
+    scenario_file = tmp_path / "facility.json"
+    scenario_file.write_text(
+        '{"sessions": [{"recording": "a.tar.gz", "target": "a"}, {"recording": "b.tar.gz", "target": "b", '
+        '"speed": "100"}]}'
+    )
+    result = subprocess.run(
+        [sys.executable, "-m", "smartem_epuplayer", "scenario", str(scenario_file)],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 1
+    assert "Scenario session 2: speed must be int or float" in result.stderr
@@ -1,9 +1,26 @@
+import builtins
+import hashlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import threading
 import time
+from pathlib import Path
 
 import pytest
+from watchdog.events import FileCreatedEvent, FileModifiedEvent, FileMovedEvent
+from watchdog.observers.api import EventQueue, ObservedWatch
 
-from smartem_epuplayer import EPURecorder, EPUReplayer
-from smartem_epuplayer.models import EPUEvent
+from smartem_epuplayer import EPURecorder, EPUReplayer, ReplayTarget, cache, container, fileops, jsonstream, scenario
+from smartem_epuplayer.cache import RecordingCache
+from smartem_epuplayer.dispatch import OrderedDispatcher
+from smartem_epuplayer.models import EPUEvent, EventTable
+from smartem_epuplayer.polling import IndexedPollingEmitter
+from smartem_epuplayer.scheduler import ReplayClock, SharedEventWindow
 
 
 class TestEPUEvent:
@@ -28,6 +45,38 @@ class TestEPUEvent:
         assert event.content == "Hello, World!"
         assert event.size == 13
 
+    def test_event_table_roundtrip(self):
+        events = [
+            EPUEvent(timestamp=0.0, event_type="initial_dir", src_path="GridSquare_1", is_directory=True),
+            EPUEvent(
+                timestamp=1.5, event_type="created", src_path="GridSquare_1/FoilHole_1.xml", content="<x/>", size=4
+            ),
+            EPUEvent(
+                timestamp=2.0,
+                event_type="patched",
+                src_path="GridSquare_1/GridSquare_1.dm",
+                size=0,
+                content_hash="ab" * 32,
+                binary_chunk_id="cd" * 32,
+                operation_data={"patches": [[0, 8]]},
+                file_position=0,
+                is_placeholder=True,
+            ),
+            EPUEvent(timestamp=3.0, event_type="moved", src_path="GridSquare_1", dest_path="GridSquare_2"),
+            EPUEvent(timestamp=4.0, event_type="renamed_by_future_epu", src_path="GridSquare_2"),
+        ]
+        table = EventTable(event.to_dict() for event in events)
+
+        assert not hasattr(events[0], "__dict__")
+        assert list(table) == events
+        assert table[-2:] == events[-2:]
+        assert table.timestamps.typecode == "d"
+        assert table.type_counts()["renamed_by_future_epu"] == 1
+
+        summary = EventTable(events, payload=False)
+        assert summary[2].operation_data is None and summary[2].content_hash is None
+        assert summary[3].dest_path == "GridSquare_2"
+
 
 class TestEPURecorder:
     def test_recorder_init(self, watch_dir, recording_file):
@@ -59,6 +108,367 @@ class TestEPURecorder:
         assert "subdir" in event_paths
         assert "subdir/file3.txt" in event_paths
 
+    def test_parallel_initial_scan_is_deterministic(self, watch_dir, recording_file):
+        for square in ("GridSquare_2", "GridSquare_1"):
+            data = watch_dir / square / "Data"
+            data.mkdir(parents=True)
+            for i in range(20, 0, -1):
+                (data / f"FoilHole_{i:03d}.xml").write_text(f"<foilhole id='{i}'/>")
+
+        recorder = EPURecorder(watch_dir=str(watch_dir), output_file=str(recording_file), scan_workers=8)
+        paths = [e.src_path for e in recorder.events]
+
+        assert paths[:3] == ["GridSquare_1", "GridSquare_1/Data", "GridSquare_1/Data/FoilHole_001.xml"]
+        assert paths.index("GridSquare_2") > paths.index("GridSquare_1/Data/FoilHole_020.xml")
+        assert len(paths) == 44
+        assert recorder.file_states["GridSquare_2/Data/FoilHole_007.xml"].size == len("<foilhole id='7'/>")
+
+    def test_append_hashes_only_new_bytes(self, watch_dir, recording_file, monkeypatch):
+        grid_square = watch_dir / "GridSquare_1.dm"
+        grid_square.write_text("<header/>\n")
+        recorder = EPURecorder(watch_dir=str(watch_dir), output_file=str(recording_file), quiet_window=0)
+
+        def no_full_rehash(*args, **kwargs):
+            raise AssertionError("append should not rehash the whole file")
+
+        with monkeypatch.context() as m:
+            m.setattr(recorder, "_ingest_file", no_full_rehash)
+            for i in range(3):
+                with open(grid_square, "a") as f:
+                    f.write(f"<entry id='{i}'/>\n")
+                recorder.on_modified(FileModifiedEvent(str(grid_square)))
+                recorder.drain()
+
+        expected = hashlib.sha256(grid_square.read_bytes()).hexdigest()
+        assert recorder.file_states["GridSquare_1.dm"].hash == expected
+
+        # A rewritten prefix is detected and recorded as a full modification
+        grid_square.write_text("<HEADER/>\n" + grid_square.read_text()[10:] + "<tail/>\n")
+        recorder.on_modified(FileModifiedEvent(str(grid_square)))
+        recorder.drain()
+        events = recorder.events
+        assert [e.event_type for e in events[1:]] == ["appended", "appended", "appended", "modified"]
+        assert events[-1].content_hash == hashlib.sha256(grid_square.read_bytes()).hexdigest()
+
+    def test_middle_edit_with_append_is_not_recorded_as_append(self, watch_dir, target_dir, recording_file):
+        grid_square = watch_dir / "GridSquare_1.dm"
+        content = bytearray(b"".join(f"<block id='{i:05d}'/>".encode().ljust(4096, b" ") for i in range(8)))
+        grid_square.write_bytes(content)
+        recorder = EPURecorder(watch_dir=str(watch_dir), output_file=str(recording_file), quiet_window=0)
+
+        # Head and tail are untouched, only a block in the middle changes
+        content[3 * 4096 + 100 : 3 * 4096 + 105] = b"EDIT!"
+        grid_square.write_bytes(content + b"<end>")
+        recorder.on_modified(FileModifiedEvent(str(grid_square)))
+        recorder.stop_recording()
+
+        event = recorder.events[-1]
+        assert event.event_type != "appended"
+        assert event.content_hash == hashlib.sha256(grid_square.read_bytes()).hexdigest()
+        EPUReplayer(str(recording_file), str(target_dir)).replay(burst_mode=True)
+        assert (target_dir / "GridSquare_1.dm").read_bytes() == grid_square.read_bytes()
+
+    def test_append_reads_only_new_bytes(self, watch_dir, recording_file, monkeypatch):
+        grid_square = watch_dir / "GridSquare_1.dm"
+        grid_square.write_bytes(b"<entry/>\n" * 1_000_000)
+        recorder = EPURecorder(watch_dir=str(watch_dir), output_file=str(recording_file), quiet_window=0)
+
+        bytes_read = []
+        real_open = builtins.open
+
+        class CountingFile:
+            def __init__(self, f):
+                self._f = f
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                self._f.close()
+
+            def read(self, *args):
+                data = self._f.read(*args)
+                bytes_read.append(len(data))
+                return data
+
+            def __getattr__(self, name):
+                return getattr(self._f, name)
+
+        def counting_open(file, *args, **kwargs):
+            f = real_open(file, *args, **kwargs)
+            return CountingFile(f) if Path(file) == grid_square else f
+
+        monkeypatch.setattr(builtins, "open", counting_open)
+        for appended in (b"<a/>\n", b"<entry/>\n" * 100_000):
+            bytes_read.clear()
+            with real_open(grid_square, "ab") as f:
+                f.write(appended)
+            recorder.on_modified(FileModifiedEvent(str(grid_square)))
+            recorder.drain()
+            # The appended bytes plus a fixed number of sampled blocks, however large the file
+            assert len(appended) <= sum(bytes_read) <= len(appended) + 128 * 1024
+        monkeypatch.undo()
+
+        assert [e.event_type for e in recorder.events[-2:]] == ["appended", "appended"]
+        assert recorder.events[-1].content_hash == hashlib.sha256(grid_square.read_bytes()).hexdigest()
+
+    def test_bursts_are_coalesced_per_path(self, watch_dir, recording_file):
+        metadata = watch_dir / "GridSquare_1.dm"
+        metadata.write_text("<header/>\n")
+        recorder = EPURecorder(watch_dir=str(watch_dir), output_file=str(recording_file), quiet_window=60)
+
+        # Buffered writes: several notifications for one logical append, plus a no-op touch
+        for i in range(3):
+            with open(metadata, "a") as f:
+                f.write(f"<entry id='{i}'/>\n")
+            recorder.on_modified(FileModifiedEvent(str(metadata)))
+            recorder.drain()
+        recorder.on_modified(FileModifiedEvent(str(metadata)))
+
+        # Write to a temp name and rename: recorded as a single creation at the final path
+        tmp = watch_dir / "FoilHole_1.xml.tmp"
+        tmp.write_text("<foilhole/>")
+        recorder.on_created(FileCreatedEvent(str(tmp)))
+        recorder.on_modified(FileModifiedEvent(str(tmp)))
+        tmp.rename(watch_dir / "FoilHole_1.xml")
+        recorder.on_moved(FileMovedEvent(str(tmp), str(watch_dir / "FoilHole_1.xml")))
+        recorder.drain()
+
+        assert len(recorder.events) == 1
+        recorder.coalescer.flush_all()
+        recorder.drain()
+
+        events = recorder.events[1:]
+        assert [(e.event_type, e.src_path) for e in events] == [
+            ("appended", "GridSquare_1.dm"),
+            ("created", "FoilHole_1.xml"),
+        ]
+        assert events[0].operation_data["append_size"] == 3 * len("<entry id='0'/>\n")
+        assert events[0].operation_data["last_timestamp"] > events[0].timestamp
+        assert events[1].content == "<foilhole/>"
+
+    def test_concurrent_multi_key_submissions_do_not_deadlock(self):
+        # Directory events from the observer thread and reconcile on the main thread submit at once
+        dispatcher = OrderedDispatcher(workers=2, max_queue=100)
+        applied = []
+
+        def submit(name):
+            for i in range(200):
+                dispatcher.submit_multi(None, applied.append, (name, i))
+
+        submitters = [threading.Thread(target=submit, args=(name,), daemon=True) for name in ("observer", "reconcile")]
+
+        def wait_for_all():
+            for submitter in submitters:
+                submitter.join()
+            dispatcher.join()
+
+        waiter = threading.Thread(target=wait_for_all, daemon=True)
+        for thread in [*submitters, waiter]:
+            thread.start()
+        waiter.join(timeout=10)
+        assert not waiter.is_alive(), f"dispatcher deadlocked after {len(applied)} tasks"
+        assert len(applied) == 400
+        dispatcher.stop()
+
+    def test_slow_directory_does_not_delay_others(self, watch_dir, recording_file, monkeypatch):
+        recorder = EPURecorder(
+            watch_dir=str(watch_dir), output_file=str(recording_file), quiet_window=0, record_workers=2
+        )
+        slow_dir = watch_dir / "GridSquare_1"
+        fast_dir = next(
+            watch_dir / f"GridSquare_{i}"
+            for i in range(2, 100)
+            if recorder.dispatcher._worker_for(str(watch_dir / f"GridSquare_{i}"))
+            != recorder.dispatcher._worker_for(str(slow_dir))
+        )
+        slow_dir.mkdir()
+        fast_dir.mkdir()
+
+        release = threading.Event()
+        record_event = recorder._record_event
+
+        def gated_record_event(event, event_type):
+            if event.src_path.startswith(str(slow_dir)):
+                release.wait(5)
+            record_event(event, event_type)
+
+        monkeypatch.setattr(recorder, "_record_event", gated_record_event)
+
+        slow_file = slow_dir / "GridSquare_1.dm"
+        slow_file.write_text("<header/>\n")
+        recorder.on_created(FileCreatedEvent(str(slow_file)))
+        with open(slow_file, "a") as f:
+            f.write("<entry/>\n")
+        recorder.on_modified(FileModifiedEvent(str(slow_file)))
+        (fast_dir / "FoilHole_1.xml").write_text("<foilhole/>")
+        recorder.on_created(FileCreatedEvent(str(fast_dir / "FoilHole_1.xml")))
+
+        deadline = time.monotonic() + 5
+        while f"{fast_dir.name}/FoilHole_1.xml" not in recorder.file_states and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert f"{fast_dir.name}/FoilHole_1.xml" in recorder.file_states
+        assert "GridSquare_1/GridSquare_1.dm" not in recorder.file_states
+        assert recorder.dispatcher.stats().depth >= 1
+
+        release.set()
+        recorder.drain()
+        slow_events = [e for e in recorder.events if e.src_path == "GridSquare_1/GridSquare_1.dm"]
+        assert slow_events[0].event_type == "created"
+        assert slow_events[0].content == "<header/>\n<entry/>\n"
+        assert recorder.dispatcher.stats().max_lag > 0
+
+    def test_reconcile_records_dropped_events(self, watch_dir, recording_file):
+        (watch_dir / "GridSquare_1").mkdir()
+        (watch_dir / "GridSquare_1" / "GridSquare_1.dm").write_text("<header/>\n")
+        (watch_dir / "GridSquare_1" / "FoilHole_1.xml").write_text("<foilhole/>")
+        (watch_dir / "unchanged.xml").write_text("<same/>")
+        recorder = EPURecorder(watch_dir=str(watch_dir), output_file=str(recording_file), quiet_window=0)
+        initial = len(recorder.events)
+
+        # Changes whose notifications were lost
+        with open(watch_dir / "GridSquare_1" / "GridSquare_1.dm", "a") as f:
+            f.write("<entry/>\n")
+        (watch_dir / "GridSquare_1" / "FoilHole_1.xml").unlink()
+        (watch_dir / "GridSquare_2").mkdir()
+        (watch_dir / "GridSquare_2" / "GridSquare_2.dm").write_text("<header/>\n")
+
+        assert recorder.reconcile() > 0
+        recorder.drain()
+
+        missed = recorder.events[initial:]
+        assert sorted((e.event_type, e.src_path) for e in missed) == [
+            ("appended", "GridSquare_1/GridSquare_1.dm"),
+            ("created", "GridSquare_2"),
+            ("created", "GridSquare_2/GridSquare_2.dm"),
+            ("deleted", "GridSquare_1/FoilHole_1.xml"),
+        ]
+        assert all(e.operation_data["reconciled"] for e in missed)
+
+        # A second pass finds nothing left to record
+        recorder.reconcile()
+        recorder.drain()
+        assert len(recorder.events) == initial + len(missed)
+
+    def test_reconciled_file_is_not_created_again_by_coalesced_notification(self, watch_dir, recording_file):
+        recorder = EPURecorder(watch_dir=str(watch_dir), output_file=str(recording_file), quiet_window=60)
+        foilhole = watch_dir / "FoilHole_1.xml"
+        foilhole.write_text("<foilhole/>")
+
+        # The notification is held in the coalescer while a rescan records the file
+        recorder.on_created(FileCreatedEvent(str(foilhole)))
+        recorder.drain()
+        recorder.reconcile()
+        recorder.drain()
+        recorder.stop_recording()
+
+        created = [e for e in recorder.events if e.src_path == "FoilHole_1.xml"]
+        assert [e.event_type for e in created] == ["created"]
+        assert created[0].operation_data["reconciled"]
+
+    def test_indexed_polling_checks_hot_directories_first(self, watch_dir):
+        hot = watch_dir / "GridSquare_1"
+        cold = watch_dir / "GridSquare_2"
+        for square in (hot, cold):
+            square.mkdir()
+            (square / "GridSquare.dm").write_text("<header/>\n")
+
+        event_queue = EventQueue()
+        emitter = IndexedPollingEmitter(event_queue, ObservedWatch(str(watch_dir), recursive=True), cold_interval=60)
+        emitter.on_thread_start()
+
+        def polled():
+            emitter.poll()
+            events = []
+            while not event_queue.empty():
+                event, _watch = event_queue.get()
+                events.append((event.event_type, Path(event.src_path).relative_to(watch_dir).as_posix()))
+            return events
+
+        (hot / "FoilHole_1.xml").write_text("<foilhole/>")
+        (watch_dir / "GridSquare_3").mkdir()
+        (watch_dir / "GridSquare_3" / "FoilHole_2.xml").write_text("<foilhole/>")
+        assert polled() == [
+            ("created", "GridSquare_3"),
+            ("created", "GridSquare_3/FoilHole_2.xml"),
+            ("created", "GridSquare_1/FoilHole_1.xml"),
+        ]
+
+        # Content changes are picked up straight away in the hot directory, the cold one waits its turn
+        for square in (hot, cold):
+            with open(square / "GridSquare.dm", "a") as f:
+                f.write("<entry/>\n")
+        assert polled() == [("modified", "GridSquare_1/GridSquare.dm")]
+        emitter.cold_interval = 0
+        assert polled() == [("modified", "GridSquare_2/GridSquare.dm")]
+
+        shutil.rmtree(watch_dir / "GridSquare_3")
+        assert polled() == [("deleted", "GridSquare_3/FoilHole_2.xml"), ("deleted", "GridSquare_3")]
+
+    def test_delta_cache_is_bounded(self, watch_dir, recording_file):
+        for i in range(50):
+            (watch_dir / f"FoilHole_{i}.xml").write_text("<foilhole/>" * 100)
+
+        recorder = EPURecorder(
+            watch_dir=str(watch_dir), output_file=str(recording_file), quiet_window=0, delta_cache_mb=0.01
+        )
+        assert recorder.delta_cache.current_bytes <= 0.01 * 1024 * 1024
+        assert recorder.delta_cache.evictions > 0
+        assert not hasattr(recorder.file_states["FoilHole_0.xml"], "__dict__")
+
+        # An evicted path still records appends correctly, via a full rehash
+        evicted = watch_dir / "FoilHole_0.xml"
+        assert recorder.delta_cache.get("FoilHole_0.xml") is None
+        with open(evicted, "a") as f:
+            f.write("<more/>")
+        recorder.on_modified(FileModifiedEvent(str(evicted)))
+        recorder.drain()
+        assert recorder.events[-1].event_type == "appended"
+        assert recorder.events[-1].content == "<more/>"
+        assert recorder.file_states["FoilHole_0.xml"].hash == hashlib.sha256(evicted.read_bytes()).hexdigest()
+
+    def test_recorder_journals_events_to_disk(self, watch_dir, recording_file):
+        (watch_dir / "file1.txt").write_text("content1")
+
+        recorder = EPURecorder(
+            watch_dir=str(watch_dir),
+            output_file=str(recording_file),
+        )
+
+        # Events are on disk before the recording is stopped
+        lines = recorder.journal.path.read_text().splitlines()
+        assert len(lines) == 1
+        assert '"src_path":"file1.txt"' in lines[0]
+
+        recorder.stop_recording()
+        assert [e.src_path for e in recorder.events] == ["file1.txt"]
+
+    def test_recorder_resume_after_crash(self, watch_dir, target_dir, recording_file):
+        (watch_dir / "before.txt").write_text("before crash")
+
+        # Simulate a crash: the first recorder never stops
+        crashed = EPURecorder(
+            watch_dir=str(watch_dir),
+            output_file=str(recording_file),
+        )
+        crashed.journal.close()
+
+        (watch_dir / "after.txt").write_text("written while down")
+        (watch_dir / "before.txt").write_text("before crash, then changed")
+
+        recorder = EPURecorder.resume(str(crashed.temp_dir))
+        assert recorder.temp_dir == crashed.temp_dir
+        recorder.stop_recording()
+
+        event_types = [(e.event_type, e.src_path) for e in recorder.events]
+        assert event_types[0] == ("initial_file", "before.txt")
+        assert ("created", "after.txt") in event_types
+        assert ("appended", "before.txt") in event_types
+
+        EPUReplayer(str(recording_file), str(target_dir)).replay(burst_mode=True)
+        assert (target_dir / "before.txt").read_text() == "before crash, then changed"
+        assert (target_dir / "after.txt").read_text() == "written while down"
+
 
 class TestEPUReplayer:
     def test_replayer_file_not_found(self, temp_dir):
@@ -68,6 +478,390 @@ class TestEPUReplayer:
                 target_dir=str(temp_dir / "target"),
             )
 
+    def test_replays_legacy_counter_chunk_ids(self, temp_dir, target_dir):
+        payload = b"\x00\x01legacy chunk"
+        recording = {
+            "metadata": {"recorded_at": "2024-01-01T00:00:00", "watch_dir": "/epu", "total_events": 1},
+            "events": [
+                {
+                    "timestamp": 1.0,
+                    "event_type": "initial_file",
+                    "src_path": "data.bin",
+                    "size": len(payload),
+                    "content_hash": hashlib.sha256(payload).hexdigest(),
+                    "binary_chunk_id": "chunk_0",
+                }
+            ],
+        }
+        archive = temp_dir / "legacy.tar.gz"
+        with tarfile.open(archive, "w:gz") as tar:
+            for name, data in (("recording.json", json.dumps(recording).encode()), ("chunks/chunk_0.bin", payload)):
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+
+        EPUReplayer(str(archive), str(target_dir)).replay(burst_mode=True)
+        assert (target_dir / "data.bin").read_bytes() == payload
+
+    def test_replay_streams_legacy_json_events(self, temp_dir, target_dir, monkeypatch):
+        monkeypatch.setattr(jsonstream, "READ_SIZE", 64)
+        events = [
+            {
+                "timestamp": float(i),
+                "event_type": "initial_file",
+                "src_path": f"FoilHole_{i}.xml",
+                "content": "<x/>" * i,
+            }
+            for i in range(40)
+        ]
+        # Metadata written after the events must still be found without loading them
+        recording = temp_dir / "legacy.json"
+        recording.write_text(
+            json.dumps({"events": events, "metadata": {"recorded_at": "2024-01-01", "watch_dir": "/epu"}}, indent=2)
+        )
+
+        replayer = EPUReplayer(str(recording), str(target_dir))
+        assert replayer.event_count is None
+        assert next(replayer.iter_events()).src_path == "FoilHole_0.xml"
+
+        monkeypatch.setattr(EPUReplayer, "events", property(lambda self: pytest.fail("replay loaded every event")))
+        replayer.replay(burst_mode=True)
+        assert (target_dir / "FoilHole_39.xml").read_text() == "<x/>" * 39
+
+    def test_archives_are_unpacked_once_into_cache(self, watch_dir, temp_dir, monkeypatch):
+        (watch_dir / "FoilHole_1.tiff").write_bytes(os.urandom(50_000))
+        recordings = []
+        for name in ("first", "second"):
+            (watch_dir / "FoilHole_1.xml").write_text(f"<foilhole name='{name}'/>")
+            recording = temp_dir / f"{name}.tar.gz"
+            EPURecorder(str(watch_dir), str(recording), skip_binary_content=False).stop_recording()
+            recordings.append(recording)
+        copy = temp_dir / "copy.tar.gz"
+        shutil.copy(recordings[0], copy)
+
+        recording_cache = RecordingCache(temp_dir / "cache")
+        EPUReplayer(str(recordings[0]), str(temp_dir / "replay_0"), cache=recording_cache).replay(burst_mode=True)
+
+        # The same content under another name replays from the cache without unpacking or rehashing
+        monkeypatch.setattr(tarfile, "open", lambda *args, **kwargs: pytest.fail("archive unpacked again"))
+        replayer = EPUReplayer(str(copy), str(temp_dir / "replay_1"), cache=recording_cache)
+        replayer.replay(burst_mode=True)
+        assert replayer.temp_dir is None
+        assert (temp_dir / "replay_1" / "FoilHole_1.tiff").read_bytes() == (watch_dir / "FoilHole_1.tiff").read_bytes()
+        assert (temp_dir / "replay_1" / "FoilHole_1.xml").read_text() == "<foilhole name='first'/>"
+        monkeypatch.setattr(cache, "hash_file", lambda *args: pytest.fail("archive hashed again"))
+        leased = recording_cache.prepare(copy)
+        assert leased == replayer.chunks_dir.parent
+        monkeypatch.undo()
+
+        # Least recently used entries go once the cache is over its limit, unless a replay still reads them
+        first = recording_cache.entries()[0]
+        recording_cache.max_size = int(first.size * 1.5)
+        second = recording_cache.prepare(recordings[1])
+        assert first.path.exists()
+
+        # Leases of exited processes do not count
+        recording_cache.release(leased)
+        exited = subprocess.Popen([sys.executable, "-c", "pass"])
+        exited.wait()
+        (temp_dir / "cache" / "leases" / first.key / f"{exited.pid}-stale").touch()
+        recording_cache.prune()
+        assert [e.key for e in recording_cache.entries()] == [recording_cache.key(recordings[1])]
+        assert not first.path.exists()
+        recording_cache.release(second)
+        assert recording_cache.prune(max_size=0)
+
+    @pytest.mark.skipif(not hasattr(os.stat_result, "st_blocks"), reason="needs st_blocks")
+    def test_placeholders_are_sparse_unless_allocated(self, temp_dir, target_dir):
+        movie_size = 4 * 1024**3
+        events = [
+            {"timestamp": 1.0, "event_type": "created", "src_path": "Movie.tiff", "size": 1024, "is_placeholder": True},
+            {
+                "timestamp": 2.0,
+                "event_type": "modified",
+                "src_path": "Movie.tiff",
+                "size": movie_size,
+                "is_placeholder": True,
+            },
+            {
+                "timestamp": 3.0,
+                "event_type": "created",
+                "src_path": "Atlas.mrc",
+                "size": 1024**2,
+                "is_placeholder": True,
+            },
+        ]
+        recording = temp_dir / "recording.json"
+        recording.write_text(
+            json.dumps({"metadata": {"recorded_at": "2024-01-01", "watch_dir": "/epu"}, "events": events})
+        )
+
+        EPUReplayer(str(recording), str(target_dir / "sparse")).replay(burst_mode=True)
+        movie = (target_dir / "sparse" / "Movie.tiff").stat()
+        assert movie.st_size == movie_size
+        assert movie.st_blocks * 512 < 1024**2
+
+        EPUReplayer(str(recording), str(target_dir / "allocated")).replay(burst_mode=True, allocate_placeholders=True)
+        atlas = target_dir / "allocated" / "Atlas.mrc"
+        assert atlas.read_bytes() == bytes(1024**2)
+        assert atlas.stat().st_blocks * 512 >= 1024**2
+
+    @pytest.mark.parametrize(
+        ("verify_mode", "full_hashes", "error"),
+        [
+            ("each", 23, "Hash mismatch for B.xml: "),
+            ("final", 2, "Hash mismatch for B.xml (moved to C.xml): "),
+            ("streaming", 0, "Hash mismatch for B.xml: "),
+        ],
+    )
+    def test_verify_modes(self, temp_dir, target_dir, monkeypatch, capsys, verify_mode, full_hashes, error):
+        def sha256(text):
+            return hashlib.sha256(text.encode()).hexdigest()
+
+        content = "<gridsquare>"
+        events = [{"timestamp": 0.0, "event_type": "created", "src_path": "A.dm", "content": content}]
+        for i in range(20):
+            events.append(
+                {"timestamp": 1.0 + i, "event_type": "appended", "src_path": "A.dm", "content": f"<hole id='{i}'/>"}
+                | {"file_position": len(content), "content_hash": sha256(content + f"<hole id='{i}'/>")}
+            )
+            content += f"<hole id='{i}'/>"
+        events[0]["content_hash"] = sha256("<gridsquare>")
+        events += [
+            {
+                "timestamp": 30.0,
+                "event_type": "created",
+                "src_path": "B.xml",
+                "content": "<b/>",
+                "content_hash": sha256("<b/>"),
+            },
+            {
+                "timestamp": 31.0,
+                "event_type": "modified",
+                "src_path": "B.xml",
+                "content": "<b/>",
+                "content_hash": "0" * 64,
+            },
+            {"timestamp": 32.0, "event_type": "moved", "src_path": "B.xml", "dest_path": "C.xml"},
+        ]
+        recording = temp_dir / "recording.json"
+        recording.write_text(
+            json.dumps({"metadata": {"recorded_at": "2024-01-01", "watch_dir": "/epu"}, "events": events})
+        )
+
+        full_hash_calls = []
+        calculate_file_hash = EPUReplayer._calculate_file_hash
+        monkeypatch.setattr(
+            EPUReplayer,
+            "_calculate_file_hash",
+            lambda self, path: full_hash_calls.append(path) or calculate_file_hash(self, path),
+        )
+        EPUReplayer(str(recording), str(target_dir)).replay(burst_mode=True, verify_mode=verify_mode)
+
+        out = capsys.readouterr().out
+        assert "Integrity verification found 1 issues" in out
+        assert error in out
+        assert len(full_hash_calls) == full_hashes
+
+    def test_replay_clock_targets_absolute_deadlines(self):
+        now = [100.0]
+
+        def sleep(seconds):
+            now[0] += seconds
+
+        clock = ReplayClock(speed_multiplier=2.0, max_delay=5.0, clock=lambda: now[0], sleep=sleep)
+        assert clock.wait(1000.0) == 0.0
+        now[0] += 0.2  # Applying an event takes time that must not delay the next one
+        assert clock.wait(1001.0) == 0.0
+        assert now[0] == 100.5
+        now[0] += 1.5  # A slow operation makes the next event late...
+        assert clock.wait(1002.0) == pytest.approx(1.0)
+        assert clock.wait(1004.0) == pytest.approx(0.0)  # ...and the one after that catches up
+        assert now[0] == 102.0
+        assert clock.wait(1003.0) == 0.0  # Out of order timestamps are not held back
+        clock.wait(2000.0)  # Gaps are capped at max_delay
+        assert now[0] == 107.0
+
+        assert clock.lateness.count == 6
+        assert clock.lateness.max == pytest.approx(1.0)
+        assert clock.lateness.percentile(50) == 0.0
+        assert clock.lateness.percentile(99) == pytest.approx(1.0)
+
+    def test_parallel_replay_matches_sequential(self, temp_dir):
+        events = []
+
+        def add(event_type, src_path, **fields):
+            events.append({"timestamp": float(len(events)), "event_type": event_type, "src_path": src_path, **fields})
+
+        for square in range(8):
+            add("created", f"GridSquare_{square}", is_directory=True)
+            add("created", f"GridSquare_{square}/Data", is_directory=True)
+            for hole in range(10):
+                path = f"GridSquare_{square}/Data/FoilHole_{hole}.xml"
+                add("created", path, content="<foilhole>")
+                add("appended", path, content=f"<id>{hole}</id>")
+                add("appended", path, content="</foilhole>")
+            add("truncated", f"GridSquare_{square}/Data/FoilHole_0.xml", operation_data={"new_size": 4})
+            add("modified", f"GridSquare_{square}/Data/FoilHole_1.xml", content="<rewritten/>")
+        add("moved", "GridSquare_0/Data/FoilHole_2.xml", dest_path="GridSquare_1/FoilHole_2.xml")
+        add("moved", "GridSquare_2", dest_path="GridSquare_2_old", is_directory=True)
+        add("created", "GridSquare_2", is_directory=True)
+        add("created", "GridSquare_2/FoilHole_2.xml", content="<new/>")
+        add("deleted", "GridSquare_3", is_directory=True)
+        add("appended", "GridSquare_2_old/Data/FoilHole_3.xml", content="<late/>")
+
+        recording = temp_dir / "recording.json"
+        recording.write_text(
+            json.dumps({"metadata": {"recorded_at": "2024-01-01", "watch_dir": "/epu"}, "events": events})
+        )
+
+        def replay(target, workers):
+            EPUReplayer(str(recording), str(target)).replay(burst_mode=True, verify_integrity=False, workers=workers)
+            return {str(p.relative_to(target)): p.is_dir() or p.read_text() for p in sorted(target.rglob("*"))}
+
+        sequential = replay(temp_dir / "sequential", workers=1)
+        assert replay(temp_dir / "parallel", workers=8) == sequential
+        assert sequential["GridSquare_2_old/Data/FoilHole_3.xml"].endswith("<late/>")
+        assert "GridSquare_3" not in sequential
+
+    def test_fanout_decodes_once_and_staggers_targets(self, temp_dir, monkeypatch):
+        events = []
+        for hole in range(20):
+            path = f"FoilHole_{hole}.xml"
+            events.append({"timestamp": hole * 0.02, "event_type": "created", "src_path": path, "content": "<a/>"})
+            events.append(
+                {"timestamp": hole * 0.02 + 0.01, "event_type": "appended", "src_path": path, "content": "<b/>"}
+            )
+        recording = temp_dir / "recording.json"
+        recording.write_text(
+            json.dumps({"metadata": {"recorded_at": "2024-01-01", "watch_dir": "/epu"}, "events": events})
+        )
+
+        decodes = []
+        iter_events = EPUReplayer.iter_events
+        monkeypatch.setattr(EPUReplayer, "iter_events", lambda self: decodes.append(self) or iter_events(self))
+        buffered = []
+        release = SharedEventWindow.release
+        monkeypatch.setattr(
+            SharedEventWindow, "release", lambda self, position: buffered.append(len(self)) or release(self, position)
+        )
+        first_applied = {}
+        apply_event = EPUReplayer._apply_event
+
+        def timed_apply(self, *args):
+            first_applied.setdefault(self.target_dir.name, time.monotonic())
+            apply_event(self, *args)
+
+        monkeypatch.setattr(EPUReplayer, "_apply_event", timed_apply)
+
+        # Burst mode: targets advance in step, holding only the events not yet applied everywhere
+        targets = [ReplayTarget(temp_dir / f"microscope_{n}") for n in range(1, 4)]
+        EPUReplayer(str(recording), str(temp_dir / "microscope_1")).replay(burst_mode=True, workers=4, targets=targets)
+        assert len(decodes) == 1
+        assert max(buffered) <= 2
+        for target in targets:
+            files = sorted(Path(target.target_dir).iterdir())
+            assert len(files) == 20 and all(f.read_text() == "<a/><b/>" for f in files)
+
+        # Timed: the second target starts 0.3s after the first, from the same decoded events
+        targets = [
+            ReplayTarget(temp_dir / "early"),
+            ReplayTarget(temp_dir / "late", start_offset=0.3, jitter=0.01),
+        ]
+        replayer = EPUReplayer(str(recording), str(temp_dir / "early"))
+        replayer.replay(speed_multiplier=4.0, verify_integrity=False, targets=targets, seed=1)
+        assert len(decodes) == 2
+        assert replayer.lateness.count == 2 * len(events)
+        assert first_applied["late"] - first_applied["early"] >= 0.29
+        assert (temp_dir / "late" / "FoilHole_19.xml").read_text() == "<a/><b/>"
+
+    def test_scenario_merges_sessions_on_one_timeline(self, temp_dir, monkeypatch):
+        for microscope, count in (("krios", 10), ("glacios", 4)):
+            events = [
+                {
+                    "timestamp": 100.0 + i * 0.02,
+                    "event_type": "created",
+                    "src_path": f"{microscope}_{i}.xml",
+                    "content": "<x/>",
+                }
+                for i in range(count)
+            ]
+            (temp_dir / f"{microscope}.json").write_text(
+                json.dumps({"metadata": {"recorded_at": "2024-01-01", "watch_dir": "/epu"}, "events": events})
+            )
+        scenario_file = temp_dir / "scenario.json"
+        scenario_file.write_text(
+            json.dumps(
+                {
+                    "sessions": [
+                        {"name": "Krios 1", "recording": "krios.json", "target": "epu/m02", "speed": 2},
+                        {"recording": "krios.json", "targets": ["epu/m03"], "speed": 2, "start_offset": 0.05},
+                        {"recording": "glacios.json", "target": "epu/m10/{n}", "repeat": 2, "start_offset": 0.02},
+                    ]
+                }
+            )
+        )
+
+        loaded = []
+        init = EPUReplayer.__init__
+        monkeypatch.setattr(
+            EPUReplayer, "__init__", lambda self, *args, **kwargs: loaded.append(args[0]) or init(self, *args, **kwargs)
+        )
+        applied = []
+        apply_event = EPUReplayer._apply_event
+
+        def record_apply(self, event, *args):
+            applied.append((self.target_dir.relative_to(temp_dir / "epu").as_posix(), event.src_path, time.monotonic()))
+            apply_event(self, event, *args)
+
+        monkeypatch.setattr(EPUReplayer, "_apply_event", record_apply)
+
+        timeline = scenario.replay_scenario(scenario.load_scenario(scenario_file), verify_integrity=False)
+        assert len(loaded) == 2  # One replayer per recording, shared by its sessions
+        assert len(timeline.runs) == 4
+        assert timeline.clock.lateness.count == len(applied) == 10 + 10 + 4 + 4
+        assert sorted(path.name for path in (temp_dir / "epu" / "m03").iterdir()) == sorted(
+            f"krios_{i}.xml" for i in range(10)
+        )
+
+        # Sessions interleave on one timeline; a repetition starts once the previous one has finished
+        targets = [target for target, _, _ in applied]
+        assert targets.index("m02") < targets.index("m10/1") < targets.index("m03") < targets.index("m10/2")
+        assert targets.index("m10/2") > max(i for i, target in enumerate(targets) if target == "m10/1")
+        times = {target: [t for other, _, t in applied if other == target] for target in set(targets)}
+        assert times["m03"][0] - times["m02"][0] >= 0.045
+        assert times["m10/2"][0] - times["m10/1"][0] >= 0.055  # Four events 0.02s apart
+
+        scenario_file.write_text(json.dumps({"sessions": [{"recording": "krios.json", "target": "x", "speed_up": 2}]}))
+        with pytest.raises(ValueError, match="speed_up"):
+            scenario.load_scenario(scenario_file)
+        for session, error in [
+            ({"recording": "krios.json", "target": "x", "repeat": 1.5}, "repeat must be int"),
+            ({"recording": "krios.json", "targets": "x"}, "targets must be list"),
+            ({"recording": "krios.json", "target": "x", "max_delay": True}, "max_delay must be int or float or null"),
+            ("krios.json", "not a mapping"),
+        ]:
+            scenario_file.write_text(json.dumps({"sessions": [{"recording": "krios.json", "target": "x"}, session]}))
+            with pytest.raises(ValueError, match=f"Scenario session 2.*{error}"):
+                scenario.load_scenario(scenario_file)
+
+    def test_scenario_keeps_every_cached_recording_until_done(self, watch_dir, temp_dir):
+        movies, sessions = {}, []
+        for name in ("krios", "glacios"):
+            movies[name] = os.urandom(20_000)
+            (watch_dir / "FoilHole_1.tiff").write_bytes(movies[name])
+            archive = temp_dir / f"{name}.tar.gz"
+            EPURecorder(str(watch_dir), str(archive), skip_binary_content=False).stop_recording()
+            sessions.append(scenario.ScenarioSession(archive, [str(temp_dir / name)], name=name))
+
+        # Too small for even one recording: unpacking the second must not evict the first
+        recording_cache = RecordingCache(temp_dir / "cache", max_size=1)
+        scenario.replay_scenario(scenario.Scenario(sessions), burst_mode=True, cache=recording_cache)
+        for name, movie in movies.items():
+            assert (temp_dir / name / "FoilHole_1.tiff").read_bytes() == movie
+        assert len(recording_cache.entries()) == 2
+        assert len(recording_cache.prune()) == 2  # Released once the scenario is over
+
 
 class TestRoundTrip:
     def test_simple_roundtrip(self, watch_dir, target_dir, recording_file):
@@ -133,3 +927,221 @@ class TestRoundTrip:
 
         # Binary file should exist as placeholder (null bytes)
         assert (target_dir / "binary.bin").exists()
+
+    def test_placeholders_are_fingerprinted_not_hashed(
+        self, watch_dir, target_dir, recording_file, capsys, monkeypatch
+    ):
+        movie = watch_dir / "FoilHole_1_Data.mrc"
+        movie.write_bytes(b"\x00MRC" * 50000)
+
+        recorder = EPURecorder(watch_dir=str(watch_dir), output_file=str(recording_file), quiet_window=0)
+        stat = movie.stat()
+        assert recorder.file_states[movie.name].hash == f"fingerprint_{stat.st_size}_{stat.st_mtime_ns}_{stat.st_ino}"
+
+        # A growing movie is recorded by size only, without storing the new frames
+        with open(movie, "ab") as f:
+            f.write(b"\x01MRC" * 1000)
+        recorder.on_modified(FileModifiedEvent(str(movie)))
+        recorder.stop_recording()
+
+        event = recorder.events[-1]
+        assert (event.event_type, event.is_placeholder, event.size) == ("modified", True, movie.stat().st_size)
+        assert event.content is None and event.binary_chunk_id is None
+
+        EPUReplayer(str(recording_file), str(target_dir)).replay(burst_mode=True, verify_integrity=True)
+        assert "Integrity verification passed!" in capsys.readouterr().out
+        assert (target_dir / movie.name).stat().st_size == movie.stat().st_size
+
+        sampled = EPURecorder(
+            watch_dir=str(watch_dir), output_file=str(recording_file), placeholder_fingerprint="sampled"
+        )
+        assert sampled.file_states[movie.name].hash.startswith(recorder.file_states[movie.name].hash + "_")
+
+        # A file only known to be binary by its content is fingerprinted through the file opened to sniff it
+        unknown = watch_dir / "FoilHole_1_Data.raw"
+        unknown.write_bytes(b"\x00RAW" * 50000)
+        opened = []
+        real_open = builtins.open
+        monkeypatch.setattr(
+            builtins, "open", lambda file, *args, **kw: opened.append(file) or real_open(file, *args, **kw)
+        )
+        ingest = sampled._ingest_file(unknown, unknown.stat())
+        monkeypatch.undo()
+        assert opened.count(unknown) == 1
+        assert ingest.is_placeholder
+        assert ingest.content_hash == sampled._fingerprint_placeholder(unknown, unknown.stat()).content_hash
+
+    def test_hash_algorithm_is_recorded_and_used_for_verification(self, watch_dir, target_dir, recording_file, capsys):
+        (watch_dir / "GridSquare_1.dm").write_text("<header/>\n" * 1000)
+        recorder = EPURecorder(watch_dir=str(watch_dir), output_file=str(recording_file), hash_algorithm="blake2b")
+        recorder.stop_recording()
+
+        expected = hashlib.blake2b((watch_dir / "GridSquare_1.dm").read_bytes(), digest_size=32).hexdigest()
+        assert recorder.events[0].content_hash == expected
+
+        replayer = EPUReplayer(str(recording_file), str(target_dir))
+        assert replayer.metadata["hash_algorithm"] == "blake2b"
+        replayer.replay(burst_mode=True, verify_integrity=True)
+        assert "Integrity verification passed!" in capsys.readouterr().out
+
+        with pytest.raises(ValueError):
+            EPURecorder(watch_dir=str(watch_dir), output_file=str(recording_file), hash_algorithm="md5")
+
+    def test_v3_container_replays_without_extraction(self, watch_dir, target_dir, tmp_path, monkeypatch):
+        monkeypatch.setattr(container, "EVENTS_PER_BLOCK", 2)
+        movie = os.urandom(300_000)
+        metadata = b"".join(f"<block id='{i:05d}'/>".encode().ljust(4096, b" ") for i in range(400))
+        (watch_dir / "FoilHole_1.xml").write_text("<foilhole/>")
+        (watch_dir / "FoilHole_1.tiff").write_bytes(movie)
+        (watch_dir / "GridSquare_1.dm").write_bytes(metadata)
+
+        recording = tmp_path / "recording.epurec"
+        recorder = EPURecorder(
+            watch_dir=str(watch_dir),
+            output_file=str(recording),
+            skip_binary_content=False,
+            quiet_window=0,
+            archive_format="v3",
+        )
+        patched = bytearray(metadata)
+        patched[8192:8200] = b"CHANGED!"
+        (watch_dir / "GridSquare_1.dm").write_bytes(patched)
+        recorder.on_modified(FileModifiedEvent(str(watch_dir / "GridSquare_1.dm")))
+        recorder.stop_recording()
+        assert [e.event_type for e in recorder.events] == ["initial_file"] * 3 + ["patched"]
+
+        replayer = EPUReplayer(str(recording), str(target_dir))
+        assert replayer.temp_dir is None
+        assert replayer.metadata["version"] == "3.0"
+        assert len(replayer.container.event_blocks) == 2
+        extents = {
+            e.src_path: replayer.container.chunks[e.binary_chunk_id] for e in replayer.events[:3] if e.size > 1e5
+        }
+        assert not extents["FoilHole_1.tiff"].compressed
+        assert extents["GridSquare_1.dm"].compressed
+
+        opened = replayer.container
+        replayer.replay(burst_mode=True)
+        assert replayer.container is None
+        assert opened._file.closed
+        assert (target_dir / "FoilHole_1.xml").read_text() == "<foilhole/>"
+        assert (target_dir / "FoilHole_1.tiff").read_bytes() == movie
+        assert (target_dir / "GridSquare_1.dm").read_bytes() == bytes(patched)
+
+    @pytest.mark.parametrize("archive_format", ["v2", "v3"])
+    @pytest.mark.parametrize("kernel_copy", [True, False])
+    def test_chunks_are_copied_without_loading(
+        self, watch_dir, target_dir, tmp_path, monkeypatch, archive_format, kernel_copy
+    ):
+        movie = os.urandom(2_500_000)
+        frames = os.urandom(700_000)
+        metadata = b"".join(f"<frame id='{i}'/>".encode() for i in range(100_000))
+        (watch_dir / "FoilHole_1.tiff").write_bytes(movie)
+        (watch_dir / "GridSquare_1.dm").write_bytes(metadata)
+
+        recording = tmp_path / f"recording.{archive_format}"
+        recorder = EPURecorder(
+            watch_dir=str(watch_dir),
+            output_file=str(recording),
+            skip_binary_content=False,
+            quiet_window=0,
+            archive_format=archive_format,
+        )
+        with open(watch_dir / "FoilHole_1.tiff", "ab") as f:
+            f.write(frames)
+        recorder.on_modified(FileModifiedEvent(str(watch_dir / "FoilHole_1.tiff")))
+        recorder.stop_recording()
+        assert recorder.events[-1].event_type == "appended"
+
+        def load_whole_chunk(*args):
+            raise AssertionError("chunks should be streamed, not read into memory")
+
+        monkeypatch.setattr(container.RecordingContainer, "read_chunk", load_whole_chunk)
+        monkeypatch.setattr(container, "COPY_BUFFER_SIZE", 4096)  # Many partial decompressions
+        if not kernel_copy:
+            monkeypatch.setattr(fileops, "_clone", lambda *args: False)
+            monkeypatch.setattr(fileops, "_kernel_copy", lambda *args: 0)
+
+        EPUReplayer(str(recording), str(target_dir)).replay(burst_mode=True)
+        assert (target_dir / "FoilHole_1.tiff").read_bytes() == movie + frames
+        assert (target_dir / "GridSquare_1.dm").read_bytes() == metadata
+
+    def test_identical_payloads_are_stored_once(self, watch_dir, target_dir, recording_file):
+        thumbnail = b"\x89PNG\x00" * 100
+        for i in range(5):
+            (watch_dir / f"FoilHole_{i}.jpg").write_bytes(thumbnail)
+
+        recorder = EPURecorder(
+            watch_dir=str(watch_dir),
+            output_file=str(recording_file),
+            skip_binary_content=False,
+        )
+        recorder.stop_recording()
+
+        chunk_ids = {e.binary_chunk_id for e in recorder.events}
+        assert chunk_ids == {hashlib.sha256(thumbnail).hexdigest()}
+        with tarfile.open(recording_file, "r:gz") as tar:
+            assert len([n for n in tar.getnames() if n.startswith("chunks/")]) == 1
+
+        EPUReplayer(str(recording_file), str(target_dir)).replay(burst_mode=True)
+        assert all((target_dir / f"FoilHole_{i}.jpg").read_bytes() == thumbnail for i in range(5))
+
+    def test_full_content_roundtrip_is_byte_exact(self, watch_dir, target_dir, recording_file):
+        large = bytes(range(256)) * 5000  # > 1MB, streamed into a chunk
+        small_binary = b"\xff\xfe\x00\x01 not utf-8"
+        crlf_text = "line one\r\nline two\r\n"
+        (watch_dir / "large.mrc").write_bytes(large)
+        (watch_dir / "small.xyz").write_bytes(small_binary)
+        (watch_dir / "windows.xml").write_bytes(crlf_text.encode())
+
+        recorder = EPURecorder(
+            watch_dir=str(watch_dir),
+            output_file=str(recording_file),
+            skip_binary_content=False,
+        )
+        recorder.stop_recording()
+
+        events = {e.src_path: e for e in recorder.events}
+        assert events["large.mrc"].binary_chunk_id is not None
+        assert events["small.xyz"].binary_chunk_id is not None
+        assert events["windows.xml"].content == crlf_text
+
+        EPUReplayer(str(recording_file), str(target_dir)).replay(burst_mode=True)
+        assert (target_dir / "large.mrc").read_bytes() == large
+        assert (target_dir / "small.xyz").read_bytes() == small_binary
+        assert (target_dir / "windows.xml").read_bytes() == crlf_text.encode()
+
+    @pytest.mark.parametrize("archive_format", ["v2", "v3"])
+    def test_rewrites_are_recorded_as_block_patches(self, watch_dir, target_dir, temp_dir, archive_format):
+        metadata = watch_dir / "GridSquare_1.dm"
+        original = bytearray(b"".join(f"<block id='{i:05d}'/>".encode().ljust(4096, b" ") for i in range(20)))
+        metadata.write_bytes(original)
+
+        recording_file = temp_dir / ("recording.tar.gz" if archive_format == "v2" else "recording.epurec")
+        recorder = EPURecorder(
+            watch_dir=str(watch_dir), output_file=str(recording_file), quiet_window=0, archive_format=archive_format
+        )
+
+        # Same-size rewrite touching one block
+        original[5 * 4096 + 10 : 5 * 4096 + 20] = b"CHANGED!!!"
+        metadata.write_bytes(original)
+        recorder.on_modified(FileModifiedEvent(str(metadata)))
+        recorder.drain()
+
+        # Rewrite that changes the header and grows the file
+        original[0:5] = b"<BLK "
+        metadata.write_bytes(original + b"<trailer/>")
+        recorder.on_modified(FileModifiedEvent(str(metadata)))
+        recorder.stop_recording()
+
+        rewrites = recorder.events[-2:]
+        if archive_format == "v2":
+            # Replayers that only read v2 would skip patched events
+            assert [e.event_type for e in rewrites] == ["modified", "modified"]
+        else:
+            assert [e.event_type for e in rewrites] == ["patched", "patched"]
+            patches = [e.operation_data["patches"] for e in rewrites]
+            assert patches == [[[5 * 4096, 4096]], [[0, 4096], [20 * 4096, 10]]]
+
+        EPUReplayer(str(recording_file), str(target_dir)).replay(burst_mode=True)
+        assert (target_dir / "GridSquare_1.dm").read_bytes() == metadata.read_bytes()
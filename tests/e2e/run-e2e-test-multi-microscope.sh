@@ -143,28 +143,30 @@ for ((i=1; i<=NUM_MICROSCOPES; i++)); do
     sleep 1
 done
 
-echo "[9/11] Starting $NUM_MICROSCOPES concurrent playback instances..."
-for ((i=1; i<=NUM_MICROSCOPES; i++)); do
-    epu_dir="${EPU_DIRS[$((i-1))]}"
-
-    echo "  Starting playback $i to $epu_dir"
-    uv run epuplayer replay \
-        --max-delay "$MAX_DELAY" \
-        "$RECORDING" \
-        "$epu_dir" \
-        > "$TEST_DIR/logs/playback-${i}.log" 2>&1 &
-    PLAYBACK_PIDS+=($!)
-
-    sleep 0.5
+echo "[9/11] Starting playback to $NUM_MICROSCOPES microscopes..."
+# One process decodes the recording once and replays it into every EPU directory, 0.5s apart
+for epu_dir in "${EPU_DIRS[@]}"; do
+    echo "  Playback target: $epu_dir"
 done
+PLAYBACK_ARGS=(--max-delay "$MAX_DELAY")
+# --stagger is rejected with a single target
+if ((NUM_MICROSCOPES > 1)); then
+    PLAYBACK_ARGS+=(--stagger 0.5)
+fi
+uv run epuplayer replay \
+    "${PLAYBACK_ARGS[@]}" \
+    "$RECORDING" \
+    --targets "${EPU_DIRS[@]}" \
+    > "$TEST_DIR/logs/playback.log" 2>&1 &
+PLAYBACK_PIDS+=($!)
 
 echo ""
-echo "All playback instances started. Waiting for completion..."
-for ((i=1; i<=NUM_MICROSCOPES; i++)); do
-    playback_pid="${PLAYBACK_PIDS[$((i-1))]}"
-    echo "  Waiting for playback $i (PID: $playback_pid)..."
-    wait "$playback_pid" || echo "  Warning: Playback $i exited with non-zero status"
-done
+echo "Playback started. Waiting for completion..."
+if ! wait "${PLAYBACK_PIDS[0]}"; then
+    echo "ERROR: Playback failed! Check $TEST_DIR/logs/playback.log"
+    tail -20 "$TEST_DIR/logs/playback.log"
+    exit 1
+fi
 
 echo ""
 echo "All playback complete. Waiting for agents to finish processing (60 seconds)..."
@@ -318,8 +320,8 @@ echo ""
 echo "Log files:"
 for ((i=1; i<=NUM_MICROSCOPES; i++)); do
     echo "  Agent $i log: $TEST_DIR/logs/agent-${i}.log"
-    echo "  Playback $i log: $TEST_DIR/logs/playback-${i}.log"
 done
+echo "  Playback log: $TEST_DIR/logs/playback.log"
 echo "  API log: $TEST_DIR/logs/api.log"
 echo "  Consumer log: $TEST_DIR/logs/consumer.log"
 echo ""